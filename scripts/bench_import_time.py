@@ -0,0 +1,54 @@
+"""Startup cost of `python -m pdf_contract_masking.contract_masking --help`.
+
+Runs the command several times in fresh interpreters (RULES_ONLY=1) and
+reports wall time, peak RSS and whether the ML stack got imported.
+
+    python scripts/bench_import_time.py --runs 10
+"""
+import argparse
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY = ("torch", "transformers", "onnxruntime")
+PROBE = (
+    "import sys, runpy\n"
+    "sys.argv = ['contract_masking', '--help']\n"
+    "try:\n"
+    "    runpy.run_module('pdf_contract_masking.contract_masking', run_name='__main__')\n"
+    "except SystemExit:\n"
+    "    pass\n"
+    f"print('HEAVY', ','.join(m for m in {HEAVY!r} if m in sys.modules), file=sys.stderr)\n"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ, RULES_ONLY="1")
+    command = [sys.executable, "-m", "pdf_contract_masking.contract_masking", "--help"]
+    times = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    # ru_maxrss of children: KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    probe = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True)
+    heavy = next((line.split(" ", 1)[1] if " " in line else "" for line in probe.stderr.splitlines()
+                  if line.startswith("HEAVY")), "?")
+
+    print(" ".join(command[1:]))
+    print(f"runs={args.runs} median={statistics.median(times):.3f}s min={min(times):.3f}s max={max(times):.3f}s")
+    print(f"peak RSS={peak_mb:.0f} MB  ML modules imported: {heavy or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Time and size of each save profile on redacted sample contracts.
+
+Redacts every PDF once (RULES_ONLY, rules from the KB), then saves the
+redacted document with each profile and reports median save time and
+output size per file and in total.
+
+    python scripts/bench_save_profiles.py contract/*.pdf --repeat 5
+"""
+import argparse
+import glob
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("RULES_ONLY", "1")
+
+import fitz
+
+from pdf_contract_masking.config import RedactionConfig, SAVE_PROFILES
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking.processor import PDFProcessor
+
+
+def save_stats(proc, redacted, repeat, tmpdir):
+    """(median seconds, bytes) for saving `redacted` with proc's profile."""
+    out = os.path.join(tmpdir, f"{proc.save_profile}.pdf")
+    times = []
+    for _ in range(repeat):
+        with fitz.open(redacted) as doc:
+            start = time.perf_counter()
+            proc._save(doc, out)
+            times.append(time.perf_counter() - start)
+    return statistics.median(times), os.path.getsize(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", help="PDF files (default: ./contract/*.pdf)")
+    parser.add_argument("--profiles", nargs="+", default=list(SAVE_PROFILES))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = args.pdfs or sorted(glob.glob(os.path.join("contract", "*.pdf")))
+    if not paths:
+        parser.error("no PDF files found")
+    config = RedactionConfig()
+    totals = {name: [0.0, 0] for name in args.profiles}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = KnowledgeBase(os.path.join(tmpdir, "kb.json"))
+        # redact once, saving without any rewrite, so only the final save is timed
+        config.cfg.setdefault("save", {})["profiles"] = {"raw": {}}
+        redactor = PDFProcessor(config, kb, save_profile="raw")
+        processors = [PDFProcessor(config, kb, save_profile=name) for name in args.profiles]
+        print(f"{'file':<40} " + " ".join(f"{name:>22}" for name in args.profiles))
+        for path in paths:
+            redacted = os.path.join(tmpdir, "redacted.pdf")
+            redactor.process_pdf_final(path, redacted)
+            cells = []
+            for proc in processors:
+                seconds, size = save_stats(proc, redacted, args.repeat, tmpdir)
+                totals[proc.save_profile][0] += seconds
+                totals[proc.save_profile][1] += size
+                cells.append(f"{seconds * 1000:8.1f}ms {size / 1024:9.1f}KB")
+            print(f"{os.path.basename(path)[:40]:<40} " + " ".join(f"{c:>22}" for c in cells))
+    print(f"{'total':<40} " + " ".join(f"{t * 1000:8.1f}ms {s / 1024:9.1f}KB"
+                                       for t, s in (totals[name] for name in args.profiles)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare the torch NER pipeline with the ONNX / int8 backends on real page texts.
+
+Reports, per backend, the wall time of one batched NER pass over the pages
+and how many of the torch pipeline's PER names it reproduces.
+
+    python scripts/compare_ner_backends.py contract/*.pdf --backends onnx onnx-int8
+"""
+import argparse
+import glob
+import os
+import time
+
+import fitz
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.ner import NERModelLoader
+from pdf_contract_masking.ner_stage import NERStage
+
+
+def page_texts(paths, max_pages):
+    texts = []
+    for path in paths:
+        with fitz.open(path) as doc:
+            texts.extend(page.get_text("text") for page in doc)
+        if len(texts) >= max_pages:
+            break
+    return [t for t in texts[:max_pages] if t.strip()]
+
+
+def timed_run(nlp, texts, settings, repeat):
+    stage = NERStage(nlp, **settings)
+    stage.run(texts[:1])  # warm-up (first call pays for graph/session setup)
+    best, results = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = stage.run(texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def entity_keys(results, group="PER"):
+    return [{(e["word"], e["start"], e["end"]) for e in ents if e.get("entity_group") == group} for ents in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", help="PDF files (default: ./contract/*.pdf)")
+    parser.add_argument("--model", default="vinai/phobert-base-v2")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"])
+    parser.add_argument("--max-pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--onnx-dir", default=None, help="Where exported ONNX files are kept")
+    args = parser.parse_args()
+
+    paths = args.pdfs or sorted(glob.glob(os.path.join("contract", "*.pdf")))
+    texts = page_texts(paths, args.max_pages)
+    if not texts:
+        parser.error("no page text found")
+    settings = RedactionConfig().get_ner_settings()
+    # time the models, not the NER result cache
+    settings.update(cache_path=None, cache_size=0)
+    print(f"{len(texts)} pages from {len(paths)} files; NER settings {settings}")
+
+    reference = NERModelLoader(args.model, backend="torch").load()
+    base_time, base_results = timed_run(reference, texts, settings, args.repeat)
+    base_keys = entity_keys(base_results)
+    base_total = sum(len(k) for k in base_keys)
+    print(f"{'torch':<10} {base_time:8.3f}s  PER entities={base_total}")
+
+    for backend in args.backends:
+        nlp = NERModelLoader(args.model, backend=backend, onnx_dir=args.onnx_dir).load()
+        if nlp is None or type(nlp) is type(reference):
+            print(f"{backend:<10} unavailable (see log; is onnxruntime installed?)")
+            continue
+        elapsed, results = timed_run(nlp, texts, settings, args.repeat)
+        keys = entity_keys(results)
+        same = sum(1 for a, b in zip(base_keys, keys) if a == b)
+        found = sum(len(a & b) for a, b in zip(base_keys, keys))
+        extra = sum(len(b - a) for a, b in zip(base_keys, keys))
+        recall = found / base_total if base_total else 1.0
+        print(f"{backend:<10} {elapsed:8.3f}s  speedup x{base_time / elapsed:.2f}  "
+              f"identical pages {same}/{len(texts)}  PER recall {recall:.3f}  extra {extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import re
+from bisect import bisect_left
+from collections import deque
+import fitz  # PyMuPDF
+
+
+def canon(text):
+    """Normalize text the way anchors are compared: lower case, single spaces."""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton over plain strings."""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pid, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            if pattern:
+                self._out[state].append(pid)
+        # breadth-first pass to wire failure links (root children fail to root)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                if state:
+                    self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def finditer(self, text):
+        """Yield (start, end, pattern_id) for every occurrence, overlaps included."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid in out[state]:
+                yield i + 1 - len(self.patterns[pid]), i + 1, pid
+
+
+class WordStream:
+    """The page's words joined into one canonical string with word offsets."""
+
+    def __init__(self, words):
+        self.words = words
+        parts = []
+        self.starts = []
+        self.ends = []
+        pos = 0
+        for w in words:
+            t = canon(w[4])
+            self.starts.append(pos)
+            self.ends.append(pos + len(t))
+            parts.append(t)
+            pos += len(t) + 1
+        self.text = " ".join(parts)
+
+    def span_rects(self, start, end):
+        """Rects (one per line) of the words exactly covering text[start:end].
+
+        Returns None when the span does not start and end on word boundaries.
+        """
+        i = bisect_left(self.starts, start)
+        j = bisect_left(self.ends, end)
+        if i >= len(self.starts) or j >= len(self.ends) or self.starts[i] != start or self.ends[j] != end or j < i:
+            return None
+        rects = []
+        line = None
+        for w in self.words[i:j + 1]:
+            key = (w[5], w[6])
+            r = fitz.Rect(w[0], w[1], w[2], w[3])
+            if key == line:
+                rects[-1] |= r
+            else:
+                rects.append(r)
+                line = key
+        return rects
+
+
+class AnchorMatcher:
+    """Locate every anchor of one page with a single scan of its words.
+
+    locate() returns {anchor: [fitz.Rect, ...]} with one rect per line of
+    each hit, like page.search_for. An anchor maps to None when a hit
+    can't be mapped exactly onto word boxes (it starts or ends mid-word, or
+    wraps onto another line); callers fall back to page.search_for for it.
+    """
+
+    def __init__(self, anchors):
+        self.anchors = list(dict.fromkeys(a for a in anchors if a))
+        self._automaton = AhoCorasick([canon(a) for a in self.anchors])
+
+    def locate(self, stream):
+        found = {a: [] for a in self.anchors}
+        for start, end, pid in self._automaton.finditer(stream.text):
+            anchor = self.anchors[pid]
+            if found[anchor] is None:
+                continue
+            rects = stream.span_rects(start, end)
+            if rects is None or len(rects) > 1:
+                found[anchor] = None
+            else:
+                found[anchor].extend(rects)
+        return found
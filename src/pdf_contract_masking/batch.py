@@ -0,0 +1,211 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+from .config import RedactionConfig
+from .constants import REDACTION_CONFIG_FILE
+from .knowledge_base import open_knowledge_base
+from .processor import PDFProcessor
+from .sharding import ShardedJob
+from .logger import get_logger
+logger = get_logger(__name__)
+
+# Per-process state created once by _init_worker and reused for every file the
+# worker handles (warm NER pipeline, Redactor, KB copy).
+_worker_processor = None
+
+
+def _init_worker(kb_path, config_path, rules_only, ner_address=None, ner_authkey=None, save_profile=None):
+    global _worker_processor
+    ner_address = ner_address or os.environ.get("NER_SERVER")
+    if rules_only:
+        nlp = None
+    elif ner_address:
+        # the model lives in a shared NER server; this worker only holds a client
+        from .ner_server import NERClient
+        nlp = NERClient(ner_address, authkey=ner_authkey)
+    else:
+        from .ner import NERModelLoader
+        nlp = NERModelLoader().load()
+    # the parent journals what it merges from the workers: a worker writing
+    # the same records to the shared journal would duplicate (and interleave) them
+    kb = open_knowledge_base(kb_path, journal=False)
+    _worker_processor = PDFProcessor(RedactionConfig(config_path), kb, nlp_pipeline=nlp,
+                                     save_profile=save_profile)
+    logger.debug("batch worker %d ready (ner=%s)", os.getpid(), nlp is not None)
+
+
+def _process_jobs(jobs):
+    """Process a group of (input, output) jobs; NER is pooled across the group."""
+    results = []
+    if len(jobs) > 1:
+        start = time.perf_counter()
+        _worker_processor.prefetch_ner([inp for inp, _ in jobs])
+        # spread the pooled NER time over the group's documents
+        shared = (time.perf_counter() - start) / len(jobs)
+    else:
+        shared = 0.0
+    try:
+        for input_path, output_path in jobs:
+            start = time.perf_counter()
+            redactions = _worker_processor.process_pdf_final(input_path, output_path)
+            elapsed = time.perf_counter() - start + shared
+            # Ship only the rules (and fingerprint aliases) this worker learned;
+            # the parent merges them into its KB.
+            kb = _worker_processor.kb
+            updates = {"rules": kb.take_updates(), "aliases": kb.take_alias_updates(),
+                       "signatures": kb.take_signature_updates()}
+            results.append((input_path, redactions, elapsed, updates))
+    finally:
+        if _worker_processor.nlp is not None:
+            _worker_processor.nlp.discard_prefetched()
+    return results
+
+
+def _process_shard(input_path, part_path, start, end, rules):
+    """Redact one page range of a sharded document (see sharding.ShardedJob)."""
+    begin = time.perf_counter()
+    result = _worker_processor.process_shard(input_path, part_path, start, end, rules)
+    return result, time.perf_counter() - begin
+
+
+def _finish_shard(fut, sharded, index, report, progress):
+    try:
+        result, elapsed = fut.result()
+    except Exception:
+        logger.exception("batch: shard %d of %s failed", index, sharded.input_pdf)
+        result, elapsed = None, 0.0
+    report["busy_seconds"] += elapsed
+    if result is None and not sharded.failed:
+        sharded.failed = True
+        report["failed"] += 1
+        progress.update(1)
+    if not sharded.complete(index, result):
+        return
+    # every shard of the document is in, whatever its status: stitch (if none failed), then drop the parts
+    try:
+        if not sharded.failed:
+            report["redactions"] += sharded.finish()
+            progress.update(1)
+    except Exception:
+        logger.exception("batch: stitching %s failed", sharded.input_pdf)
+        report["failed"] += 1
+        progress.update(1)
+    finally:
+        sharded.cleanup()
+
+
+def _page_count(path):
+    try:
+        import fitz
+        with fitz.open(path) as doc:
+            return len(doc)
+    except Exception:
+        logger.exception("batch: could not count the pages of %s", path)
+        return 0
+
+
+def _run_pool(jobs, kb, workers, initargs, docs_per_task, report, sharded=()):
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        futures = {}
+        progress = tqdm(total=len(jobs) + len(sharded), desc="Batch")
+        # shards of large documents go first so they don't form the tail of the batch
+        for job in sharded:
+            try:
+                tasks = job.prepare()
+            except Exception:
+                logger.exception("batch: could not shard %s", job.input_pdf)
+                job.cleanup()
+                report["failed"] += 1
+                progress.update(1)
+                continue
+            for index, task in enumerate(tasks):
+                futures[pool.submit(_process_shard, *task)] = (job, index)
+        step = max(1, docs_per_task)
+        groups = [jobs[i:i + step] for i in range(0, len(jobs), step)]
+        futures.update({pool.submit(_process_jobs, group): group for group in groups})
+        for fut in as_completed(futures):
+            group = futures[fut]
+            if isinstance(group, tuple):
+                _finish_shard(fut, group[0], group[1], report, progress)
+                continue
+            progress.update(len(group))
+            try:
+                results = fut.result()
+            except Exception:
+                logger.exception("batch: worker failed on %s", [inp for inp, _ in group])
+                report["failed"] += len(group)
+                continue
+            for _, redactions, elapsed, updates in results:
+                report["redactions"] += redactions
+                report["busy_seconds"] += elapsed
+                kb.merge(updates["rules"])
+                kb.merge_aliases(updates["aliases"])
+                kb.merge_signatures(updates["signatures"])
+        progress.close()
+
+
+def run_batch(jobs, kb, workers, config_path=REDACTION_CONFIG_FILE, rules_only=None, docs_per_task=1,
+              shared_ner=False, save_profile=None, shard_pages=None):
+    """
+    Process (input_pdf, output_pdf) jobs on a pool of `workers` processes.
+
+    Each worker loads the NER pipeline and its own PDFProcessor once at startup.
+    With `shared_ner` one NER server process holds the model instead and the
+    workers' requests are micro-batched together (see ner_server); setting
+    NER_SERVER points the workers at an already running server.
+    Jobs are handed out `docs_per_task` at a time so NER batches can be pooled
+    across the documents of one task. `save_profile` picks how the workers
+    write their output (see RedactionConfig.get_save_options).
+    Documents of at least 2 * `shard_pages` pages are split by page range into
+    up to `workers` shards of at least `shard_pages` pages each, processed in
+    parallel and stitched back into one output (see sharding.ShardedJob).
+    Rules learned by workers are merged into `kb` (the caller still saves it);
+    with a SQLite KB the workers write to the shared database directly.
+    Returns a report dict with aggregate throughput numbers.
+    """
+    if rules_only is None:
+        rules_only = os.environ.get("RULES_ONLY", "0") == "1"
+    # The workers read the KB from disk, so make sure it reflects the caller's copy.
+    if kb.data or kb.aliases or kb.signatures:
+        kb.save()
+
+    sharded = []
+    if shard_pages:
+        parent = PDFProcessor(RedactionConfig(config_path), kb, save_profile=save_profile)
+        small = []
+        for input_pdf, output_pdf in jobs:
+            if _page_count(input_pdf) >= 2 * shard_pages:
+                sharded.append(ShardedJob(parent, input_pdf, output_pdf, workers, shard_pages))
+            else:
+                small.append((input_pdf, output_pdf))
+        jobs = small
+    report = {"files": len(jobs) + len(sharded), "failed": 0, "redactions": 0, "learned": 0,
+              "busy_seconds": 0.0, "sharded": len(sharded)}
+    known = len(kb.data)
+    server = address = authkey = None
+    if shared_ner and not rules_only:
+        from .ner_server import start_ner_server
+        try:
+            server, address, authkey = start_ner_server(
+                batch_size=RedactionConfig(config_path).get_ner_settings()["batch_size"])
+        except Exception:
+            logger.exception("batch: NER server failed to start; workers load their own model")
+    start = time.perf_counter()
+    try:
+        initargs = (kb.path, config_path, rules_only, address, authkey, save_profile)
+        _run_pool(jobs, kb, workers, initargs, docs_per_task, report, sharded)
+    finally:
+        if server is not None:
+            from .ner_server import stop_ner_server
+            stop_ner_server(server, address)
+
+    wall = time.perf_counter() - start
+    report["learned"] = len(kb.data) - known
+    done = report["files"] - report["failed"]
+    report["wall_seconds"] = wall
+    report["files_per_second"] = done / wall if wall > 0 else 0.0
+    logger.info("batch: %d/%d files in %.2fs with %d workers (%.2f files/s, %.2fs busy, %d redactions, %d new templates)",
+                done, report["files"], wall, workers, report["files_per_second"],
+                report["busy_seconds"], report["redactions"], report["learned"])
+    return report
@@ -5,6 +5,16 @@ from .logger import get_logger
 
 logger = get_logger(__name__)
 
+# doc.save() keyword options per save profile (section "save" can add or override profiles)
+SAVE_PROFILES = {
+    # smallest, fully sanitized file: cross-file object dedupe and clean content streams
+    "archive": {"garbage": 4, "deflate": True, "clean": True},
+    # high-volume output: drop unused objects only, keep content streams as they are
+    "fast": {"garbage": 1, "deflate": True},
+    # for web viewing; needs a MuPDF that can still linearize (see PDFProcessor._save)
+    "linearized": {"garbage": 3, "deflate": True, "linear": True},
+}
+
 class RedactionConfig:
     """Load and provide redaction config (how many digits to keep)."""
 
@@ -32,4 +42,56 @@ class RedactionConfig:
 
         Returns the raw dictionary from config or the provided default.
         """
-        return self.cfg.get("exclude", {}).get(key, default)
\ No newline at end of file
+        return self.cfg.get("exclude", {}).get(key, default)
+
+    def get_template_matching(self):
+        """Settings for matching documents to KB templates (section "templates").
+
+        "fingerprint": "text" (hash of page-0 header text) or "tiered"
+        (structural hash first, text hash only on a miss).
+        "near_duplicate_threshold": SimHash similarity (0..1) at which an unknown
+        document reuses the closest known template's rules; None disables it.
+        """
+        settings = {"fingerprint": "text", "near_duplicate_threshold": None}
+        settings.update(self.cfg.get("templates", {}) or {})
+        return settings
+
+    def get_ner_settings(self):
+        """NERStage settings (section "ner"): token window, chunk overlap, batch size and result cache."""
+        settings = {"max_tokens": 256, "overlap": 32, "batch_size": 8, "cache_path": None, "cache_size": 4096}
+        settings.update(self.cfg.get("ner", {}) or {})
+        return settings
+
+    def get_save_options(self, profile=None):
+        """doc.save() options of a save profile (section "save").
+
+        `profile` defaults to save.profile ("archive"); save.profiles may
+        define new profiles or override the built-in ones (SAVE_PROFILES).
+        Unknown profiles fall back to "archive".
+        """
+        section = self.cfg.get("save", {}) or {}
+        profiles = dict(SAVE_PROFILES)
+        profiles.update(section.get("profiles", {}) or {})
+        name = profile or section.get("profile", "archive")
+        if name not in profiles:
+            logger.warning("Unknown save profile %r; using archive", name)
+            name = "archive"
+        return name, dict(profiles[name])
+
+    def get_streaming_settings(self):
+        """Page-streaming mode (section "streaming", see PDFProcessor).
+
+        "enabled": stream every document; "min_pages": stream documents with
+        at least this many pages (None = off); "memory_limit_mb": RSS ceiling
+        checked after each streamed page (None = report only).
+        STREAMING=1/0 (always/never) and MEMORY_LIMIT_MB override the config.
+        """
+        settings = {"enabled": False, "min_pages": None, "memory_limit_mb": None}
+        settings.update(self.cfg.get("streaming", {}) or {})
+        if os.environ.get("STREAMING") == "1":
+            settings["enabled"] = True
+        elif os.environ.get("STREAMING") == "0":
+            settings.update(enabled=False, min_pages=None)
+        if os.environ.get("MEMORY_LIMIT_MB"):
+            settings["memory_limit_mb"] = float(os.environ["MEMORY_LIMIT_MB"])
+        return settings
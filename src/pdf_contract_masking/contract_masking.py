@@ -1,27 +1,42 @@
 import os
 import argparse
-from tqdm import tqdm
 from pdf_contract_masking.processor import PDFProcessor
 from pdf_contract_masking.ner import NERModelLoader
-from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking.knowledge_base import open_knowledge_base
+from pdf_contract_masking.constants import KNOWLEDGE_BASE_FILE
 from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.batch import run_batch
 
 
 def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(description="Process and redact PDFs in ./contract or a single file")
     parser.add_argument("--input", "-i", help="Path to a single input PDF to process")
     parser.add_argument("--output", "-o", help="Exact path to write the processed PDF when --input is given")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Number of worker processes for batch mode (each loads its own NER model)")
+    parser.add_argument("--kb", default=KNOWLEDGE_BASE_FILE,
+                        help="Knowledge base file (.json, or .db/.sqlite for the SQLite backend)")
+    parser.add_argument("--ner-batch-docs", type=int, default=4,
+                        help="Documents whose pages share one batched NER pass")
+    parser.add_argument("--shared-ner", action="store_true",
+                        help="Batch mode: load the NER model once in a server process shared by all workers")
+    parser.add_argument("--save-profile", default=None,
+                        help="How output PDFs are saved: archive (default), fast or linearized")
+    parser.add_argument("--shard-pages", type=int, default=None,
+                        help="With --workers: Split documents of at least twice this many pages across the workers by page range")
     args = parser.parse_args(argv)
+    # a single --input only uses the workers when it is page-sharded
+    parallel = args.workers > 1 and (not args.input or bool(args.shard_pages))
 
-    # Allow RULES_ONLY to skip model download
-    if os.environ.get("RULES_ONLY", "0") == "1":
+    # Allow RULES_ONLY to skip model download; parallel workers load their own copy
+    if os.environ.get("RULES_ONLY", "0") == "1" or parallel:
         nlp = None
     else:
         nlp = NERModelLoader().load()
 
-    kb = KnowledgeBase()
+    kb = open_knowledge_base(args.kb)
     cfg = RedactionConfig()
-    proc = PDFProcessor(cfg, kb, nlp_pipeline=nlp)
+    proc = PDFProcessor(cfg, kb, nlp_pipeline=nlp, save_profile=args.save_profile)
 
     output_directory = "hop_dong_da_che_AI_Final"
     os.makedirs(output_directory, exist_ok=True)
@@ -35,7 +50,11 @@ def main(argv: list[str] | None = None) -> int:
             # default: put into output_directory with che_ prefix
             output_path = os.path.join(output_directory, f"che_{os.path.basename(input_path)}")
         print(f"Processing single file: {input_path} -> {output_path}")
-        proc.process_pdf_final(input_path, output_path)
+        if parallel:
+            run_batch([(input_path, output_path)], kb, args.workers, config_path=cfg.path,
+                      save_profile=args.save_profile, shard_pages=args.shard_pages)
+        else:
+            proc.process_pdf_final(input_path, output_path)
     else:
         # Batch mode: process all PDFs under ./contract
         pdf_files = [f for f in os.listdir("./contract")
@@ -46,10 +65,13 @@ def main(argv: list[str] | None = None) -> int:
             return 0
 
         print(f"Tìm thấy {len(pdf_files)} file PDF. Bắt đầu xử lý...")
-        for filename in tqdm(pdf_files, desc="Tổng tiến trình"):
-            input_path = os.path.join("./contract", filename)
-            output_filename = os.path.join(output_directory, f"che_{filename}")
-            proc.process_pdf_final(input_path, output_filename)
+        jobs = [(os.path.join("./contract", filename), os.path.join(output_directory, f"che_{filename}"))
+                for filename in pdf_files]
+        if parallel:
+            run_batch(jobs, kb, args.workers, config_path=cfg.path, docs_per_task=args.ner_batch_docs,
+                      shared_ner=args.shared_ner, save_profile=args.save_profile, shard_pages=args.shard_pages)
+        else:
+            proc.process_jobs(jobs, docs_per_batch=args.ner_batch_docs, desc="Tổng tiến trình")
 
     kb.save()
     print("--- Hoàn tất! Đã cập nhật cơ sở tri thức. ---")
@@ -2,17 +2,66 @@ import os
 import json
 import hashlib
 import re
+from collections import OrderedDict
 import fitz  # PyMuPDF
 from .constants import KNOWLEDGE_BASE_FILE
+from .rule_plan import RulePlan
+from .template_index import SimHashIndex, SIGNATURE_BITS
 from .logger import get_logger
 logger = get_logger(__name__)
 
+# Content-stream operands that carry document text rather than layout:
+# TJ arrays, literal strings and hex strings (dropped by the structural hash).
+_TEXT_OPERANDS = re.compile(rb"\[[^\]]*\]|\((?:[^\\()]++|\\.)*+\)|<[0-9A-Fa-f\s]*>")
+_OBJ_REFS = re.compile(r"(\d+) 0 R")
+_FONT_REFS = re.compile(r"/([^\s/<>\[\]()]+)\s*(\d+) 0 R")
+# A structural alias is trusted once the text fingerprint confirmed it this often.
+ALIAS_MIN_HITS = 2
+# KB paths with these suffixes are opened as SQLite databases (see open_knowledge_base)
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def open_knowledge_base(path=KNOWLEDGE_BASE_FILE, **kwargs):
+    """Open the KB at `path`: SQLite for .db/.sqlite files, the JSON file otherwise."""
+    if str(path).lower().endswith(SQLITE_SUFFIXES):
+        from .sqlite_kb import SQLiteKnowledgeBase
+        return SQLiteKnowledgeBase(path, **kwargs)
+    return KnowledgeBase(path, **kwargs)
+
+
 class KnowledgeBase:
-    """Load/save KB and create document fingerprint."""
+    """Load/save KB and create document fingerprint.
 
-    def __init__(self, path=KNOWLEDGE_BASE_FILE):
+    With `journal=True` (or KB_JOURNAL=1) every update is appended to
+    `<kb>.journal.jsonl` as it happens and save() only rewrites the snapshot
+    once `compact_every` records have piled up. A journal found on load is
+    replayed on top of the snapshot whether or not journaling is enabled.
+    """
+
+    def __init__(self, path=KNOWLEDGE_BASE_FILE, plan_cache_size=256, journal=None, compact_every=1000):
         self.path = path
+        if journal is None:
+            journal = os.environ.get("KB_JOURNAL", "0") == "1"
+        self.journal = journal
+        self.compact_every = compact_every
+        self.journal_path = f"{os.path.splitext(path)[0]}.journal.jsonl"
+        self._journal_records = 0
         self.data = self.load()
+        # alias key -> {"fingerprint": fp or None (ambiguous), "hits": n}, kept in a sidecar file
+        self.alias_path = f"{os.path.splitext(path)[0]}.aliases.json"
+        self.aliases = self.load_aliases()
+        # fingerprint -> SimHash signature (hex) of the template's first page, for near-duplicate lookup
+        self.signature_path = f"{os.path.splitext(path)[0]}.signatures.json"
+        self.signatures = self.load_signatures()
+        self._similar = None
+        # fingerprints added through add_rules() since the last take_updates()
+        self._pending = []
+        self._pending_aliases = []
+        self._pending_signatures = []
+        # fingerprint -> RulePlan, least recently used first
+        self.plan_cache_size = plan_cache_size
+        self._plans = OrderedDict()
+        self._replay_journal()
 
     def load(self):
         if os.path.exists(self.path):
@@ -24,9 +73,255 @@ class KnowledgeBase:
                 return {}
         return {}
 
+    def load_aliases(self):
+        return self._load_sidecar(self.alias_path)
+
+    def load_signatures(self):
+        return self._load_sidecar(self.signature_path)
+
+    @staticmethod
+    def _load_sidecar(path):
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.exception("KnowledgeBase: failed to read %s", path)
+        return {}
+
+    @staticmethod
+    def _save_sidecar(path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _replay_journal(self):
+        """Apply the records of an existing journal on top of the loaded snapshot."""
+        if not os.path.exists(self.journal_path):
+            return
+        tables = {"rules": self.data, "alias": self.aliases, "signature": self.signatures}
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    tables[record["kind"]][record["key"]] = record["value"]
+                except Exception:
+                    # typically the last line of a journal cut short by a crash
+                    logger.warning("KnowledgeBase: skipping unreadable journal record %s:%d", self.journal_path, line_no)
+                    continue
+                self._journal_records += 1
+        logger.debug("KnowledgeBase: replayed %d journal records", self._journal_records)
+        if self.journal:
+            self._drop_torn_tail()
+
+    def _drop_torn_tail(self):
+        """Cut an unterminated last record (a write cut short by a crash) off the journal.
+
+        Otherwise the next append would continue that line and both records
+        would be lost on the following replay. Only a journaling KB (the
+        single writer) does this; readers leave the file alone.
+        """
+        with open(self.journal_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+                logger.warning("KnowledgeBase: dropped a torn record at the end of %s", self.journal_path)
+
+    def _append_journal(self, kind, key, value):
+        if not self.journal:
+            return
+        record = json.dumps({"kind": kind, "key": key, "value": value}, ensure_ascii=False)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(record + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_records += 1
+
+    def compact(self):
+        """Fold the journal into the snapshot files and start a new journal."""
+        self._write_snapshot()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_records = 0
+
     def save(self):
-        with open(self.path, "w", encoding="utf-8") as f:
+        if self.journal and self._journal_records < self.compact_every:
+            # every update is already in the journal
+            return
+        self.compact()
+
+    def _write_snapshot(self):
+        # Write to a temp file and swap it in so a crash (or a concurrent
+        # reader) never sees a half-written KB.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(self.data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        if self.aliases:
+            self._save_sidecar(self.alias_path, self.aliases)
+        if self.signatures:
+            self._save_sidecar(self.signature_path, self.signatures)
+
+    def add_rules(self, fingerprint, rules):
+        """Store learned rules for a fingerprint and remember it as a pending update."""
+        self.data[fingerprint] = rules
+        self._pending.append(fingerprint)
+        self._append_journal("rules", fingerprint, rules)
+
+    def record_alias(self, key, fingerprint):
+        """Note that documents with alias `key` had KB fingerprint `fingerprint`.
+
+        Repeated agreement raises the alias' hit count; a conflicting
+        fingerprint marks the alias ambiguous (fingerprint None) for good.
+        """
+        entry = self.aliases.get(key)
+        if entry is None:
+            entry = {"fingerprint": fingerprint, "hits": 1}
+        elif entry.get("fingerprint") == fingerprint:
+            entry["hits"] = entry.get("hits", 0) + 1
+        elif entry.get("fingerprint") is not None:
+            logger.info("KnowledgeBase: alias %s is ambiguous (%s vs %s); disabling it",
+                        key, entry.get("fingerprint"), fingerprint)
+            entry["fingerprint"] = None
+        else:
+            return
+        # (re)assign so table-backed alias maps store the change
+        self.aliases[key] = entry
+        self._pending_aliases.append(key)
+        self._append_journal("alias", key, entry)
+
+    def resolve_alias(self, key, min_hits=1):
+        """Fingerprint a trusted alias points to, if its rules are in the KB."""
+        entry = self.aliases.get(key)
+        if not entry or entry.get("hits", 0) < min_hits:
+            return None
+        fingerprint = entry.get("fingerprint")
+        return fingerprint if fingerprint in self.data else None
+
+    def lookup(self, doc, mode="text", record=True):
+        """Return the KB fingerprint of a document.
+
+        mode "text" is create_fingerprint(). mode "tiered" first maps the
+        cheap structural fingerprint through the alias table and only falls
+        back to the page-0 text fingerprint on a miss, recording the pair so
+        later documents with the same skeleton can skip text extraction.
+        `record=False` looks up without recording (e.g. for a look-ahead).
+        """
+        struct_key = None
+        if mode == "tiered":
+            structural = self.create_structural_fingerprint(doc)
+            if structural:
+                struct_key = f"struct:{structural}"
+                fingerprint = self.resolve_alias(struct_key, ALIAS_MIN_HITS)
+                if fingerprint:
+                    logger.debug("KnowledgeBase.lookup: structural hit %s -> %s", struct_key, fingerprint)
+                    return fingerprint
+        fingerprint = self.create_fingerprint(doc)
+        if struct_key and fingerprint and record:
+            self.record_alias(struct_key, fingerprint)
+        if fingerprint and fingerprint not in self.data:
+            # near-duplicate of a known template seen before (see find_similar)
+            return self.resolve_alias(fingerprint) or fingerprint
+        return fingerprint
+
+    def add_signature(self, fingerprint, signature):
+        """Store the SimHash signature of a template's first page."""
+        self.signatures[fingerprint] = f"{signature:016x}"
+        self._pending_signatures.append(fingerprint)
+        self._append_journal("signature", fingerprint, self.signatures[fingerprint])
+        if self._similar is not None:
+            self._similar.add(fingerprint, signature)
+
+    def find_similar(self, signature, threshold):
+        """(fingerprint, similarity) of the closest known template at or above threshold.
+
+        Candidates come from a banded SimHash index built on first use; only
+        templates that still have rules in the KB are returned.
+        """
+        max_distance = int((1.0 - threshold) * SIGNATURE_BITS + 1e-9)
+        if self._similar is None or self._similar.max_distance != max_distance:
+            self._similar = SimHashIndex(max_distance)
+            for fingerprint, hex_signature in self.signatures.items():
+                self._similar.add(fingerprint, int(hex_signature, 16))
+        match = self._similar.nearest(signature)
+        if match is None or match[0] not in self.data:
+            return None
+        return match
+
+    def get_plan(self, fingerprint):
+        """Return the compiled RulePlan for a known fingerprint (None if unknown).
+
+        Plans are kept in an LRU cache and rebuilt when the rules stored for
+        the fingerprint were replaced.
+        """
+        rules = self.data.get(fingerprint)
+        if rules is None:
+            return None
+        plan = self._plans.get(fingerprint)
+        if plan is not None and plan.source is rules:
+            self._plans.move_to_end(fingerprint)
+            return plan
+        plan = RulePlan(rules)
+        self._plans[fingerprint] = plan
+        self._plans.move_to_end(fingerprint)
+        while len(self._plans) > self.plan_cache_size:
+            self._plans.popitem(last=False)
+        return plan
+
+    def take_updates(self):
+        """Return {fingerprint: rules} added since the last call and reset the list."""
+        updates = {fp: self.data[fp] for fp in self._pending if fp in self.data}
+        self._pending = []
+        return updates
+
+    def take_alias_updates(self):
+        """Return {alias: entry} changed since the last call and reset the list."""
+        updates = {key: dict(self.aliases[key]) for key in self._pending_aliases if key in self.aliases}
+        self._pending_aliases = []
+        return updates
+
+    def merge_aliases(self, updates):
+        """Merge alias entries recorded elsewhere; conflicting targets become ambiguous."""
+        for key, entry in (updates or {}).items():
+            mine = self.aliases.get(key)
+            if mine is None:
+                self.aliases[key] = dict(entry)
+            elif mine.get("fingerprint") != entry.get("fingerprint"):
+                mine["fingerprint"] = None
+            else:
+                mine["hits"] = max(mine.get("hits", 0), entry.get("hits", 0))
+            if mine is not None:
+                self.aliases[key] = mine
+            self._pending_aliases.append(key)
+            self._append_journal("alias", key, self.aliases[key])
+
+    def take_signature_updates(self):
+        """Return {fingerprint: signature} added since the last call and reset the list."""
+        updates = {fp: self.signatures[fp] for fp in self._pending_signatures if fp in self.signatures}
+        self._pending_signatures = []
+        return updates
+
+    def merge_signatures(self, updates):
+        for fingerprint, hex_signature in (updates or {}).items():
+            if fingerprint not in self.signatures:
+                self.add_signature(fingerprint, int(hex_signature, 16))
+
+    def merge(self, updates):
+        """Merge rules learned elsewhere (e.g. by a batch worker).
+
+        Existing fingerprints win so rules never flip between runs; returns the
+        number of fingerprints that were added.
+        """
+        added = 0
+        for fingerprint, rules in (updates or {}).items():
+            if fingerprint in self.data:
+                continue
+            self.add_rules(fingerprint, rules)
+            added += 1
+        return added
 
     @staticmethod
     def create_fingerprint(doc):
@@ -40,6 +335,55 @@ class KnowledgeBase:
             return None
         return hashlib.sha256(fingerprint_text.encode("utf-8")).hexdigest()
 
+    @staticmethod
+    def _page_contents(doc, xref):
+        """Raw (decompressed) content stream bytes of the page object `xref`."""
+        kind, value = doc.xref_get_key(xref, "Contents")
+        if kind not in ("xref", "array"):
+            return b""
+        return b"\n".join(doc.xref_stream(int(x)) or b"" for x in _OBJ_REFS.findall(value))
+
+    @staticmethod
+    def _font_resources(doc, xref):
+        """Sorted "name=BaseFont" entries of a page object's font resources."""
+        kind, value = doc.xref_get_key(xref, "Resources/Font")
+        if kind == "xref":
+            value = doc.xref_object(int(value.split()[0]), compressed=True)
+        elif kind != "dict":
+            # resources inherited from the page tree: let MuPDF resolve them
+            return sorted(f"{f[4]}={f[3].split('+', 1)[-1]}" for f in doc.get_page_fonts(0))
+        fonts = []
+        for name, font_xref in _FONT_REFS.findall(value):
+            base = doc.xref_get_key(int(font_xref), "BaseFont")[1].lstrip("/")
+            fonts.append(f"{name}={base.split('+', 1)[-1]}")
+        return sorted(fonts)
+
+    @staticmethod
+    def create_structural_fingerprint(doc):
+        """Hash of page 0's layout skeleton, read straight from the PDF objects.
+
+        Uses the raw content stream with its text operands removed, the
+        page's font resources (subset prefixes stripped) and its MediaBox.
+        No page is loaded or laid out, and documents that only differ in
+        their text share this hash.
+        """
+        if len(doc) == 0 or not doc.is_pdf:
+            return None
+        try:
+            xref = doc.page_xref(0)
+            contents = KnowledgeBase._page_contents(doc, xref)
+            if not contents:
+                return None
+            skeleton = b" ".join(_TEXT_OPERANDS.sub(b"", contents).split())
+            fonts = KnowledgeBase._font_resources(doc, xref)
+            mediabox = doc.xref_get_key(xref, "MediaBox")[1]
+        except Exception:
+            logger.exception("KnowledgeBase.create_structural_fingerprint failed")
+            return None
+        h = hashlib.sha256(skeleton)
+        h.update("|".join(fonts + [mediabox]).encode("utf-8"))
+        return h.hexdigest()
+
     @staticmethod
     def sanitize_anchor_text(anchor: str) -> str:
         if not anchor:
@@ -1,21 +1,49 @@
-import torch
-from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
+import os
 from .logger import get_logger
 logger = get_logger(__name__)
 
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
 class NERModelLoader:
-    """Load a Vietnamese NER pipeline (lazy)."""
+    """Load a Vietnamese NER pipeline (lazy).
+
+    `backend` (default: NER_BACKEND env, else "torch") picks how the model
+    runs: "torch", "onnx" (onnxruntime on CPU) or "onnx-int8" (onnxruntime
+    with dynamically quantized int8 weights). ONNX backends fall back to
+    torch when onnxruntime is unavailable or the export fails.
+    """
 
-    def __init__(self, model_name="vinai/phobert-base-v2"):
+    def __init__(self, model_name="vinai/phobert-base-v2", backend=None, onnx_dir=None):
         self.model_name = model_name
+        self.backend = backend or os.environ.get("NER_BACKEND", "torch")
+        if self.backend not in BACKENDS:
+            logger.warning("Unknown NER backend %r; using torch", self.backend)
+            self.backend = "torch"
+        self.onnx_dir = onnx_dir
         self.pipeline = None
 
     def load(self):
         if self.pipeline is not None:
             return self.pipeline
         try:
+            # the ML stack is imported only when a model is requested, so
+            # RULES_ONLY runs and short-lived workers start without it
+            import torch
+            from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
             tokenizer = AutoTokenizer.from_pretrained(self.model_name)
             model = AutoModelForTokenClassification.from_pretrained(self.model_name)
+            if self.backend != "torch":
+                try:
+                    from .onnx_backend import build_onnx_pipeline
+                    self.pipeline = build_onnx_pipeline(
+                        self.model_name, model, tokenizer,
+                        quantize=self.backend == "onnx-int8", onnx_dir=self.onnx_dir,
+                    )
+                    # free the fp32 weights; the ONNX session has its own copy
+                    del model
+                    return self.pipeline
+                except Exception:
+                    logger.exception("NERModelLoader.load: %s backend failed; using torch", self.backend)
             self.pipeline = pipeline(
                 "ner",
                 model=model,
@@ -26,4 +54,4 @@ class NERModelLoader:
             return self.pipeline
         except Exception as e:
             logger.exception("NERModelLoader.load failed")
-            return None
\ No newline at end of file
+            return None
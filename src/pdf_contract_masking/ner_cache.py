@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from .logger import get_logger
+logger = get_logger(__name__)
+
+
+class NERCache:
+    """Entity lists of NER'd text chunks, keyed by content hash.
+
+    An in-process LRU of `max_items` entries sits in front of an optional
+    SQLite file (WAL mode, shared by batch workers). Keys come from key():
+    a hash of the model namespace and the normalized chunk text, so identical
+    boilerplate chunks cost a lookup instead of a forward pass.
+    """
+
+    def __init__(self, path=None, max_items=4096, timeout=30.0):
+        self.path = path
+        self.max_items = max_items
+        self.timeout = timeout
+        self._lru = OrderedDict()
+        self._conn = None
+        self._pid = None
+
+    @staticmethod
+    def key(namespace, text):
+        return hashlib.blake2b(f"{namespace}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def _connection(self):
+        if not self.path:
+            return None
+        # sqlite connections must not cross a fork: reconnect in each process
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=self.timeout)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                self._conn.execute("CREATE TABLE IF NOT EXISTS ner (key TEXT PRIMARY KEY, entities TEXT NOT NULL)")
+            self._pid = os.getpid()
+        return self._conn
+
+    def _remember(self, key, entities):
+        if self.max_items <= 0:
+            return
+        self._lru[key] = entities
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys):
+        """{key: entities} for the cached keys among `keys`."""
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                found[key] = self._lru[key]
+            else:
+                missing.append(key)
+        if missing:
+            try:
+                conn = self._connection()
+                for i in range(0, len(missing) if conn is not None else 0, 500):
+                    part = missing[i:i + 500]
+                    rows = conn.execute(
+                        f"SELECT key, entities FROM ner WHERE key IN ({','.join('?' * len(part))})", part
+                    ).fetchall()
+                    for key, value in rows:
+                        found[key] = json.loads(value)
+                        self._remember(key, found[key])
+            except sqlite3.Error:
+                logger.exception("NERCache.get_many: reading %s failed", self.path)
+        return found
+
+    def put_many(self, items):
+        """Store {key: entities} (JSON-serializable entity dicts)."""
+        for key, entities in items.items():
+            self._remember(key, entities)
+        try:
+            conn = self._connection()
+            if conn is not None and items:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO ner (key, entities) VALUES (?, ?)",
+                        [(key, json.dumps(entities, ensure_ascii=False)) for key, entities in items.items()],
+                    )
+        except sqlite3.Error:
+            logger.exception("NERCache.put_many: writing %s failed", self.path)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
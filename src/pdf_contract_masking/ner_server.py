@@ -0,0 +1,297 @@
+import os
+import sys
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+from .ner_stage import _plain
+from .logger import get_logger
+logger = get_logger(__name__)
+
+
+def parse_address(address):
+    """"host:port" -> (host, port); anything else is a Unix socket path."""
+    if isinstance(address, str):
+        host, sep, port = address.rpartition(":")
+        if sep and host and port.isdigit() and os.sep not in address:
+            return host, int(port)
+    return address
+
+
+def default_address():
+    """A fresh Unix socket path (localhost TCP where AF_UNIX is unavailable)."""
+    if sys.platform == "win32":
+        return ("127.0.0.1", 0)
+    return os.path.join(tempfile.mkdtemp(prefix="ner-server-"), "ner.sock")
+
+
+class NERServer:
+    """Serve one NER pipeline to many worker processes over a local socket.
+
+    Requests from all connections are queued and micro-batched: the batcher
+    waits up to `max_wait` seconds for more texts (up to `max_batch`) and runs
+    them through the pipeline in one call. Connections authenticate with
+    `authkey` (multiprocessing HMAC handshake) before anything is unpickled.
+
+    Messages: ("ner", texts) -> ("ok", [entities]), ("tokenize", words) ->
+    ("ok", [token counts]), ("info",) -> ("ok", {...}).
+    """
+
+    def __init__(self, pipeline, address, authkey, batch_size=8, max_batch=64, max_wait=0.005):
+        self.pipeline = pipeline
+        self.tokenizer = getattr(pipeline, "tokenizer", None)
+        self.batch_size = batch_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._listener = Listener(parse_address(address), authkey=authkey)
+        self.address = self._listener.address
+        self._requests = queue.Queue()
+        self._tokenizer_lock = threading.Lock()
+        self._closed = threading.Event()
+        self.stats = {"requests": 0, "texts": 0, "batches": 0}
+
+    def info(self):
+        model = getattr(self.pipeline, "model", None)
+        return {
+            "model": getattr(model, "name_or_path", None) or getattr(getattr(model, "config", None), "_name_or_path", ""),
+            "backend": getattr(self.pipeline, "backend_name", None) or type(self.pipeline).__name__,
+            "model_max_length": getattr(self.tokenizer, "model_max_length", None),
+        }
+
+    def serve_forever(self):
+        threading.Thread(target=self._batch_loop, name="ner-batcher", daemon=True).start()
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                if self._closed.is_set():
+                    break
+                logger.exception("NERServer: accept failed")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), name="ner-conn", daemon=True).start()
+
+    def close(self):
+        self._closed.set()
+        self._requests.put(None)
+        try:
+            self._listener.close()
+        except Exception:
+            logger.exception("NERServer: closing the listener failed")
+
+    def _handle(self, conn):
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    break
+                op = message[0]
+                if op == "ner":
+                    reply = queue.Queue(1)
+                    self._requests.put((list(message[1]), reply))
+                    conn.send(reply.get())
+                elif op == "tokenize":
+                    conn.send(("ok", self._count_tokens(message[1])))
+                elif op == "info":
+                    conn.send(("ok", self.info()))
+                else:
+                    conn.send(("error", f"unknown request {op!r}"))
+        finally:
+            conn.close()
+
+    def _count_tokens(self, words):
+        if self.tokenizer is None:
+            return [0] * len(words)
+        with self._tokenizer_lock:
+            return [len(self.tokenizer.tokenize(w)) for w in words]
+
+    def _batch_loop(self):
+        while not self._closed.is_set():
+            item = self._requests.get()
+            if item is None:
+                break
+            batch, size = [item], len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._closed.set()
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._run(batch)
+
+    def _run(self, batch):
+        texts = [t for item_texts, _ in batch for t in item_texts]
+        try:
+            results = self.pipeline(texts, batch_size=self.batch_size) if texts else []
+            if len(texts) == 1 and results and isinstance(results[0], dict):
+                results = [results]
+            results = [[_plain(ent) for ent in entities] for entities in results]
+        except Exception as e:
+            logger.exception("NERServer: pipeline failed on %d texts", len(texts))
+            for _, reply in batch:
+                reply.put(("error", repr(e)))
+            return
+        self.stats["requests"] += len(batch)
+        self.stats["texts"] += len(texts)
+        self.stats["batches"] += 1
+        pos = 0
+        for item_texts, reply in batch:
+            reply.put(("ok", results[pos:pos + len(item_texts)]))
+            pos += len(item_texts)
+
+
+class _RemoteTokenizer:
+    """Token counting for NERStage chunking, answered by the server's tokenizer."""
+
+    def __init__(self, client, model_max_length):
+        self._client = client
+        self.model_max_length = model_max_length
+
+    def count_tokens(self, words):
+        return self._client._request("tokenize", list(words))
+
+    def tokenize(self, text):
+        return [None] * self.count_tokens([text])[0]
+
+
+class NERClient:
+    """Pipeline-compatible callable that sends NER requests to an NERServer.
+
+    client(texts) -> [entities] (client(text) -> entities), like a
+    HuggingFace "ner" pipeline with aggregation. Wrap it in an NERStage as
+    usual: chunking and the result cache stay in the calling process.
+    """
+
+    def __init__(self, address, authkey=None, timeout=60.0):
+        self.address = parse_address(address)
+        key = authkey if authkey is not None else os.environ.get("NER_SERVER_KEY", "")
+        self.authkey = key.encode() if isinstance(key, str) else key
+        self.timeout = timeout
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        info = self._request("info")
+        self.model_name = info.get("model") or ""
+        self.backend_name = info.get("backend") or "remote"
+        self.tokenizer = _RemoteTokenizer(self, info.get("model_max_length"))
+
+    def _connection(self):
+        # a connection must not be shared across a fork
+        if self._conn is None or self._pid != os.getpid():
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    self._conn = Client(self.address, authkey=self.authkey)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _request(self, op, payload=None):
+        with self._lock:
+            conn = self._connection()
+            conn.send((op,) if payload is None else (op, payload))
+            status, value = conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"NER server error: {value}")
+        return value
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        single = isinstance(texts, str)
+        results = self._request("ner", [texts] if single else list(texts))
+        return results[0] if single else results
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _serve(address, authkey, model_name, backend, settings, ready):
+    from .ner import NERModelLoader
+    nlp = NERModelLoader(model_name, backend=backend).load()
+    if nlp is None:
+        ready.put(None)
+        return
+    server = NERServer(nlp, address, authkey, **settings)
+    ready.put(server.address)
+    server.serve_forever()
+
+
+def start_ner_server(model_name="vinai/phobert-base-v2", address=None, backend=None,
+                     batch_size=8, max_batch=64, max_wait=0.005, timeout=600.0):
+    """Start an NER server process; returns (process, address, authkey).
+
+    Blocks until the model is loaded. Raises RuntimeError if it can't be.
+    Stop it with stop_ner_server(process, address).
+    """
+    address = address or default_address()
+    authkey = os.urandom(32)
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    settings = {"batch_size": batch_size, "max_batch": max_batch, "max_wait": max_wait}
+    process = ctx.Process(target=_serve, args=(address, authkey, model_name, backend, settings, ready),
+                          name="ner-server", daemon=True)
+    process.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            bound = ready.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if not process.is_alive() or time.monotonic() > deadline:
+                stop_ner_server(process, address)
+                raise RuntimeError("NER server did not start")
+    if bound is None:
+        stop_ner_server(process, address)
+        raise RuntimeError("NER server could not load the model")
+    logger.info("NER server %d serving %s at %s", process.pid, model_name, bound)
+    return process, bound, authkey
+
+
+def stop_ner_server(process, address=None):
+    if process.is_alive():
+        process.terminate()
+    process.join(timeout=10)
+    if isinstance(address, str):
+        # the socket lives in its own temporary directory (default_address)
+        shutil.rmtree(os.path.dirname(address), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    from .config import RedactionConfig
+    from .ner import NERModelLoader
+    parser = argparse.ArgumentParser(description="Serve the NER model to redaction workers (set NER_SERVER_KEY)")
+    parser.add_argument("--address", required=True, help="Unix socket path or host:port")
+    parser.add_argument("--model", default="vinai/phobert-base-v2")
+    parser.add_argument("--max-batch", type=int, default=64, help="Texts per micro-batch")
+    parser.add_argument("--max-wait", type=float, default=0.005, help="Seconds to wait for more requests")
+    args = parser.parse_args()
+    key = os.environ.get("NER_SERVER_KEY")
+    if not key:
+        parser.error("NER_SERVER_KEY must be set (clients use the same value)")
+    nlp = NERModelLoader(args.model).load()
+    if nlp is None:
+        raise SystemExit("could not load the NER model")
+    server = NERServer(nlp, args.address, key.encode(), batch_size=RedactionConfig().get_ner_settings()["batch_size"],
+                       max_batch=args.max_batch, max_wait=args.max_wait)
+    print(f"Serving {args.model} at {server.address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
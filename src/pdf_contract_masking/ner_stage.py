@@ -0,0 +1,305 @@
+import re
+from .ner_cache import NERCache
+from .logger import get_logger
+logger = get_logger(__name__)
+
+_WORD = re.compile(r"\S+")
+
+
+def normalize_chunk(text):
+    """(normalized text, raw offset of each normalized char) for a chunk.
+
+    Runs of whitespace become one space and the ends are stripped, so chunks
+    that only differ in layout whitespace share one model input and cache key.
+    """
+    chars, offsets = [], []
+    for m in _WORD.finditer(text):
+        if chars:
+            chars.append(" ")
+            offsets.append(offsets[-1] + 1)
+        chars.append(m.group(0))
+        offsets.extend(range(m.start(), m.end()))
+    return "".join(chars), offsets
+
+
+def _plain(ent):
+    """JSON-friendly copy of a pipeline entity (numpy scores become floats)."""
+    out = {}
+    for key, value in ent.items():
+        if key in ("start", "end"):
+            out[key] = None if value is None else int(value)
+        elif key == "score":
+            out[key] = float(value)
+        else:
+            out[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+    return out
+
+
+def person_names(entities):
+    """Names of the PER entities in a pipeline result."""
+    return [ent["word"] for ent in entities if ent.get("entity_group") == "PER"]
+
+
+def find_persons(doc, nlp_pipeline, texts):
+    """[{name: [rects]}] for each page of `doc`.
+
+    `texts` holds the text to run NER on for each page (one batched pass);
+    each PER name found is located on its page with page.search_for.
+    """
+    stage = nlp_pipeline if isinstance(nlp_pipeline, NERStage) else NERStage(nlp_pipeline)
+    try:
+        results = stage.run(texts)
+    except Exception:
+        logger.exception("find_persons: nlp_pipeline failed")
+        results = [[] for _ in texts]
+    persons = []
+    for page, entities in zip(doc, results):
+        found = {}
+        for name in person_names(entities):
+            if name in found:
+                continue
+            try:
+                found[name] = page.search_for(name)
+            except Exception:
+                logger.exception("find_persons: page.search_for(name) failed for '%s'", name)
+                found[name] = []
+        persons.append(found)
+    return persons
+
+
+def keyword_context(index, keywords, margin=(200, 20)):
+    """Text of the lines near customer keywords on a page ("" when there are none).
+
+    `index` is the page's PageTextIndex. A line is kept when one of its words
+    lies within `margin` (x, y points) of a keyword occurrence, which is the
+    window in which RuleLearner accepts a person name, so running NER on this
+    text instead of the whole page finds the same customer names.
+    """
+    flat = " ".join(index.text.lower().split())
+    present = [kw for kw in keywords if kw in flat]
+    if not present:
+        return ""
+    geometry = index.geometry
+    dx, dy = margin
+    keep = set()
+    for kw in present:
+        hits = geometry.find_rects(kw) if geometry is not None else index.page.search_for(kw)
+        for rect in hits:
+            for w in index.words_in(rect + (-dx, -dy, dx, dy)):
+                keep.add((w[5], w[6]))
+    lines = {}
+    for w in index.words:
+        if (w[5], w[6]) in keep:
+            lines.setdefault((w[5], w[6]), []).append(w[4])
+    return "\n".join(" ".join(words) for words in lines.values())
+
+
+class NERStage:
+    """Batched NER over whole page texts.
+
+    Texts are split on word boundaries into chunks that fit the model's token
+    window (with `overlap` tokens repeated between neighbouring chunks). The
+    chunks of every text passed to run() are sent through the HuggingFace
+    pipeline together, `batch_size` at a time, and the entities are mapped
+    back to offsets in the original text. Where entities from overlapping
+    chunks overlap, the one seen farthest from its chunk's edges is kept
+    (an entity cut off at a chunk boundary loses to its full sighting).
+
+    Chunk results are cached (NERCache) under a hash of the model and the
+    whitespace-normalized chunk text, in memory (`cache_size` chunks) and,
+    with `cache_path`, in a SQLite file shared across runs and workers.
+
+    A stage is callable like the pipeline it wraps: stage(text) -> entities.
+    """
+
+    def __init__(self, pipeline, max_tokens=256, overlap=32, batch_size=8, cache_path=None, cache_size=4096):
+        self.pipeline = pipeline
+        self.tokenizer = getattr(pipeline, "tokenizer", None)
+        model_max = getattr(self.tokenizer, "model_max_length", None)
+        if isinstance(model_max, int) and 0 < model_max < max_tokens:
+            max_tokens = model_max
+        # room for the special tokens the pipeline adds around each chunk
+        self.max_tokens = max(8, max_tokens - 2)
+        self.overlap = max(0, min(overlap, self.max_tokens // 2))
+        self.batch_size = max(1, batch_size)
+        self._token_counts = {}
+        self.cache = NERCache(cache_path, cache_size) if cache_path or cache_size > 0 else None
+        model = getattr(pipeline, "model", None)
+        model_name = (getattr(pipeline, "model_name", None) or getattr(model, "name_or_path", None)
+                      or getattr(getattr(model, "config", None), "_name_or_path", ""))
+        # int8/ONNX and torch pipelines of one model must not share entries
+        backend = getattr(pipeline, "backend_name", None) or type(pipeline).__name__
+        self.cache_namespace = f"{model_name}|{backend}"
+        # text -> entities computed ahead of time by prefetch()
+        self._prefetched = {}
+
+    def _count_tokens(self, word):
+        count = self._token_counts.get(word)
+        if count is None:
+            try:
+                count = len(self.tokenizer.tokenize(word)) if self.tokenizer is not None else 0
+            except Exception:
+                count = 0
+            # without a usable tokenizer, assume ~3 characters per token
+            count = count or max(1, len(word) // 3)
+            if len(self._token_counts) > 100000:
+                self._token_counts.clear()
+            self._token_counts[word] = count
+        return count
+
+    def chunk(self, text):
+        """[(start, end)] character spans of the chunks of `text`."""
+        words = [(m.start(), m.end()) for m in _WORD.finditer(text)]
+        if not words:
+            return []
+        counter = getattr(self.tokenizer, "count_tokens", None)
+        if counter is not None:
+            # remote tokenizers (NERClient) count all new words in one request
+            unknown = [w for w in dict.fromkeys(text[s:e] for s, e in words) if w not in self._token_counts]
+            if unknown:
+                try:
+                    counted = counter(unknown)
+                except Exception:
+                    logger.exception("NERStage.chunk: counting tokens failed")
+                    counted = [0] * len(unknown)
+                if len(self._token_counts) > 100000:
+                    self._token_counts.clear()
+                for w, count in zip(unknown, counted):
+                    self._token_counts[w] = count or max(1, len(w) // 3)
+        counts = [self._count_tokens(text[s:e]) for s, e in words]
+        spans = []
+        i = 0
+        while i < len(words):
+            j, used = i, 0
+            while j < len(words) and (j == i or used + counts[j] <= self.max_tokens):
+                used += counts[j]
+                j += 1
+            spans.append((i, j))
+            if j >= len(words):
+                break
+            # step back so the next chunk re-reads about `overlap` tokens
+            k, back = j, 0
+            while k - 1 > i and back + counts[k - 1] <= self.overlap:
+                k -= 1
+                back += counts[k]
+            i = k
+        return [(words[a][0], words[b - 1][1]) for a, b in spans]
+
+    def _infer(self, chunk_texts):
+        if not chunk_texts:
+            return []
+        try:
+            results = self.pipeline(chunk_texts, batch_size=self.batch_size)
+        except TypeError:
+            # pipeline-like callables without batching support
+            results = [self.pipeline(t) for t in chunk_texts]
+        if len(chunk_texts) == 1 and results and isinstance(results[0], dict):
+            results = [results]
+        return results
+
+    def _entities(self, chunk_texts):
+        """Entities of each (normalized) chunk text, with offsets into it.
+
+        Identical chunks run once; cached chunks don't run at all.
+        """
+        if self.cache is not None:
+            keys = [NERCache.key(self.cache_namespace, t) for t in chunk_texts]
+            known = self.cache.get_many(keys)
+        else:
+            keys, known = chunk_texts, {}
+        todo = {}
+        for key, text in zip(keys, chunk_texts):
+            if key not in known:
+                todo.setdefault(key, text)
+        if todo:
+            try:
+                outputs = self._infer(list(todo.values()))
+            except Exception:
+                logger.exception("NERStage.run: pipeline failed on %d chunks", len(todo))
+                outputs = None
+            fresh = {}
+            for (key, text), entities in zip(todo.items(), outputs or []):
+                found, cursor = [], 0
+                for ent in entities or []:
+                    ent = _plain(ent)
+                    if ent.get("start") is None:
+                        # slow tokenizers give no offsets: find the word in the chunk
+                        ent["start"] = text.find(ent.get("word", ""), cursor)
+                        if ent["start"] < 0:
+                            continue
+                        ent["end"] = ent["start"] + len(ent.get("word", ""))
+                    cursor = ent["end"]
+                    found.append(ent)
+                fresh[key] = found
+            if self.cache is not None and fresh:
+                self.cache.put_many(fresh)
+            known.update(fresh)
+        return [known.get(key, []) for key in keys]
+
+    def run(self, texts):
+        """Entities for each text in `texts`, with offsets into that text."""
+        texts = list(texts)
+        results = [None] * len(texts)
+        pending = []
+        first = {}
+        for n, text in enumerate(texts):
+            if text in first:
+                continue  # duplicate text: shares the first occurrence's result
+            first[text] = n
+            if text in self._prefetched:
+                results[n] = self._prefetched.pop(text)
+            elif not text or not text.strip():
+                results[n] = []
+            else:
+                pending.append(n)
+        jobs = []
+        for n in pending:
+            for start, end in self.chunk(texts[n]):
+                jobs.append((n, start, end, normalize_chunk(texts[n][start:end])))
+        outputs = self._entities([norm for _, _, _, (norm, _) in jobs])
+        found = {n: [] for n in pending}
+        for (n, start, end, (norm, offsets)), entities in zip(jobs, outputs):
+            for ent in entities:
+                if not 0 <= ent["start"] < ent["end"] <= len(offsets):
+                    continue
+                ent = dict(ent)
+                # back from the normalized chunk to the raw text
+                s, e = offsets[ent["start"]], offsets[ent["end"] - 1] + 1
+                margin = min(s, (end - start) - e)
+                ent["start"], ent["end"] = s + start, e + start
+                found[n].append((margin, ent))
+        for n, candidates in found.items():
+            kept = []
+            for margin, ent in sorted(candidates, key=lambda c: -c[0]):
+                if all(ent["end"] <= k["start"] or ent["start"] >= k["end"] for k in kept):
+                    kept.append(ent)
+            results[n] = sorted(kept, key=lambda ent: ent["start"])
+        for n, text in enumerate(texts):
+            if results[n] is None:
+                results[n] = list(results[first[text]])
+        return results
+
+    def prefetch(self, texts):
+        """Run NER for many texts at once (e.g. every page of several documents).
+
+        Results are held until run() (or a call) asks for the same text, so
+        callers that work one page or one document at a time still share
+        the pooled batches.
+        """
+        texts = [t for t in dict.fromkeys(texts) if t and t.strip() and t not in self._prefetched]
+        for text, entities in zip(texts, self.run(texts)):
+            self._prefetched[text] = entities
+        return len(texts)
+
+    def discard_prefetched(self):
+        self._prefetched.clear()
+
+    def __call__(self, text):
+        return self.run([text])[0]
+
+
+def as_ner_stage(nlp_pipeline, **settings):
+    """Wrap a pipeline in an NERStage (None and existing stages pass through)."""
+    if nlp_pipeline is None or isinstance(nlp_pipeline, NERStage):
+        return nlp_pipeline
+    return NERStage(nlp_pipeline, **settings)
@@ -0,0 +1,105 @@
+import os
+import numpy as np
+import torch
+from transformers import TokenClassificationPipeline
+from .logger import get_logger
+logger = get_logger(__name__)
+
+MODEL_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+# everything TokenClassificationPipeline._forward passes through to postprocess
+_PASSTHROUGH = ("special_tokens_mask", "offset_mapping", "sentence", "is_last", "word_ids", "word_to_chars_map")
+
+
+def default_onnx_dir(model_name):
+    """Where the exported (and quantized) ONNX files of `model_name` are kept."""
+    base = os.environ.get("NER_ONNX_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "pdf_contract_masking", "onnx")
+    return os.path.join(base, model_name.replace("/", "__"))
+
+
+def export_onnx(model, tokenizer, path, opset=14):
+    """Export a token-classification model to ONNX with dynamic batch/sequence axes."""
+    sample = tokenizer(["Nguyễn Văn A"], return_tensors="pt")
+    names = [name for name in MODEL_INPUTS if name in sample]
+    axes = {name: {0: "batch", 1: "sequence"} for name in names + ["logits"]}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    kwargs = dict(input_names=names, output_names=["logits"], dynamic_axes=axes, opset_version=opset)
+    model.eval()
+    with torch.no_grad():
+        try:
+            torch.onnx.export(model, ({name: sample[name] for name in names},), path, dynamo=False, **kwargs)
+        except TypeError:
+            # torch < 2.5 has only the TorchScript exporter (no `dynamo` argument)
+            torch.onnx.export(model, ({name: sample[name] for name in names},), path, **kwargs)
+    return path
+
+
+def quantize_onnx(source, target):
+    """Dynamic int8 quantization of the weights of an ONNX model."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(model_input=source, model_output=target, weight_type=QuantType.QInt8)
+    return target
+
+
+class _ExportedModel:
+    """Stands in for the torch model once it is exported: the pipeline only reads its config (labels)."""
+
+    def __init__(self, config):
+        self.config = config
+
+    def __call__(self, **inputs):
+        raise RuntimeError("the torch model was dropped after the ONNX export; run the ONNX session")
+
+
+class OnnxTokenClassificationPipeline(TokenClassificationPipeline):
+    """TokenClassificationPipeline whose forward pass runs in onnxruntime.
+
+    Tokenization, batching and entity aggregation are the transformers ones,
+    so results have the same entity_group/word/start/end shape as the torch
+    pipeline. Only the model's config (label map) is kept, not its weights.
+    """
+
+    session = None
+
+    def _forward(self, model_inputs):
+        extras = {key: model_inputs.pop(key, None) for key in _PASSTHROUGH}
+        feeds = {}
+        for arg in self.session.get_inputs():
+            value = model_inputs.get(arg.name)
+            if value is None:
+                value = torch.zeros_like(model_inputs["input_ids"])
+            feeds[arg.name] = value.cpu().numpy().astype(np.int64)
+        logits = self.session.run(["logits"], feeds)[0]
+        return {"logits": torch.from_numpy(logits), **extras, **model_inputs}
+
+
+def build_onnx_pipeline(model_name, model, tokenizer, quantize=False, onnx_dir=None, threads=None):
+    """NER pipeline running `model` with onnxruntime (int8 weights when `quantize`).
+
+    The ONNX files are exported once into `onnx_dir` and reused; delete the
+    directory to re-export after the model changes. The returned pipeline
+    holds no reference to the fp32 torch `model`, so the caller's copy is
+    the last one.
+    """
+    import onnxruntime as ort
+    onnx_dir = onnx_dir or default_onnx_dir(model_name)
+    path = os.path.join(onnx_dir, "model.onnx")
+    if not os.path.exists(path):
+        logger.info("Exporting %s to ONNX at %s", model_name, path)
+        export_onnx(model, tokenizer, path)
+    if quantize:
+        int8_path = os.path.join(onnx_dir, "model.int8.onnx")
+        if not os.path.exists(int8_path):
+            logger.info("Quantizing %s to int8 at %s", path, int8_path)
+            quantize_onnx(path, int8_path)
+        path = int8_path
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = int(threads)
+    session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+    nlp = OnnxTokenClassificationPipeline(model=model, tokenizer=tokenizer, device=-1, aggregation_strategy="simple")
+    nlp.session = session
+    # keeps the NER result cache of the fp32 and int8 models apart (see NERStage)
+    nlp.backend_name = "onnx-int8" if quantize else "onnx"
+    nlp.model = _ExportedModel(model.config)
+    del model
+    return nlp
@@ -0,0 +1,262 @@
+import re
+import math
+import fitz  # PyMuPDF
+
+
+class BoxGrid:
+    """Uniform grid over axis-aligned boxes for rectangle range queries.
+
+    `boxes` are tuples whose first four items are x0, y0, x1, y1 (PyMuPDF
+    "words" tuples, PageTextIndex.chars). query() returns the indices of the boxes that
+    intersect a rect -- with fitz.Rect.intersects semantics -- in their
+    original order, touching only the grid cells the rect overlaps.
+    """
+
+    def __init__(self, boxes, cell_size=32.0):
+        self.boxes = boxes
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        for i, b in enumerate(boxes):
+            if b[0] >= b[2] or b[1] >= b[3]:
+                continue  # empty boxes never intersect anything
+            for key in self._cell_keys(b[0], b[1], b[2], b[3]):
+                self._cells.setdefault(key, []).append(i)
+
+    def _cell_keys(self, x0, y0, x1, y1):
+        size = self.cell_size
+        for cx in range(math.floor(x0 / size), math.floor(x1 / size) + 1):
+            for cy in range(math.floor(y0 / size), math.floor(y1 / size) + 1):
+                yield cx, cy
+
+    def query(self, rect):
+        x0, y0, x1, y1 = rect[0], rect[1], rect[2], rect[3]
+        if x0 >= x1 or y0 >= y1:
+            return []
+        hits = set()
+        for key in self._cell_keys(x0, y0, x1, y1):
+            for i in self._cells.get(key, ()):
+                b = self.boxes[i]
+                if b[0] < x1 and x0 < b[2] and b[1] < y1 and y0 < b[3]:
+                    hits.add(i)
+        return sorted(hits)
+
+
+class TextGeometry:
+    """Map offsets of a page's plain text to char boxes.
+
+    Built from the "rawdict" view so that `text` equals the page's "text"
+    view: text[i] has box boxes[i] on line lines[i] (line breaks have no box).
+    `digits` is the digits-only view and digit_offsets[k] the offset in
+    `text` of digits[k], so wrapped or punctuated numbers can be found too.
+    """
+
+    def __init__(self, rawdict):
+        chars = []
+        self.boxes = []
+        self.lines = []
+        line_no = 0
+        for block in rawdict.get("blocks", []):
+            if block.get("type", 0) != 0:
+                continue
+            for line in block.get("lines", []):
+                for span in line.get("spans", []):
+                    for c in span.get("chars", []):
+                        chars.append(c["c"])
+                        self.boxes.append(c["bbox"])
+                        self.lines.append(line_no)
+                chars.append("\n")
+                self.boxes.append(None)
+                self.lines.append(line_no)
+                line_no += 1
+        self.text = "".join(chars)
+        self.digit_offsets = [i for i, ch in enumerate(self.text) if ch.isdigit()]
+        self.digits = "".join(self.text[i] for i in self.digit_offsets)
+
+    def span_rects(self, start, end):
+        """Rects (one per line) covering text[start:end]; O(end - start)."""
+        rects = []
+        line = None
+        for i in range(start, end):
+            box = self.boxes[i]
+            if box is None:
+                continue
+            r = fitz.Rect(box)
+            if self.lines[i] == line:
+                rects[-1] |= r
+            else:
+                rects.append(r)
+                line = self.lines[i]
+        return rects
+
+    def find_rects(self, needle):
+        """Rects of every occurrence of `needle`, matched like page.search_for.
+
+        As in MuPDF's search, case is ignored and any run of whitespace in
+        the needle matches any run of whitespace (line breaks included).
+        Overlapping occurrences are all reported.
+        """
+        parts = needle.split()
+        if not parts:
+            return []
+        pattern = r"\s+".join(re.escape(p) for p in parts)
+        if needle[-1].isspace():
+            pattern += r"\s"
+        regex = re.compile(pattern, re.IGNORECASE)
+        rects = []
+        m = regex.search(self.text)
+        while m:
+            rects.extend(self.span_rects(m.start(), m.end()))
+            m = regex.search(self.text, m.start() + 1)
+        return rects
+
+    def find_digit_rects(self, digits):
+        """Rects of every occurrence of `digits` in the digits-only view."""
+        rects = []
+        if not digits:
+            return rects
+        pos = self.digits.find(digits)
+        while pos != -1:
+            start = self.digit_offsets[pos]
+            end = self.digit_offsets[pos + len(digits) - 1] + 1
+            rects.extend(self.span_rects(start, end))
+            pos = self.digits.find(digits, pos + 1)
+        return rects
+
+
+class PageTextIndex:
+    """Extract each text view of one page at most once.
+
+    The views ("text", "words", "blocks", "rawdict") are fetched lazily from
+    PyMuPDF and kept until release() is called -- when the page is finished,
+    or when its content changed (e.g. after page.apply_redactions()).
+    Extraction errors are cached as well and re-raised on every access.
+    `chars` (char boxes) is derived from "rawdict", which PyMuPDF has no
+    flat view for. Rectangle lookups over words and chars go through a
+    per-view BoxGrid.
+    """
+
+    VIEWS = ("text", "words", "blocks", "rawdict")
+
+    def __init__(self, page):
+        self.page = page
+        self._views = {}
+        self._grids = {}
+        self._memo = {}
+
+    def _get(self, option):
+        if option not in self._views:
+            try:
+                self._views[option] = (self.page.get_text(option), None)
+            except Exception as e:
+                self._views[option] = (None, e)
+        value, error = self._views[option]
+        if error is not None:
+            raise error
+        return value
+
+    @property
+    def text(self):
+        return self._get("text")
+
+    @property
+    def words(self):
+        return self._get("words")
+
+    @property
+    def blocks(self):
+        return self._get("blocks")
+
+    @property
+    def chars(self):
+        """(x0, y0, x1, y1, c) of every char, from the "rawdict" char bboxes."""
+        def build():
+            geometry = self.geometry or TextGeometry(self._get("rawdict"))
+            return [(*box, ch) for ch, box in zip(geometry.text, geometry.boxes) if box is not None]
+        return self.memo("chars", build)
+
+    def _grid(self, option):
+        grid = self._grids.get(option)
+        if grid is None:
+            grid = self._grids[option] = BoxGrid(getattr(self, option))
+        return grid
+
+    def words_in(self, rect):
+        """Word tuples intersecting `rect`, in reading order."""
+        grid = self._grid("words")
+        return [grid.boxes[i] for i in grid.query(rect)]
+
+    def text_in(self, rect):
+        """Text of the words intersecting `rect`, a line per text line.
+
+        Stands in for page.get_text(clip=rect) without laying out the page
+        again; words are kept whole where get_text would cut them at the clip.
+        """
+        lines = {}
+        for w in self.words_in(rect):
+            lines.setdefault((w[5], w[6]), []).append(w[4])
+        return "\n".join(" ".join(words) for words in lines.values())
+
+    def digit_chars_in(self, area):
+        """(fitz.Rect, char) pairs of the digit chars intersecting `area`, in order.
+
+        Raises whatever the "rawdict" extraction raised.
+        """
+        grid = self._grid("chars")
+        result = []
+        for i in grid.query(area):
+            c = grid.boxes[i]
+            if c[4].isdigit():
+                result.append((fitz.Rect(c[0], c[1], c[2], c[3]), c[4]))
+        return result
+
+    @property
+    def geometry(self):
+        """TextGeometry of the page, or None if it doesn't line up with `text`."""
+        def build():
+            try:
+                geometry = TextGeometry(self._get("rawdict"))
+                return geometry if geometry.text == self.text else None
+            except Exception:
+                return None
+        return self.memo("geometry", build)
+
+    def memo(self, key, build):
+        """Return build() cached under `key` until the index is released."""
+        if key not in self._memo:
+            self._memo[key] = build()
+        return self._memo[key]
+
+    def release(self):
+        """Drop every cached view; the next access re-extracts from the page."""
+        self._views.clear()
+        self._grids.clear()
+        self._memo.clear()
+
+
+class PageIndexCache:
+    """Document-scoped map of page number -> PageTextIndex.
+
+    Shared by RuleLearner and Redactor for one document so both stages reuse
+    the same extractions; pages are released as soon as they are finished.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+
+    def get(self, page):
+        index = self._indexes.get(page.number)
+        if index is None:
+            index = self._indexes[page.number] = PageTextIndex(page)
+        return index
+
+    def release(self, page_num):
+        index = self._indexes.pop(page_num, None)
+        if index is not None:
+            index.release()
+
+    def clear(self):
+        for page_num in list(self._indexes):
+            self.release(page_num)
+
+    def __len__(self):
+        return len(self._indexes)
@@ -1,23 +1,402 @@
+import io
 import os
-import re
+import time
 from tqdm import tqdm
 from .config import RedactionConfig
-from .knowledge_base import KnowledgeBase
+from .knowledge_base import KnowledgeBase, open_knowledge_base
 from .rule_learner import RuleLearner
 from .redactor import Redactor
+from .page_index import PageIndexCache
+from .rule_plan import RulePlan
+from .verification import RedactionVerifier
+from .template_index import template_signature
+from .ner_stage import NERStage, as_ner_stage, find_persons
+from .constants import KNOWLEDGE_BASE_FILE
+from .utils import current_rss_mb
 from .ner import NERModelLoader
 from .logger import get_logger
 logger = get_logger(__name__)
 
+
+def _tell(stream):
+    """Position of a file-like object, or None for pipes, sockets and the like."""
+    try:
+        return stream.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
 class PDFProcessor:
     """High level orchestration: open PDF, learn rules, apply redaction, save."""
 
-    def __init__(self, config: RedactionConfig, kb: KnowledgeBase, nlp_pipeline=None):
+    def __init__(self, config: RedactionConfig, kb: KnowledgeBase, nlp_pipeline=None, save_profile=None):
         self.config = config
         self.kb = kb
-        self.nlp = nlp_pipeline
+        # NER runs through a batching/chunking stage (see NERStage)
+        self.nlp = as_ner_stage(nlp_pipeline, **config.get_ner_settings())
         self.learner = RuleLearner()
         self.redactor = Redactor(config)
+        # post-redaction check with the configured ID/phone patterns (IMEI numbers exempt)
+        self.verifier = RedactionVerifier(
+            [("id", self.redactor._id_re), ("phone", self.redactor._phone_re)],
+            skip=self.redactor._is_imei_context,
+        )
+        # per-page verification results of the last processed document
+        self.last_verification = []
+        # "text" or "tiered" (see KnowledgeBase.lookup); FINGERPRINT_MODE overrides the config
+        templates = config.get_template_matching()
+        self.fingerprint_mode = os.environ.get("FINGERPRINT_MODE") or templates.get("fingerprint", "text")
+        # reuse the rules of a known template whose page-0 SimHash similarity is at least this (None = off)
+        self.near_duplicate_threshold = templates.get("near_duplicate_threshold")
+        # how output files are written ("archive", "fast", "linearized"); SAVE_PROFILE overrides the config
+        self.save_profile, self.save_options = config.get_save_options(save_profile or os.environ.get("SAVE_PROFILE"))
+        # page-by-page processing with a memory ceiling (see _process_streaming)
+        self.streaming = config.get_streaming_settings()
+
+    def prefetch_ner(self, input_pdfs):
+        """Run NER for the pages of several documents in one pooled, batched pass.
+
+        Only documents that will need NER are read: those resolve_template()
+        finds no template for -- structural aliases and near-duplicates
+        included -- which get learned (keyword-gated like RuleLearner), or
+        every document when REQUIRE_NEAR_PERSON is on. The results are picked
+        up by process_pdf_final; returns the number of texts run.
+        """
+        if not isinstance(self.nlp, NERStage) or os.environ.get("RULES_ONLY", "0") == "1":
+            return 0
+        import fitz
+        require_person = os.environ.get("REQUIRE_NEAR_PERSON", "0") == "1"
+        texts = []
+        for input_pdf in input_pdfs:
+            try:
+                with fitz.open(input_pdf) as doc:
+                    page_cache = PageIndexCache()
+                    # same lookup as the redaction path, without recording aliases twice
+                    template = self.resolve_template(doc, page_cache, record=False)[1]
+                    if template is not None and not require_person:
+                        continue
+                    for page in doc:
+                        index = page_cache.get(page)
+                        if require_person:
+                            # learner and redactor share one full-page pass (process_pdf_final)
+                            texts.append(index.text)
+                        else:
+                            texts.append(self.learner.ner_text(index))
+                        page_cache.release(page.number)
+            except Exception:
+                logger.exception("prefetch_ner: failed to read %s", input_pdf)
+        return self.nlp.prefetch(texts)
+
+    def process_jobs(self, jobs, docs_per_batch=1, desc="Processing PDFs"):
+        """Process (input_pdf, output_pdf) jobs in order, pooling NER over `docs_per_batch` documents.
+
+        Returns the total number of redactions.
+        """
+        total = 0
+        step = max(1, docs_per_batch)
+        with tqdm(total=len(jobs), desc=desc) as progress:
+            for i in range(0, len(jobs), step):
+                group = jobs[i:i + step]
+                if len(group) > 1:
+                    self.prefetch_ner([inp for inp, _ in group])
+                try:
+                    for input_pdf, output_pdf in group:
+                        total += self.process_pdf_final(input_pdf, output_pdf)
+                        progress.update(1)
+                finally:
+                    if self.nlp is not None:
+                        self.nlp.discard_prefetched()
+        return total
+
+    def _scrub_leftover_regions(self, page, mode, leftovers):
+        """Remove verified leftover numbers from `page` without rasterizing it.
+
+        "region" replaces each one with a 2x image of itself (looks the same,
+        no selectable text); "redact" blacks it out. Returns False when the
+        page must be rasterized whole instead.
+        """
+        try:
+            import fitz
+            if any(not item["rects"] for item in leftovers):
+                return False
+            rects = []
+            for r in sorted((r for item in leftovers for r in item["rects"]), key=lambda r: -r.get_area()):
+                if not any(u.contains(r) for u in rects):
+                    rects.append(r)
+            if mode == "region":
+                pixmaps = [(r, page.get_pixmap(matrix=fitz.Matrix(2, 2), clip=r)) for r in rects]
+                for r in rects:
+                    page.add_redact_annot(r)
+                # remove the text only; vector graphics and images stay
+                page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE, graphics=fitz.PDF_REDACT_LINE_ART_NONE)
+                for r, pix in pixmaps:
+                    page.insert_image(r, pixmap=pix)
+            else:
+                for r in rects:
+                    page.add_redact_annot(r, fill=(0, 0, 0))
+                page.apply_redactions()
+            logger.info("processor: %s-scrubbed %d leftover spans on page %d", mode, len(rects), page.number)
+            return not self.verifier.page_leftovers(page)
+        except Exception:
+            logger.exception("processor: scrubbing leftover regions on page %s failed", page.number)
+            return False
+
+    def _rasterize_page(self, doc, pnum):
+        """Replace page `pnum` with an image-only copy of itself (page count and order stay)."""
+        import fitz
+        try:
+            page = doc[pnum]
+            # render at reasonable resolution
+            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+            rect = page.rect
+            # remove original page and replace with an image-only page
+            doc.delete_page(pnum)
+            newp = doc.new_page(pnum, width=rect.width, height=rect.height)
+            newp.insert_image(rect, pixmap=pix)
+            logger.info("processor: rasterized page %d to remove leftover selectable tokens", pnum)
+        except Exception:
+            logger.exception("processor: rasterizing page %s failed", pnum)
+
+    def _treat_leftovers(self, doc, pnum, leftovers, mode):
+        """Scrub or rasterize page `pnum` for its verified leftovers; returns the action taken."""
+        if not leftovers:
+            return "none"
+        logger.debug("processor: page %d leftovers %s", pnum, [(x["kind"], x["text"]) for x in leftovers])
+        if mode in ("region", "redact") and self._scrub_leftover_regions(doc[pnum], mode, leftovers):
+            return mode
+        self._rasterize_page(doc, pnum)
+        return "rasterize"
+
+    def _verify_and_scrub(self, doc):
+        """Verify every page and treat only those with leftover ID/phone text.
+
+        Returns the per-page results: {"page", "leftovers", "action"} where
+        action is "none", "region", "redact" or "rasterize".
+        """
+        mode = os.environ.get("RASTERIZE_MODE", "page")
+        report = []
+        for result in self.verifier.verify(doc):
+            pnum, leftovers = result["page"], result["leftovers"]
+            report.append({"page": pnum, "leftovers": len(leftovers),
+                           "action": self._treat_leftovers(doc, pnum, leftovers, mode)})
+        return report
+
+    def _streams(self, doc):
+        settings = self.streaming
+        return bool(settings["enabled"] or (settings["min_pages"] and len(doc) >= int(settings["min_pages"])))
+
+    def _process_streaming(self, doc, fingerprint, template, signature):
+        """Learn, redact and verify `doc` one page at a time; returns the number of redactions.
+
+        Each page's extractions, overlays and NER input are released, and
+        MuPDF's resource store is emptied, before the next page is loaded, so
+        memory follows the largest page rather than the page count.
+        """
+        plan = self.kb.get_plan(template) if template else None
+        total_redactions, learned, self.last_verification = self._stream_pages(doc, plan, range(len(doc)))
+        if learned and fingerprint:
+            self._store_rules(fingerprint, learned, signature)
+        return total_redactions
+
+    def _stream_pages(self, doc, plan, pages):
+        """Process `pages` of `doc` one by one with `plan` (RulePlan; rules are learned when None).
+
+        Returns (redactions, learned rules, verification report). Where RSS
+        can be measured it is checked after every page against
+        streaming.memory_limit_mb; raises MemoryError when it stays above the
+        ceiling.
+        """
+        import gc
+        import fitz
+        mode = os.environ.get("RASTERIZE_MODE", "page")
+        limit = self.streaming["memory_limit_mb"]
+        require_person = (self.nlp is not None and os.environ.get("REQUIRE_NEAR_PERSON", "0") == "1"
+                          and os.environ.get("RULES_ONLY", "0") != "1")
+        page_cache = PageIndexCache()
+        learned, report = [], []
+        total_redactions = 0
+        peak = start_rss = current_rss_mb()
+        for pnum in pages:
+            page = doc[pnum]
+            persons = None
+            if require_person:
+                persons = find_persons([page], self.nlp, [page_cache.get(page).text])[0]
+            if plan is None:
+                rules = self.learner.learn_page(page, self.nlp, page_cache=page_cache, persons=persons)
+                learned.extend(rules)
+                page_plan = RulePlan(rules)
+            else:
+                page_plan = plan
+            person_rects = [r for rects in persons.values() for r in rects] if persons is not None else None
+            total_redactions += self.redactor.apply_page(page, page_plan, page_cache=page_cache,
+                                                         person_rects=person_rects)
+            try:
+                # redact annotations left behind (e.g. by drawing fallbacks)
+                page.apply_redactions()
+            except Exception:
+                logger.debug("processor: page.apply_redactions() failed for page %s", pnum)
+            page_cache.release(pnum)
+            leftovers = self.verifier.verify_page(page)
+            del page
+            report.append({"page": pnum, "leftovers": len(leftovers),
+                           "action": self._treat_leftovers(doc, pnum, leftovers, mode)})
+            fitz.TOOLS.store_shrink(100)
+            rss = current_rss_mb()
+            if rss is None:
+                # RSS can't be measured on this platform: no ceiling
+                continue
+            if limit and rss > limit:
+                gc.collect()
+                rss = current_rss_mb()
+                if rss > limit:
+                    raise MemoryError(f"RSS {rss:.0f} MB above the {limit:.0f} MB ceiling after page {pnum}")
+            peak = rss if peak is None else max(peak, rss)
+        if start_rss is None:
+            logger.info("processor: streamed %d pages (RSS not measurable here; no memory ceiling)", len(report))
+        else:
+            logger.info("processor: streamed %d pages, RSS %.0f MB at start, peak %.0f MB (ceiling %s)",
+                        len(report), start_rss, peak, f"{limit:.0f} MB" if limit else "none")
+        return total_redactions, learned, report
+
+    def process_shard(self, input_pdf, part_pdf, start, end, rules=None):
+        """Redact pages [start, end) of `input_pdf` into `part_pdf`, which holds only those pages.
+
+        Used by page sharding (see sharding.py): `rules` are the document's
+        template rules, resolved once by the caller; when None the shard
+        learns its pages' rules and returns them instead of storing them.
+        Returns (redactions, learned rules, verification report).
+        """
+        import fitz
+        doc = fitz.open(input_pdf)
+        try:
+            plan = RulePlan(rules) if rules is not None else None
+            result = self._stream_pages(doc, plan, range(start, end))
+            doc.select(list(range(start, end)))
+            # an intermediate file: drop the other pages' objects, leave compaction to the stitched save
+            doc.save(part_pdf, garbage=1)
+            return result
+        finally:
+            doc.close()
+
+    def resolve_template(self, doc, page_cache=None, record=True):
+        """(fingerprint, template, signature) for `doc`.
+
+        `template` is the KB fingerprint whose rules apply (a near-duplicate
+        template when enabled) or None when rules must be learned; `signature`
+        is the page-0 SimHash computed for a near-duplicate lookup, if any.
+        With `record=False` no alias is recorded (see prefetch_ner), so a
+        document resolved twice doesn't count twice towards an alias.
+        """
+        page_cache = page_cache if page_cache is not None else PageIndexCache()
+        fingerprint = self.kb.lookup(doc, mode=self.fingerprint_mode, record=record)
+        logger.debug("Document fingerprint=%s", fingerprint)
+        template = fingerprint if fingerprint and fingerprint in self.kb.data else None
+        signature = None
+        if template is None and self.near_duplicate_threshold and len(doc) > 0:
+            # Unknown fingerprint: look for a near-duplicate template before paying for learning
+            signature = template_signature(page_cache.get(doc[0]), doc[0])
+            match = self.kb.find_similar(signature, float(self.near_duplicate_threshold))
+            if match:
+                template, score = match
+                logger.info("Document matches template %s (similarity=%.3f)", template, score)
+                if fingerprint and record:
+                    self.kb.record_alias(fingerprint, template)
+        return fingerprint, template, signature
+
+    def _store_rules(self, fingerprint, rules, signature=None):
+        sanitized = []
+        for r in rules:
+            r2 = r.copy()
+            r2["anchor"] = KnowledgeBase.sanitize_anchor_text(r2.get("anchor", ""))
+            sanitized.append(r2)
+        self.kb.add_rules(fingerprint, sanitized)
+        if signature is not None:
+            self.kb.add_signature(fingerprint, signature)
+
+    def _save(self, doc, target=None):
+        """Save `doc` with the save profile to a path or file-like object.
+
+        Returns its bytes when `target` is None, and the number of bytes
+        written to a non-seekable stream (which gets the bytes in one write,
+        as MuPDF can't save to it).
+        """
+        def write(options):
+            if target is None:
+                return doc.tobytes(**options)
+            if hasattr(target, "write") and _tell(target) is None:
+                data = doc.tobytes(**options)
+                target.write(data)
+                return len(data)
+            return doc.save(target, **options)
+        try:
+            return write(self.save_options)
+        except Exception:
+            if not self.save_options.get("linear"):
+                raise
+            # recent MuPDF releases dropped linearization; save the rest of the profile
+            logger.warning("processor: linearized save not supported here; saving without it")
+            return write({k: v for k, v in self.save_options.items() if k != "linear"})
+
+    def _redact_document(self, doc):
+        """Learn or look up the rules of an open document, redact and verify it in place.
+
+        Returns (redactions, fingerprint, template); raises MemoryError when a
+        streamed document exceeds the memory ceiling.
+        """
+        # One extraction cache per document, shared by learning and redaction
+        page_cache = PageIndexCache()
+        fingerprint, template, signature = self.resolve_template(doc, page_cache)
+        streamed = self._streams(doc)
+        if streamed:
+            total_redactions = self._process_streaming(doc, fingerprint, template, signature)
+        elif template:
+            total_redactions = self.redactor.apply_rules(doc, self.kb.get_plan(template), self.nlp, page_cache=page_cache)
+        else:
+            persons = None
+            if (self.nlp is not None and os.environ.get("REQUIRE_NEAR_PERSON", "0") == "1"
+                    and os.environ.get("RULES_ONLY", "0") != "1"):
+                # learner and redactor both need the page's persons: find them once
+                persons = find_persons(doc, self.nlp, [page_cache.get(page).text for page in doc])
+            new_rules = self.learner.learn(doc, self.nlp, page_cache=page_cache, persons=persons)
+            if new_rules:
+                total_redactions = self.redactor.apply_rules(doc, new_rules, self.nlp, page_cache=page_cache, persons=persons)
+                if fingerprint:
+                    self._store_rules(fingerprint, new_rules, signature)
+            else:
+                total_redactions = 0
+        page_cache.clear()
+        if streamed:
+            # streamed documents were applied and verified page by page
+            return total_redactions, fingerprint, template
+
+        # Apply redact annotations left behind (e.g. by drawing fallbacks); the
+        # Redactor already applies its annotations once per page.
+        # Try Document-level apply_redactions first (may not exist)
+        applied = False
+        if hasattr(doc, 'apply_redactions'):
+            try:
+                doc.apply_redactions()
+                applied = True
+            except Exception:
+                logger.debug("processor: doc.apply_redactions() failed; falling back to per-page apply")
+
+        # Fallback: call apply_redactions on each page if document-level not available
+        if not applied:
+            for p in doc:
+                try:
+                    if hasattr(p, 'apply_redactions'):
+                        p.apply_redactions()
+                except Exception:
+                    logger.debug("processor: page.apply_redactions() failed for page %s", getattr(p, 'number', '?'))
+        # Verification: some PyMuPDF builds may leave selectable text
+        # behind even after redact annotations are applied. Pages whose
+        # text still holds a configured ID/phone number are scrubbed or
+        # rasterized (see _verify_and_scrub); clean pages stay as they are.
+        try:
+            self.last_verification = self._verify_and_scrub(doc)
+        except Exception:
+            logger.exception("processor: post-redaction verification failed")
+        return total_redactions, fingerprint, template
 
     def process_pdf_final(self, input_pdf, output_pdf):
         """
@@ -33,103 +412,25 @@ class PDFProcessor:
 
             doc = fitz.open(in_path)
             logger.info("Opened document %s (pages=%d)", in_path, len(doc))
-            fingerprint = KnowledgeBase.create_fingerprint(doc)
-            logger.debug("Document fingerprint=%s", fingerprint)
-
-            if fingerprint and fingerprint in self.kb.data:
-                total_redactions = self.redactor.apply_rules(doc, self.kb.data[fingerprint], self.nlp)
-            else:
-                new_rules = self.learner.learn(doc, self.nlp)
-                if new_rules:
-                    total_redactions = self.redactor.apply_rules(doc, new_rules, self.nlp)
-                    if fingerprint:
-                        sanitized = []
-                        for r in new_rules:
-                            r2 = r.copy()
-                            r2["anchor"] = KnowledgeBase.sanitize_anchor_text(r2.get("anchor", ""))
-                            sanitized.append(r2)
-                        self.kb.data[fingerprint] = sanitized
-                else:
-                    total_redactions = 0
-
-            # Ensure output directory exists
             try:
-                out_dir = os.path.dirname(out_path) or os.getcwd()
-                os.makedirs(out_dir, exist_ok=True)
-            except Exception:
-                logger.exception("Failed to prepare output directory for %s", out_path)
+                try:
+                    total_redactions = self._redact_document(doc)[0]
+                except MemoryError:
+                    logger.exception("Memory ceiling exceeded; no output written for %s", in_path)
+                    return 0
 
-            # Attempt to apply redact annotations (if any) then save
-            try:
-                # Try Document-level apply_redactions first (may not exist)
-                applied = False
-                if hasattr(doc, 'apply_redactions'):
-                    try:
-                        doc.apply_redactions()
-                        applied = True
-                    except Exception:
-                        logger.debug("processor: doc.apply_redactions() failed; falling back to per-page apply")
-
-                # Fallback: call apply_redactions on each page if document-level not available
-                if not applied:
-                    for p in doc:
-                        try:
-                            if hasattr(p, 'apply_redactions'):
-                                p.apply_redactions()
-                        except Exception:
-                            logger.debug("processor: page.apply_redactions() failed for page %s", getattr(p, 'number', '?'))
-                # Heuristic check: some PyMuPDF builds may leave selectable text
-                # behind even after redact annotations are applied. If any page
-                # still contains phone-like or ID-like tokens (per our regexes),
-                # rasterize those pages to ensure no selectable digits remain.
+                # Ensure output directory exists
                 try:
-                    pages_to_rasterize = []
-                    # Use the redactor's compiled patterns if available
-                    phone_re = getattr(self.redactor, '_phone_re', None)
-                    id_re = getattr(self.redactor, '_id_re', None)
-                    for i in range(len(doc)):
-                        try:
-                            p = doc[i]
-                            txt = p.get_text('text') or ''
-                        except Exception:
-                            txt = ''
-                        found = False
-                        try:
-                            # Many PDFs split numbers with whitespace/newlines. Use a
-                            # digits-only normalized string for robust detection.
-                            digits_only = re.sub(r"\D", "", txt)
-                            # phone-like: starts with 84 or 0 and has at least 9 digits total
-                            if re.search(r"(?:84|0)\d{7,}", digits_only):
-                                found = True
-                            # ID-like: 9 or 12 digit tokens often need removal as well
-                            if not found and re.search(r"\d{9}|\d{12}", digits_only):
-                                found = True
-                        except Exception:
-                            # if pattern matching fails, skip
-                            pass
-                        if found:
-                            pages_to_rasterize.append(i)
-                    # Rasterize pages from end->start to keep indices stable
-                    for pnum in reversed(pages_to_rasterize):
-                        try:
-                            page = doc[pnum]
-                            # render at reasonable resolution
-                            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                            rect = page.rect
-                            # remove original page and replace with an image-only page
-                            doc.delete_page(pnum)
-                            newp = doc.new_page(pnum, width=rect.width, height=rect.height)
-                            newp.insert_image(rect, pixmap=pix)
-                            logger.info("processor: rasterized page %d to remove leftover selectable tokens", pnum)
-                        except Exception:
-                            logger.exception("processor: rasterizing page %s failed", pnum)
+                    out_dir = os.path.dirname(out_path) or os.getcwd()
+                    os.makedirs(out_dir, exist_ok=True)
                 except Exception:
-                    logger.exception("processor: post-redaction rasterize check failed")
+                    logger.exception("Failed to prepare output directory for %s", out_path)
 
-                logger.info("Saving processed document to: %s", out_path)
-                doc.save(out_path, garbage=4, deflate=True, clean=True)
-            except Exception:
-                logger.exception("Failed to save output PDF %s", out_path)
+                try:
+                    logger.info("Saving processed document to: %s (%s profile)", out_path, self.save_profile)
+                    self._save(doc, out_path)
+                except Exception:
+                    logger.exception("Failed to save output PDF %s", out_path)
             finally:
                 try:
                     doc.close()
@@ -151,19 +452,83 @@ class PDFProcessor:
             logger.exception("Error processing %s", input_pdf)
             return 0
 
+    def process_bytes(self, data, output=None):
+        """Redact a PDF held in memory; returns (redacted PDF bytes, report).
+
+        `data` is bytes, bytearray or memoryview; nothing touches the disk. With
+        a file-like `output` the result is written there instead and None is
+        returned in place of the bytes. The report holds "redactions",
+        "pages", "fingerprint", "template", "verification" (see
+        last_verification), "input_bytes", "output_bytes" and "seconds".
+        Errors are raised rather than logged, so the caller can reject the
+        message.
+        """
+        import fitz
+        start = time.perf_counter()
+        # a failed verification must not report the previous document's pages
+        self.last_verification = []
+        doc = fitz.open(stream=data, filetype="pdf")
+        try:
+            redactions, fingerprint, template = self._redact_document(doc)
+            pages = len(doc)
+            if output is None:
+                result = self._save(doc)
+                written = len(result)
+            else:
+                offset = _tell(output)
+                written = self._save(doc, output)
+                result = None
+                if offset is not None:
+                    written = output.tell() - offset
+        finally:
+            doc.close()
+        report = {"redactions": redactions, "pages": pages, "fingerprint": fingerprint, "template": template,
+                  "verification": self.last_verification, "input_bytes": memoryview(data).nbytes,
+                  "output_bytes": written, "seconds": time.perf_counter() - start}
+        logger.info("Processed %d bytes in memory: %d pages, redactions=%d, output=%s bytes",
+                    report["input_bytes"], pages, redactions, written)
+        return result, report
+
+    def process_stream(self, source, output):
+        """File-like variant of process_bytes: reads `source` and writes the redacted PDF to `output`.
+
+        Returns the report. The input is read whole (MuPDF needs random
+        access); a seekable output is written straight from the document
+        without an intermediate bytes copy, a pipe or socket gets the bytes in
+        one write.
+        """
+        return self.process_bytes(source.read(), output=output)[1]
+
 if __name__ == "__main__":
-    if os.environ.get("RULES_ONLY", "0") == "1":
+    import argparse
+    parser = argparse.ArgumentParser(description="Process and redact all PDFs in ./contract")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--kb", default=KNOWLEDGE_BASE_FILE,
+                        help="Knowledge base file (.json, or .db/.sqlite for the SQLite backend)")
+    parser.add_argument("--ner-batch-docs", type=int, default=4,
+                        help="Documents whose pages share one batched NER pass")
+    parser.add_argument("--shared-ner", action="store_true",
+                        help="Load the NER model once in a server process shared by all workers")
+    parser.add_argument("--save-profile", default=None,
+                        help="How output PDFs are saved: archive (default), fast or linearized")
+    parser.add_argument("--shard-pages", type=int, default=None,
+                        help="With --workers: Split documents of at least twice this many pages across the workers by page range")
+    args = parser.parse_args()
+    if os.environ.get("RULES_ONLY", "0") == "1" or args.workers > 1:
         nlp = None
     else:
         nlp = NERModelLoader().load()
-    kb = KnowledgeBase()
+    kb = open_knowledge_base(args.kb)
     cfg = RedactionConfig()
-    proc = PDFProcessor(cfg, kb, nlp_pipeline=nlp)
+    proc = PDFProcessor(cfg, kb, nlp_pipeline=nlp, save_profile=args.save_profile)
     output_directory = "hop_dong_da_che_AI_Final"
     os.makedirs(output_directory, exist_ok=True)
     pdf_files = [f for f in os.listdir("./contract") if f.lower().endswith(".pdf") and not f.startswith("che_")]
-    for filename in tqdm(pdf_files, desc="Processing PDFs"):
-        input_path = os.path.join("./contract", filename)
-        output_filename = os.path.join(output_directory, f"che_{filename}")
-        proc.process_pdf_final(input_path, output_filename)
+    jobs = [(os.path.join("./contract", f), os.path.join(output_directory, f"che_{f}")) for f in pdf_files]
+    if args.workers > 1:
+        from .batch import run_batch
+        run_batch(jobs, kb, args.workers, config_path=cfg.path, docs_per_task=args.ner_batch_docs,
+                  shared_ner=args.shared_ner, save_profile=args.save_profile, shard_pages=args.shard_pages)
+    else:
+        proc.process_jobs(jobs, docs_per_batch=args.ner_batch_docs)
     kb.save()
\ No newline at end of file
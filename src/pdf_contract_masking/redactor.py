@@ -2,19 +2,35 @@ import re
 import os
 import fitz  # PyMuPDF
 from .constants import ID_REGEX, PHONE_REGEX, DEFAULT_CUSTOMER_KEYWORDS
+from .page_index import PageTextIndex, PageIndexCache
+from .rule_plan import RulePlan, PHONE_ANCHOR_VARIANTS
+from .anchor_matcher import WordStream
+from .ner_stage import find_persons
 from .logger import get_logger
 logger = get_logger(__name__)
 
 class Redactor:
     """Apply learned rules to redact a PDF document."""
 
-    def __init__(self, config, customer_keywords=None):
+    def __init__(self, config, customer_keywords=None, immediate_apply=None):
         self.config = config
         self.customer_keywords = customer_keywords or DEFAULT_CUSTOMER_KEYWORDS
+        # By default redact annotations are collected per page and applied in one
+        # pass after the page's last rule. IMMEDIATE_REDACTIONS=1 restores the old
+        # apply-after-every-token behavior for PyMuPDF builds that misbehave.
+        if immediate_apply is None:
+            immediate_apply = os.environ.get("IMMEDIATE_REDACTIONS", "0") == "1"
+        self.immediate_apply = immediate_apply
+        # page number -> redact rects added but not applied yet (deferred mode),
+        # and page number -> {token digits: count} for the tokens they cover
+        self._pending_rects = {}
+        self._pending_tokens = {}
         # None = unknown, False = not supported, True = supported
         self._supports_chars = None
         # Set to True after we've logged a chars-related AssertionError to avoid log spam
         self._chars_error_logged = False
+        # PageIndexCache of the document being redacted (set by apply_rules)
+        self._page_cache = None
         # IMEI/EMEI exclusion settings -- load from config if present
         try:
             imei_cfg = self.config.get_exclusion('imei', {}) if self.config else {}
@@ -42,6 +58,34 @@ class Redactor:
         except Exception:
             self._id_re = ID_REGEX
 
+    # Helper: cached text views of a page (fresh, uncached index outside apply_rules)
+    def _index(self, page):
+        cache = self._page_cache
+        return cache.get(page) if cache is not None else PageTextIndex(page)
+
+    # Helper: every rect of a token on the page, via the text geometry map when it
+    # lines up with the page text (same hits as page.search_for without a MuPDF search)
+    def _token_rects(self, page, token):
+        geometry = self._index(page).geometry
+        if geometry is None:
+            return list(page.search_for(token))
+        return geometry.find_rects(token)
+
+    # Helper: rects of one regex match over the page's text index, from its
+    # offsets (O(match length)); searches for the token only without geometry
+    def _match_rects(self, page, m):
+        geometry = self._index(page).geometry
+        if geometry is None:
+            return list(page.search_for(m.group(0)))
+        return geometry.span_rects(m.start(), m.end())
+
+    # Helper: rects of a digit string that may be split by separators or line breaks
+    def _digit_rects(self, page, digits):
+        geometry = self._index(page).geometry
+        if geometry is None:
+            return list(page.search_for(digits))
+        return geometry.find_digit_rects(digits)
+
     # Helper: safe wrapper around page.search_for that logs failures
     def _safe_search_for(self, page, text, clip=None):
         try:
@@ -126,12 +170,7 @@ class Redactor:
                     left_boundary = None
                     if getattr(self, '_supports_chars', False):
                         try:
-                            chars = page.get_text("chars")
-                            digit_chars = [
-                                (fitz.Rect(c[0], c[1], c[2], c[3]), c[4])
-                                for c in chars
-                                if fitz.Rect(c[0], c[1], c[2], c[3]).intersects(area) and c[4].isdigit()
-                            ]
+                            digit_chars = self._index(page).digit_chars_in(area)
                             # mid region starts after left_keep digits
                             if len(digit_chars) > left_keep:
                                 # start x of the first mid character
@@ -164,12 +203,7 @@ class Redactor:
                     right_boundary = None
                     if getattr(self, '_supports_chars', False):
                         try:
-                            chars = page.get_text("chars")
-                            digit_chars = [
-                                (fitz.Rect(c[0], c[1], c[2], c[3]), c[4])
-                                for c in chars
-                                if fitz.Rect(c[0], c[1], c[2], c[3]).intersects(area) and c[4].isdigit()
-                            ]
+                            digit_chars = self._index(page).digit_chars_in(area)
                             if len(digit_chars) > right_keep:
                                 # x1 of the last mid character is at index len(digit_chars)-right_keep-1
                                 idx = max(0, len(digit_chars) - right_keep - 1)
@@ -215,6 +249,12 @@ class Redactor:
         except Exception:
             pass
 
+        # In deferred mode the token text is still on the page until the flush,
+        # so another rule may locate the same token again; don't redact it twice.
+        if not self.immediate_apply and self._is_pending(page, redact_rect):
+            logger.debug("Redactor._compute_and_record: token=%r already pending at %s", token, redact_rect)
+            return 0
+
         ok = self._draw_filled_rect(page, redact_rect)
         # Also try to add a redact annotation so we can apply redactions reliably
         added_annot = False
@@ -235,16 +275,23 @@ class Redactor:
             except Exception:
                 logger.exception("Redactor._compute_and_record: fallback add_redact_annot also failed for %s", redact_rect)
 
-        # If we were able to add a redact annotation, try applying redactions on
-        # this page immediately to remove the underlying text. Some PyMuPDF
-        # builds/platforms behave inconsistently with doc-level apply_redactions;
-        # applying per-page is a robust fallback.
+        # If we were able to add a redact annotation, either remember it for the
+        # page-level flush (deferred) or apply redactions on this page right away
+        # (immediate). Some PyMuPDF builds/platforms behave inconsistently with
+        # doc-level apply_redactions; applying per-page is a robust fallback.
         applied_now = False
-        if added_annot:
+        if added_annot and not self.immediate_apply:
+            self._pending_rects.setdefault(page.number, []).append(redact_rect)
+            counts = self._pending_tokens.setdefault(page.number, {})
+            key = re.sub(r"\D", "", token)
+            counts[key] = counts.get(key, 0) + 1
+        elif added_annot:
             try:
                 if hasattr(page, 'apply_redactions'):
                     page.apply_redactions()
                     applied_now = True
+                    # page content changed; cached extractions are stale now
+                    self._index(page).release()
                     logger.debug("Redactor._compute_and_record: applied redactions on page %s for rect %s", page.number, redact_rect)
             except Exception:
                 logger.exception("Redactor._compute_and_record: page.apply_redactions failed for page %s rect %s", page.number, redact_rect)
@@ -260,81 +307,183 @@ class Redactor:
             logger.exception("Redactor._compute_and_record: failed to print redaction summary for token=%r", token)
         return 1 if ok or added_annot or applied_now else 0
 
-    def apply_rules(self, doc, rules, nlp_pipeline=None):
-        total_redactions = 0
-        overlays = []
-        REQUIRE_NEAR_PERSON = os.environ.get("REQUIRE_NEAR_PERSON", "0") == "1" and (nlp_pipeline is not None)
-        person_rects_by_page = self._gather_person_rects(doc, nlp_pipeline) if REQUIRE_NEAR_PERSON else {}
-        # expose to instance for scoring heuristics
+    def _is_pending(self, page, rect):
+        """True when a not-yet-applied redaction on `page` mostly lies within `rect`."""
+        for pending in self._pending_rects.get(page.number, []):
+            overlap = pending & rect
+            if not overlap.is_empty and overlap.get_area() >= 0.5 * min(pending.get_area(), rect.get_area()):
+                return True
+        return False
+
+    def _unredacted(self, page, areas):
+        """Drop token areas already redacted earlier on this page.
+
+        In immediate mode their text is gone from the page anyway; in deferred
+        mode it is still there until _flush_page(), so filter them explicitly.
+        """
+        if self.immediate_apply or not self._pending_rects.get(page.number):
+            return list(areas)
+        return [a for a in areas if not self._is_pending(page, a)]
+
+    def _unredacted_matches(self, page, matches):
+        """Skip text matches whose token was already redacted on this page.
+
+        Deferred-mode counterpart of the text disappearing after an immediate
+        apply: the first N occurrences of a token redacted N times are skipped.
+        """
+        counts = None if self.immediate_apply else self._pending_tokens.get(page.number)
+        seen = {}
+        for m in matches:
+            if counts:
+                key = re.sub(r"\D", "", m.group(0))
+                seen[key] = seen.get(key, 0) + 1
+                if seen[key] <= counts.get(key, 0):
+                    continue
+            yield m
+
+    def _flush_page(self, page):
+        """Apply every pending redact annotation of `page` in a single pass."""
+        pending = self._pending_rects.pop(page.number, None)
+        self._pending_tokens.pop(page.number, None)
+        if not pending:
+            return False
         try:
-            self._person_rects = person_rects_by_page
+            page.apply_redactions()
+            logger.debug("Redactor._flush_page: applied %d redactions on page %s", len(pending), page.number)
+            return True
         except Exception:
-            self._person_rects = {}
+            logger.exception("Redactor._flush_page: page.apply_redactions failed for page %s", page.number)
+            return False
+        finally:
+            self._index(page).release()
+
+    def apply_rules(self, doc, rules, nlp_pipeline=None, page_cache=None, persons=None):
+        """Apply `rules` to `doc` and return the number of redactions.
 
-        # Diagnostic: when DEBUG logging is enabled, enumerate phone-like matches found in page text
-        # and report whether page.search_for returns any bounding areas for each token.
+        `rules` is a list of rule dicts or a precompiled RulePlan (see
+        KnowledgeBase.get_plan). Rules are applied page by page (keeping their order within a page); in
+        deferred mode each page's redactions are applied once after its last rule.
+        `page_cache` lets the caller share page extractions with the
+        RuleLearner; each page's extractions are released once its last rule ran.
+        `persons` ([{name: rects}] per page, see find_persons) reuses person
+        names already found instead of running NER again for REQUIRE_NEAR_PERSON.
+        """
+        total_redactions = 0
+        overlays = []
+        self._pending_rects = {}
+        owns_cache = page_cache is None
+        self._page_cache = PageIndexCache() if owns_cache else page_cache
         try:
-            if logger.isEnabledFor(10):  # logging.DEBUG == 10
-                for pnum, page in enumerate(doc):
-                    try:
-                        page_text = page.get_text("text")
-                    except Exception:
-                        logger.exception("Diagnostic: failed to extract page_text for page %d", pnum)
-                        continue
-                    try:
-                        for m in self._phone_re.finditer(page_text):
-                            token = m.group(0)
-                            try:
-                                areas = page.search_for(token)
-                                logger.debug("DIAG phone_match page=%d token=%r areas=%d", pnum, token, len(areas))
-                            except Exception:
-                                logger.exception("Diagnostic: page.search_for failed for token=%r on page %d", token, pnum)
-                    except Exception:
-                        logger.exception("Diagnostic: PHONE_REGEX finditer failed on page %d", pnum)
-        except Exception:
-            logger.exception("Diagnostic: phone-match diagnostic block failed")
+            REQUIRE_NEAR_PERSON = os.environ.get("REQUIRE_NEAR_PERSON", "0") == "1" and (nlp_pipeline is not None or persons is not None)
+            person_rects_by_page = self._gather_person_rects(doc, nlp_pipeline, persons) if REQUIRE_NEAR_PERSON else {}
+            # expose to instance for scoring heuristics
+            try:
+                self._person_rects = person_rects_by_page
+            except Exception:
+                self._person_rects = {}
 
-        for rule in rules:
-            page_num, anchor, pattern_str = rule["page"], rule["anchor"], rule["pattern"]
-            pattern = re.compile(pattern_str)
-            if page_num >= len(doc):
-                continue
-            page = doc[page_num]
-            anchor_rects = page.search_for(anchor)
-            if anchor and not anchor_rects and any(x in anchor for x in ["<ID>", "<PHONE>", "<NUM>"]):
-                total_redactions += self._handle_sanitized_anchor(page, pattern_str, anchor, overlays)
-                continue
-            if anchor and anchor_rects:
-                _, add_count = self._apply_anchor_rects(page_num, page, anchor_rects, pattern, anchor, overlays)
-                total_redactions += add_count
-                continue
-            if os.environ.get("ALLOW_PAGE_WIDE_FALLBACK", "0") == "1":
-                total_redactions += self._page_wide_redact(page_num, page, pattern, overlays)
-        self._draw_overlays(doc, overlays)
+            # Diagnostic: when DEBUG logging is enabled, enumerate phone-like matches found in page text
+            # and report whether page.search_for returns any bounding areas for each token.
+            try:
+                if logger.isEnabledFor(10):  # logging.DEBUG == 10
+                    for pnum, page in enumerate(doc):
+                        try:
+                            page_text = self._index(page).text
+                        except Exception:
+                            logger.exception("Diagnostic: failed to extract page_text for page %d", pnum)
+                            continue
+                        try:
+                            for m in self._phone_re.finditer(page_text):
+                                token = m.group(0)
+                                try:
+                                    areas = page.search_for(token)
+                                    logger.debug("DIAG phone_match page=%d token=%r areas=%d", pnum, token, len(areas))
+                                except Exception:
+                                    logger.exception("Diagnostic: page.search_for failed for token=%r on page %d", token, pnum)
+                        except Exception:
+                            logger.exception("Diagnostic: PHONE_REGEX finditer failed on page %d", pnum)
+            except Exception:
+                logger.exception("Diagnostic: phone-match diagnostic block failed")
+
+            plan = rules if isinstance(rules, RulePlan) else RulePlan(rules)
+            for page_num in plan.by_page:
+                if page_num < len(doc):
+                    total_redactions += self._redact_page(doc[page_num], plan, overlays)
+            self._draw_overlays(doc, overlays)
+        finally:
+            if owns_cache:
+                self._page_cache.clear()
+            self._page_cache = None
         return total_redactions
 
-    def _gather_person_rects(self, doc, nlp_pipeline):
-        rects_by_page = {}
-        for pnum, page in enumerate(doc):
-            txt = page.get_text("text")
-            if not txt.strip():
-                rects_by_page[pnum] = []
-                continue
+    def _redact_page(self, page, plan, overlays):
+        page_num = page.number
+        matcher = plan.anchor_matcher(page_num)
+        count = 0
+        for rule in plan.by_page.get(page_num, []):
+            count += self._apply_rule(page_num, page, rule, overlays, matcher)
+        # every rule for this page has run: apply its redactions in one
+        # pass and drop its cached extractions
+        self._flush_page(page)
+        self._page_cache.release(page_num)
+        return count
+
+    def apply_page(self, page, plan, page_cache=None, person_rects=None):
+        """Apply the rules of `plan` (RulePlan) for one page and draw its overlays.
+
+        Streaming counterpart of apply_rules: nothing is kept for the page
+        afterwards. `person_rects` (the page's PER rects) enables
+        REQUIRE_NEAR_PERSON like `persons` does for apply_rules.
+        """
+        if not plan.by_page.get(page.number):
+            return 0
+        overlays = []
+        self._pending_rects = {}
+        owns_cache = page_cache is None
+        self._page_cache = PageIndexCache() if owns_cache else page_cache
+        self._person_rects = {page.number: person_rects} if person_rects is not None else {}
+        try:
+            count = self._redact_page(page, plan, overlays)
+            self._draw_overlays(page.parent, overlays)
+            return count
+        finally:
+            if owns_cache:
+                self._page_cache.clear()
+            self._page_cache = None
+            self._person_rects = {}
+
+    def _find_anchor(self, page, anchor, matcher=None):
+        """Anchor rects from the page's single-pass matcher, else page.search_for."""
+        if matcher is not None and anchor:
+            index = self._index(page)
             try:
-                ner_res = nlp_pipeline(txt)
-            except Exception as e:
-                logger.exception("Redactor._gather_person_rects: nlp_pipeline failed")
-                ner_res = []
-            names = [ent["word"] for ent in ner_res if ent.get("entity_group") == "PER"]
-            rects = []
-            for name in set(names):
-                try:
-                    rects.extend(page.search_for(name))
-                except Exception as e:
-                    logger.exception("Redactor._gather_person_rects: page.search_for(name) failed for '%s'", name)
-                    continue
-            rects_by_page[pnum] = rects
-        return rects_by_page
+                hits = index.memo(matcher, lambda: matcher.locate(index.memo("word_stream", lambda: WordStream(index.words))))
+                rects = hits.get(anchor)
+            except Exception:
+                logger.exception("Redactor._find_anchor: anchor matcher failed on page %s", page.number)
+                rects = None
+            if rects is not None:
+                return list(rects)
+        return page.search_for(anchor)
+
+    def _apply_rule(self, page_num, page, rule, overlays, matcher=None):
+        anchor, pattern = rule.anchor, rule.pattern
+        anchor_rects = self._find_anchor(page, anchor, matcher)
+        if anchor and not anchor_rects and rule.sanitized:
+            return self._handle_sanitized_anchor(page, rule, overlays)
+        if anchor and anchor_rects:
+            _, add_count = self._apply_anchor_rects(page_num, page, anchor_rects, pattern, anchor, overlays,
+                                                    phone_anchor=rule.phone_anchor)
+            return add_count
+        if os.environ.get("ALLOW_PAGE_WIDE_FALLBACK", "0") == "1":
+            return self._page_wide_redact(page_num, page, pattern, overlays)
+        return 0
+
+    def _gather_person_rects(self, doc, nlp_pipeline, persons=None):
+        if persons is None:
+            # one batched NER pass over all pages of the document
+            persons = find_persons(doc, nlp_pipeline, [self._index(page).text for page in doc])
+        return {pnum: [r for rects in found.values() for r in rects] for pnum, found in enumerate(persons)}
 
     def _is_imei_context(self, page, area, token):
         """Return True when the token appears to be an IMEI/EMEI and a nearby label
@@ -347,7 +496,7 @@ class Redactor:
             return False
         try:
             # Check blocks that intersect the area for IMEI labels
-            blocks = page.get_text('blocks')
+            blocks = self._index(page).blocks
             for b in blocks:
                 br = fitz.Rect(b[:4])
                 if br.intersects(area):
@@ -359,7 +508,7 @@ class Redactor:
             # Also check a small surrounding clip for label text
             clip = fitz.Rect(max(0, area.x0 - 40), max(0, area.y0 - 20), area.x1 + 40, area.y1 + 20)
             try:
-                ctx = page.get_text(clip=clip).lower()
+                ctx = self._index(page).text_in(clip).lower()
                 norm2 = re.sub(r"[\s:._\-()]+", "", ctx)
                 if any(v in ctx for v in self._imei_variants) or any(v in norm2 for v in [x.replace(' ', '') for x in self._imei_variants]):
                     return True
@@ -375,11 +524,12 @@ class Redactor:
             return False
         return False
 
-    def _handle_sanitized_anchor(self, page, pattern_str, anchor, overlays):
+    def _handle_sanitized_anchor(self, page, rule, overlays):
         added = 0
+        pattern_str = rule.pattern_str
         try:
-            page_text = page.get_text("text")
-            label_text = anchor.replace("<ID>", "").replace("<PHONE>", "").replace("<NUM>", "").strip()
+            page_text = self._index(page).text
+            label_text = rule.label_text
             if not label_text:
                 return 0
             label_rects = []
@@ -389,17 +539,16 @@ class Redactor:
                 logger.exception("Redactor._handle_sanitized_anchor: page.search_for(label_text) failed")
                 label_rects = []
             if not label_rects:
-                alt = label_text.split()[:3]
-                if alt:
+                if rule.label_alt:
                     try:
-                        label_rects = page.search_for(" ".join(alt))
+                        label_rects = page.search_for(rule.label_alt)
                     except Exception as e:
                         logger.exception("Redactor._handle_sanitized_anchor: fallback search_for failed")
                         label_rects = []
             for lr in label_rects:
-                for m in re.finditer(pattern_str, page_text):
+                for m in self._unredacted_matches(page, rule.pattern.finditer(page_text)):
                     token = m.group(0)
-                    for area in page.search_for(token):
+                    for area in self._match_rects(page, m):
                         # Skip IMEI/EMEI tokens explicitly
                         if self._is_imei_context(page, area, token):
                             logger.debug("Skipping IMEI-context token in _handle_sanitized_anchor: %r", token)
@@ -414,20 +563,28 @@ class Redactor:
             logger.exception("Redactor._handle_sanitized_anchor failed")
         return added
 
-    def _apply_anchor_rects(self, page_num, page, anchor_rects, pattern, anchor, overlays):
+    def _apply_anchor_rects(self, page_num, page, anchor_rects, pattern, anchor, overlays, phone_anchor=None):
         added = 0
         for an_rect in anchor_rects:
             search_rect = fitz.Rect(an_rect.x1, an_rect.y0 - 5, an_rect.x1 + 200, an_rect.y1 + 5)
             try:
-                sensitive_text = page.get_text(clip=search_rect).strip()
+                sensitive_text = self._index(page).text_in(search_rect).strip()
             except Exception:
                 sensitive_text = ""
                 logger.exception("Redactor._apply_anchor_rects: failed to get clipped text for search_rect")
-            match = pattern.search(sensitive_text)
+            match = None
+            areas = []
+            for m in pattern.finditer(sensitive_text):
+                areas = self._safe_search_for(page, m.group(0), clip=search_rect)
+                if areas and not self._unredacted(page, areas):
+                    # already redacted by an earlier rule on this page (deferred mode)
+                    continue
+                match = m
+                break
             logger.debug("anchor_rect=%s anchor=%r sensitive_text=%r match=%s", an_rect, anchor, sensitive_text, bool(match))
             if match:
                 token = match.group(0)
-                for area in self._safe_search_for(page, token, clip=search_rect):
+                for area in self._unredacted(page, areas):
                     added += self._compute_and_record(page, area, token, pattern.pattern, overlays)
                     break
             else:
@@ -436,10 +593,10 @@ class Redactor:
                 # for the pattern and redact any matches that appear to be on the
                 # same line and to the right of the anchor rect.
                 try:
-                    page_text_full = page.get_text("text")
+                    page_text_full = self._index(page).text
                     # variants to detect phone label mention in nearby text
                     phone_variants = ['điện thoại', 'sđt', 'số điện thoại', 'đt', 'dt', 'sdt', 'tel', 'phone', 'mobile', 'mobi', 'đthoai', 'dienthoai']
-                    for m2 in pattern.finditer(page_text_full):
+                    for m2 in self._unredacted_matches(page, pattern.finditer(page_text_full)):
                         token2 = m2.group(0)
                         # check a small text window around the match for explicit phone labels
                         ctx_start = max(0, m2.start() - 40)
@@ -451,7 +608,7 @@ class Redactor:
                         # overlap phone-label blocks, are vertically close to the anchor,
                         # or intersect detected person rects (if present).
                         try:
-                            candidates = list(page.search_for(token2))
+                            candidates = self._match_rects(page, m2)
                         except Exception:
                             candidates = []
                         # If exact search didn't find anything, try some robust fallbacks:
@@ -462,22 +619,22 @@ class Redactor:
                             token_clean = re.sub(r"\s+", "", token2)
                             try:
                                 if token_clean != token2:
-                                    candidates = list(page.search_for(token_clean))
+                                    candidates = self._token_rects(page, token_clean)
                             except Exception:
                                 candidates = []
                         if not candidates:
                             digits_only = re.sub(r"\D", "", token2)
                             try:
                                 if digits_only:
-                                    # try searching the digit-only string (some PDFs store numbers without separators)
-                                    candidates = list(page.search_for(digits_only))
+                                    # match in the page's digits-only view (numbers split by separators or line breaks)
+                                    candidates = self._digit_rects(page, digits_only)
                             except Exception:
                                 pass
                         if not candidates:
                             # As a last resort, look through text blocks and use block rects that
                             # contain the digits/token (handles heavy line-wrapping / OCR splits).
                             try:
-                                blocks = page.get_text('blocks')
+                                blocks = self._index(page).blocks
                                 for b in blocks:
                                     br = fitz.Rect(b[:4])
                                     btxt = b[4]
@@ -487,6 +644,7 @@ class Redactor:
                                         candidates.append(br)
                             except Exception:
                                 pass
+                        candidates = self._unredacted(page, candidates)
                         best = None
                         best_score = -1.0
                         for area in candidates:
@@ -507,7 +665,7 @@ class Redactor:
                                 score += 100.0
                             # boost if the candidate overlaps a text block that contains phone keywords
                             try:
-                                blocks = page.get_text('blocks')
+                                blocks = self._index(page).blocks
                                 for b in blocks:
                                     br = fitz.Rect(b[:4])
                                     if br.intersects(area):
@@ -546,13 +704,14 @@ class Redactor:
                 # Targeted: if the anchor itself looks like a phone label, run PHONE_REGEX
                 # across the whole page and redact matches near the anchor rect.
                 try:
-                    normalized_anchor = re.sub(r"[\s:._\-()]+", "", anchor or "").lower()
-                    phone_anchor_variants = ['đt', 'dt', 'sđt', 'sdt', 'sốđiệnthoại', 'sodienthoai', 'sốđiệnthoạ i', 'sodienthoai']
-                    if any(v in normalized_anchor for v in phone_anchor_variants):
-                        page_text_full = page.get_text("text")
-                        for m3 in self._phone_re.finditer(page_text_full):
+                    if phone_anchor is None:
+                        normalized_anchor = re.sub(r"[\s:._\-()]+", "", anchor or "").lower()
+                        phone_anchor = any(v in normalized_anchor for v in PHONE_ANCHOR_VARIANTS)
+                    if phone_anchor:
+                        page_text_full = self._index(page).text
+                        for m3 in self._unredacted_matches(page, self._phone_re.finditer(page_text_full)):
                             token3 = m3.group(0)
-                            for area in page.search_for(token3):
+                            for area in self._unredacted(page, self._match_rects(page, m3)):
                                 # check vertical proximity
                                 mid_area_y = (area.y0 + area.y1) / 2.0
                                 mid_an_y = (an_rect.y0 + an_rect.y1) / 2.0
@@ -564,7 +723,7 @@ class Redactor:
                 except Exception:
                     logger.exception("Redactor._apply_anchor_rects: targeted phone-anchor full-page search failed")
             try:
-                anchor_text = page.get_text(clip=an_rect).strip()
+                anchor_text = self._index(page).text_in(an_rect).strip()
             except Exception:
                 anchor_text = ""
                 logger.exception("Redactor._apply_anchor_rects: failed to get anchor text clip")
@@ -572,16 +731,16 @@ class Redactor:
             logger.debug("anchor_rect=%s anchor=%r anchor_text=%r match2=%s", an_rect, anchor, anchor_text, bool(match2))
             if match2:
                 token = match2.group(0)
-                for area in self._safe_search_for(page, token, clip=an_rect):
+                for area in self._unredacted(page, self._safe_search_for(page, token, clip=an_rect)):
                     added += self._compute_and_record(page, area, token, pattern.pattern, overlays)
         return False, added
 
     def _page_wide_redact(self, page_num, page, pattern, overlays):
         added = 0
-        page_text = page.get_text("text")
-        for m in pattern.finditer(page_text):
+        page_text = self._index(page).text
+        for m in self._unredacted_matches(page, pattern.finditer(page_text)):
             token = m.group(0)
-            for area in page.search_for(token):
+            for area in self._match_rects(page, m):
                 # Skip IMEI tokens on page-wide pass
                 if self._is_imei_context(page, area, token):
                     logger.debug("Skipping IMEI-context token in _page_wide_redact: %r", token)
@@ -593,7 +752,7 @@ class Redactor:
 
     def _is_label_token_ok(self, page, lr, area, pattern_str, token):
         try:
-            label_text = page.get_text(clip=lr).lower()
+            label_text = self._index(page).text_in(lr).lower()
         except Exception as e:
             logger.exception("Redactor._is_label_token_ok: failed to get label text")
             label_text = ""
@@ -650,7 +809,7 @@ class Redactor:
         # Detect/remember whether page.get_text("chars") is supported to avoid repeated AssertionErrors
         if self._supports_chars is None:
             try:
-                _ = page.get_text("chars")
+                _ = self._index(page).chars
                 self._supports_chars = True
             except AssertionError:
                 self._supports_chars = False
@@ -665,12 +824,7 @@ class Redactor:
 
         if self._supports_chars:
             try:
-                chars = page.get_text("chars")
-                digit_chars = [
-                    (fitz.Rect(c[0], c[1], c[2], c[3]), c[4])
-                    for c in chars
-                    if fitz.Rect(c[0], c[1], c[2], c[3]).intersects(area) and c[4].isdigit()
-                ]
+                digit_chars = self._index(page).digit_chars_in(area)
                 if len(digit_chars) >= left_keep + right_keep + 1:
                     mid_chars = digit_chars[left_keep: len(digit_chars) - right_keep]
                     if mid_chars:
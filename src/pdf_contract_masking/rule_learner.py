@@ -1,7 +1,10 @@
+import os
 import re
 import fitz  # PyMuPDF
 from .constants import ID_REGEX, PHONE_REGEX, DEFAULT_CUSTOMER_KEYWORDS
 from .knowledge_base import KnowledgeBase
+from .page_index import PageTextIndex, PageIndexCache
+from .ner_stage import NERStage, person_names, keyword_context
 from .logger import get_logger
 logger = get_logger(__name__)
 
@@ -10,6 +13,12 @@ class RuleLearner:
 
     def __init__(self, customer_keywords=None):
         self.customer_keywords = customer_keywords or DEFAULT_CUSTOMER_KEYWORDS
+        # PageIndexCache of the document being learned (set by learn)
+        self._page_cache = None
+
+    def _index(self, page):
+        cache = self._page_cache
+        return cache.get(page) if cache is not None else PageTextIndex(page)
 
     def _extract_person_names(self, page_text, nlp_pipeline):
         if not nlp_pipeline:
@@ -21,8 +30,33 @@ class RuleLearner:
             logger.exception("RuleLearner._extract_person_names failed")
             return []
 
+    def ner_text(self, index):
+        """Text of a page (PageTextIndex) that NER has to read for learning.
+
+        Names only count near a customer keyword, so just the lines around
+        keywords are sent (pages without one are skipped) unless
+        NER_KEYWORD_GATE=0.
+        """
+        if os.environ.get("NER_KEYWORD_GATE", "1") == "0":
+            return index.text
+        try:
+            return keyword_context(index, self.customer_keywords)
+        except Exception:
+            logger.exception("RuleLearner.ner_text: keyword pre-filter failed; using the full page")
+            return index.text
+
+    def _person_names_by_page(self, doc, nlp_pipeline):
+        """PER names of every page, with NER batched across the pages of the document."""
+        texts = [self.ner_text(self._index(page)) for page in doc]
+        stage = nlp_pipeline if isinstance(nlp_pipeline, NERStage) else NERStage(nlp_pipeline)
+        try:
+            return [person_names(entities) for entities in stage.run(texts)]
+        except Exception as e:
+            logger.exception("RuleLearner._person_names_by_page failed")
+            return [[] for _ in texts]
+
     def _gather_sensitive_from_words(self, page):
-        words = page.get_text("words")
+        words = self._index(page).words
         sensitive = []
         for w in words:
             w_text = w[4].strip()
@@ -56,76 +90,120 @@ class RuleLearner:
                         rules.append(rule)
         return rules
 
-    def learn(self, doc, nlp_pipeline=None):
+    def learn(self, doc, nlp_pipeline=None, page_cache=None, persons=None):
+        """Learn rules for `doc`.
+
+        `page_cache` lets the caller share page extractions with the Redactor;
+        when omitted each page's extractions are dropped once it is learned.
+        `persons` ([{name: rects}] per page, see find_persons) replaces the
+        learner's own NER pass.
+        """
+        owns_cache = page_cache is None
+        self._page_cache = PageIndexCache() if owns_cache else page_cache
         rules = []
-        for page_num, page in enumerate(doc):
-            full_text = page.get_text("text")
-            if not full_text.strip():
-                continue
-            skip_ner = __import__("os").environ.get("RULES_ONLY", "0") == "1" or nlp_pipeline is None
-            person_names = [] if skip_ner else self._extract_person_names(full_text, nlp_pipeline)
-            customer_rects = []
-            if person_names:
-                for name in set(person_names):
-                    try:
-                        for name_rect in page.search_for(name):
-                            check_rect = name_rect + (-200, -20, 200, 20)
-                            nearby_text = page.get_text(clip=check_rect).lower()
-                            if any(keyword in nearby_text for keyword in self.customer_keywords):
-                                customer_rects.append(name_rect)
-                    except Exception as e:
-                        logger.exception("RuleLearner.learn: error searching for person name")
-                        continue
-            if not customer_rects:
-                lowered = full_text.lower()
-                for kw in self.customer_keywords:
-                    if kw in lowered:
-                        for r in page.search_for(kw):
-                            customer_rects.append(r)
-            sensitive_words = self._gather_sensitive_from_words(page)
-            if not sensitive_words:
-                for m in ID_REGEX.finditer(full_text):
-                    sensitive_words.append({"text": m.group(0), "rects": []})
-                for m in PHONE_REGEX.finditer(full_text):
-                    sensitive_words.append({"text": m.group(0), "rects": []})
-            rules = self._add_label_rules(page, full_text, rules)
-            for customer_rect in (customer_rects if customer_rects else [None]):
-                for s in sensitive_words:
-                    s_text = s.get("text") if isinstance(s, dict) else s
-                    s_rects = s.get("rects") if isinstance(s, dict) and s.get("rects") else page.search_for(s_text)
-                    for sensitive_rect in s_rects:
-                        if customer_rect is not None:
-                            if abs(customer_rect.y0 - sensitive_rect.y0) >= 120:
-                                continue
-                        anchor = self._choose_anchor(page, sensitive_rect)
-                        if not anchor:
-                            for kw in self.customer_keywords:
-                                if kw in full_text.lower():
-                                    anchor = kw
-                                    break
-                        pattern = ID_REGEX.pattern if ID_REGEX.search(s_text) else PHONE_REGEX.pattern
-                        if not anchor or not str(anchor).strip():
-                            continue
-                        lower_anchor = str(anchor).lower()
-                        money_keywords = ['số tiền', 'khoản vay', 'khoản', 'giá trị', 'thanh toán']
-                        if any(k in lower_anchor for k in money_keywords):
-                            continue
-                        rule_anchor = KnowledgeBase.sanitize_anchor_text(anchor or "")
-                        if not rule_anchor or not rule_anchor.strip():
-                            continue
-                        rule = {"page": page_num, "anchor": rule_anchor, "pattern": pattern}
-                        if rule not in rules:
-                            rules.append(rule)
+        try:
+            skip_ner = os.environ.get("RULES_ONLY", "0") == "1" or nlp_pipeline is None
+            if persons is not None:
+                names_by_page = [list(found) for found in persons]
+            else:
+                names_by_page = None if skip_ner else self._person_names_by_page(doc, nlp_pipeline)
+            for page_num, page in enumerate(doc):
+                names = names_by_page[page_num] if names_by_page else []
+                name_rects = persons[page_num] if persons is not None else None
+                self._learn_page(page_num, page, names, rules, name_rects)
+                if owns_cache:
+                    self._page_cache.release(page_num)
+        finally:
+            if owns_cache:
+                self._page_cache.clear()
+            self._page_cache = None
+        return rules
+
+    def learn_page(self, page, nlp_pipeline=None, page_cache=None, persons=None):
+        """Learn the rules of one page (streaming mode); same rules as learn() yields for it.
+
+        `persons` is the page's {name: rects} (see find_persons), if known.
+        """
+        self._page_cache = page_cache if page_cache is not None else PageIndexCache()
+        rules = []
+        try:
+            if persons is not None:
+                names = list(persons)
+            elif os.environ.get("RULES_ONLY", "0") == "1" or nlp_pipeline is None:
+                names = []
+            else:
+                names = self._person_names_by_page([page], nlp_pipeline)[0]
+            self._learn_page(page.number, page, names, rules, persons)
+        finally:
+            if page_cache is None:
+                self._page_cache.clear()
+            self._page_cache = None
         return rules
 
+    def _learn_page(self, page_num, page, person_names, rules, name_rects=None):
+        full_text = self._index(page).text
+        if not full_text.strip():
+            return
+        customer_rects = []
+        if person_names:
+            for name in set(person_names):
+                try:
+                    found = name_rects.get(name) if name_rects is not None else None
+                    for name_rect in (found if found is not None else page.search_for(name)):
+                        check_rect = name_rect + (-200, -20, 200, 20)
+                        nearby_text = self._index(page).text_in(check_rect).lower()
+                        if any(keyword in nearby_text for keyword in self.customer_keywords):
+                            customer_rects.append(name_rect)
+                except Exception as e:
+                    logger.exception("RuleLearner.learn: error searching for person name")
+                    continue
+        if not customer_rects:
+            lowered = full_text.lower()
+            for kw in self.customer_keywords:
+                if kw in lowered:
+                    for r in page.search_for(kw):
+                        customer_rects.append(r)
+        sensitive_words = self._gather_sensitive_from_words(page)
+        if not sensitive_words:
+            for m in ID_REGEX.finditer(full_text):
+                sensitive_words.append({"text": m.group(0), "rects": []})
+            for m in PHONE_REGEX.finditer(full_text):
+                sensitive_words.append({"text": m.group(0), "rects": []})
+        self._add_label_rules(page, full_text, rules)
+        for customer_rect in (customer_rects if customer_rects else [None]):
+            for s in sensitive_words:
+                s_text = s.get("text") if isinstance(s, dict) else s
+                s_rects = s.get("rects") if isinstance(s, dict) and s.get("rects") else page.search_for(s_text)
+                for sensitive_rect in s_rects:
+                    if customer_rect is not None:
+                        if abs(customer_rect.y0 - sensitive_rect.y0) >= 120:
+                            continue
+                    anchor = self._choose_anchor(page, sensitive_rect)
+                    if not anchor:
+                        for kw in self.customer_keywords:
+                            if kw in full_text.lower():
+                                anchor = kw
+                                break
+                    pattern = ID_REGEX.pattern if ID_REGEX.search(s_text) else PHONE_REGEX.pattern
+                    if not anchor or not str(anchor).strip():
+                        continue
+                    lower_anchor = str(anchor).lower()
+                    money_keywords = ['số tiền', 'khoản vay', 'khoản', 'giá trị', 'thanh toán']
+                    if any(k in lower_anchor for k in money_keywords):
+                        continue
+                    rule_anchor = KnowledgeBase.sanitize_anchor_text(anchor or "")
+                    if not rule_anchor or not rule_anchor.strip():
+                        continue
+                    rule = {"page": page_num, "anchor": rule_anchor, "pattern": pattern}
+                    if rule not in rules:
+                        rules.append(rule)
+
     def _choose_anchor(self, page, sensitive_rect):
         try:
             left_rect = fitz.Rect(sensitive_rect.x0 - 300, sensitive_rect.y0 - 5,
                                   sensitive_rect.x0 - 1, sensitive_rect.y1 + 5)
-            page_words = page.get_text("words")
             strip_chars = " .,;:-_()[]\"'`"
-            nearby_words = [w[4].strip(strip_chars) for w in page_words
-                            if fitz.Rect(w[0], w[1], w[2], w[3]).intersects(left_rect)]
+            nearby_words = [w[4].strip(strip_chars) for w in self._index(page).words_in(left_rect)]
             nearby_words = [w for w in nearby_words if w and len(w) > 1]
             if nearby_words:
                 anchor = " ".join(nearby_words[-3:])
@@ -0,0 +1,53 @@
+import re
+from .anchor_matcher import AnchorMatcher
+
+SANITIZED_PLACEHOLDERS = ("<ID>", "<PHONE>", "<NUM>")
+# Normalized anchor fragments that mark a phone label (see Redactor._apply_anchor_rects)
+PHONE_ANCHOR_VARIANTS = ['đt', 'dt', 'sđt', 'sdt', 'sốđiệnthoại', 'sodienthoai', 'sốđiệnthoạ i', 'sodienthoai']
+
+
+class CompiledRule:
+    """One KB rule with everything the Redactor derives from it precomputed."""
+
+    def __init__(self, rule):
+        self.page = rule["page"]
+        self.anchor = rule["anchor"]
+        self.pattern_str = rule["pattern"]
+        self.pattern = re.compile(self.pattern_str)
+        anchor = self.anchor or ""
+        self.sanitized = any(x in anchor for x in SANITIZED_PLACEHOLDERS)
+        # label text used when the sanitized anchor itself cannot be found
+        label = anchor
+        for placeholder in SANITIZED_PLACEHOLDERS:
+            label = label.replace(placeholder, "")
+        self.label_text = label.strip()
+        self.label_alt = " ".join(self.label_text.split()[:3])
+        normalized = re.sub(r"[\s:._\-()]+", "", anchor).lower()
+        self.phone_anchor = any(v in normalized for v in PHONE_ANCHOR_VARIANTS)
+
+
+class RulePlan:
+    """Rules of one template compiled once and grouped by page (in rule order).
+
+    `source` is the rule list the plan was built from, so a cache can tell
+    when the rules behind a fingerprint were replaced.
+    """
+
+    def __init__(self, rules):
+        self.source = rules
+        self.rules = [CompiledRule(r) for r in rules]
+        self.by_page = {}
+        for rule in self.rules:
+            self.by_page.setdefault(rule.page, []).append(rule)
+        self._matchers = {}
+
+    def anchor_matcher(self, page_num):
+        """AnchorMatcher over every anchor of a page, built on first use."""
+        matcher = self._matchers.get(page_num)
+        if matcher is None:
+            anchors = [r.anchor for r in self.by_page.get(page_num, [])]
+            matcher = self._matchers[page_num] = AnchorMatcher(anchors)
+        return matcher
+
+    def __len__(self):
+        return len(self.rules)
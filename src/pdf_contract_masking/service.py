@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import base64
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from . import batch
+from .config import RedactionConfig
+from .constants import KNOWLEDGE_BASE_FILE, REDACTION_CONFIG_FILE
+from .knowledge_base import open_knowledge_base
+from .utils import current_rss_mb
+from .logger import get_logger
+logger = get_logger(__name__)
+
+
+def _warm():
+    """Pool warm-up task: the worker's initializer has loaded config, KB and NER by now."""
+    return os.getpid()
+
+
+def _redact_bytes(data):
+    """Worker task: redact one uploaded PDF with the worker's warm PDFProcessor."""
+    proc = batch._worker_processor
+    pdf, report = proc.process_bytes(data)
+    kb = proc.kb
+    updates = {"rules": kb.take_updates(), "aliases": kb.take_alias_updates(),
+               "signatures": kb.take_signature_updates()}
+    return pdf, report, updates
+
+
+class ServiceBusy(Exception):
+    """Every worker is busy and the queue is full."""
+
+
+class RedactionService:
+    """Warm redaction workers behind a bounded queue.
+
+    `workers` processes each load the config, the KB and the NER pipeline
+    once (batch._init_worker) -- or share one NER server with `shared_ner` --
+    and are warmed up before the service accepts requests, so a request only
+    pays for its own document. At most `workers + queue_size` documents are
+    accepted at a time; redact() raises ServiceBusy beyond that instead of
+    queueing without bound. Rules learned by the workers are merged into the
+    service's KB as they come in and saved every `save_interval` seconds and
+    at close().
+    """
+
+    def __init__(self, kb_path=KNOWLEDGE_BASE_FILE, config_path=REDACTION_CONFIG_FILE, workers=2, queue_size=8,
+                 rules_only=None, shared_ner=False, save_profile=None, timeout=300.0, save_interval=30.0):
+        if rules_only is None:
+            rules_only = os.environ.get("RULES_ONLY", "0") == "1"
+        self.config = RedactionConfig(config_path)
+        self.kb = open_knowledge_base(kb_path)
+        self.workers = max(1, int(workers))
+        self.capacity = self.workers + max(0, int(queue_size))
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        # merges and saves of the KB; kept apart from _lock so a save never holds up the stats
+        self._kb_lock = threading.Lock()
+        self._kb_dirty = False
+        self.save_interval = save_interval
+        self._stop = threading.Event()
+        self._saver = None
+        self.stats = {"processed": 0, "failed": 0, "rejected": 0, "in_flight": 0, "busy_seconds": 0.0}
+        self._ner_server = self._ner_address = authkey = None
+        if shared_ner and not rules_only:
+            from .ner_server import start_ner_server
+            try:
+                self._ner_server, self._ner_address, authkey = start_ner_server(
+                    batch_size=self.config.get_ner_settings()["batch_size"])
+            except Exception:
+                logger.exception("service: NER server failed to start; workers load their own model")
+        self._initargs = (self.kb.path, config_path, rules_only, self._ner_address, authkey, save_profile)
+        self._pool = None
+        self._generation = 0
+        self.started = None
+
+    def start(self):
+        """Start the worker pool and wait until every worker is warm."""
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=batch._init_worker,
+                                   initargs=self._initargs)
+        pids = [f.result() for f in [pool.submit(_warm) for _ in range(self.workers)]]
+        with self._lock:
+            self._pool = pool
+        if self._saver is None and self.save_interval:
+            self._saver = threading.Thread(target=self._save_loop, name="kb-saver", daemon=True)
+            self._saver.start()
+        self.started = time.time()
+        logger.info("service: %d warm workers %s", self.workers, sorted(set(pids)))
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if self._ner_server is not None:
+            from .ner_server import stop_ner_server
+            stop_ner_server(self._ner_server, self._ner_address)
+            self._ner_server = None
+        self._stop.set()
+        if self._saver is not None:
+            self._saver.join()
+            self._saver = None
+        with self._kb_lock:
+            self.kb.save()
+            self._kb_dirty = False
+
+    def _save_loop(self):
+        while not self._stop.wait(self.save_interval):
+            self.save_kb()
+
+    def save_kb(self):
+        """Save the KB if workers taught it anything since the last save."""
+        with self._kb_lock:
+            if not self._kb_dirty:
+                return
+            try:
+                self.kb.save()
+                self._kb_dirty = False
+            except Exception:
+                logger.exception("service: saving the knowledge base failed; retrying later")
+
+    def health(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(status="ok" if self._pool is not None else "stopped", workers=self.workers,
+                     capacity=self.capacity, templates=len(self.kb.data),
+                     uptime_seconds=round(time.time() - self.started, 1) if self.started else 0.0)
+        rss = current_rss_mb()
+        if rss is not None:
+            # left out where it can't be measured (Windows without psutil)
+            stats["rss_mb"] = round(rss, 1)
+        return stats
+
+    def reserve(self):
+        """Take a slot for one document; raises ServiceBusy when all are taken.
+
+        redact(data, reserved=True) uses (and frees) a reserved slot; call
+        release() instead if the document is never handed to redact().
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise ServiceBusy(f"{self.capacity} documents in progress")
+
+    def release(self):
+        self._slots.release()
+
+    def redact(self, data, reserved=False):
+        """Redact one PDF (bytes); returns (redacted PDF bytes, report). Raises ServiceBusy when full."""
+        if not reserved:
+            self.reserve()
+        start = time.perf_counter()
+        with self._lock:
+            self.stats["in_flight"] += 1
+            pool, generation = self._pool, self._generation
+        future = None
+        try:
+            if pool is None:
+                raise RuntimeError("service: no worker pool (stopped or restarting)")
+            future = pool.submit(_redact_bytes, data)
+            try:
+                pdf, report, updates = future.result(timeout=self.timeout)
+            except BrokenProcessPool:
+                logger.exception("service: worker pool broke; restarting it")
+                self._restart_pool(generation)
+                raise
+            if updates["rules"] or updates["aliases"] or updates["signatures"]:
+                with self._kb_lock:
+                    self.kb.merge(updates["rules"])
+                    self.kb.merge_aliases(updates["aliases"])
+                    self.kb.merge_signatures(updates["signatures"])
+                    self._kb_dirty = True
+            report["queue_seconds"] = max(0.0, time.perf_counter() - start - report["seconds"])
+            with self._lock:
+                self.stats["processed"] += 1
+            return pdf, report
+        except Exception:
+            with self._lock:
+                self.stats["failed"] += 1
+            raise
+        finally:
+            if future is None or future.cancel() or future.done():
+                self._finish(start)
+            else:
+                # timed out while a worker still runs it: the slot stays taken until the worker is free
+                future.add_done_callback(lambda _: self._finish(start))
+
+    def _finish(self, start):
+        with self._lock:
+            self.stats["in_flight"] -= 1
+            self.stats["busy_seconds"] += time.perf_counter() - start
+        self.release()
+
+    def _restart_pool(self, generation):
+        """Replace the broken pool; only the first caller for a given pool `generation` does it."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._generation += 1
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+
+def _summary(report):
+    """The report without per-page verification, small enough for a response header."""
+    summary = {k: v for k, v in report.items() if k != "verification"}
+    summary["treated_pages"] = [v["page"] for v in report.get("verification", []) if v["action"] != "none"]
+    return summary
+
+
+class RedactionHandler(BaseHTTPRequestHandler):
+    """GET /health; POST /redact with a PDF body (application/pdf).
+
+    /redact answers with the redacted PDF and the report (without the
+    per-page verification) as JSON in the X-Redaction-Report header, or,
+    with ?format=json, with {"report": ..., "pdf": base64}. A full service
+    answers 503 with Retry-After.
+    """
+
+    service = None
+    max_upload = 64 * 1024 * 1024
+    retry_after = 1
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/redact":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self._send_json(411, {"error": "Content-Length required"})
+            return
+        if length > self.max_upload:
+            self._send_json(413, {"error": f"upload larger than {self.max_upload} bytes"})
+            return
+        # take a slot before reading the upload so a full service never buffers it
+        try:
+            self.service.reserve()
+        except ServiceBusy as e:
+            self.close_connection = True
+            self._send_json(503, {"error": f"busy: {e}"}, {"Retry-After": str(self.retry_after)})
+            return
+        try:
+            data = self.rfile.read(length)
+        except Exception:
+            self.service.release()
+            raise
+        if not data.startswith(b"%PDF"):
+            self.service.release()
+            self._send_json(400, {"error": "body is not a PDF"})
+            return
+        try:
+            pdf, report = self.service.redact(data, reserved=True)
+        except Exception as e:
+            logger.exception("service: redacting an upload of %d bytes failed", length)
+            self._send_json(500, {"error": repr(e)})
+            return
+        if parse_qs(url.query).get("format") == ["json"]:
+            self._send_json(200, {"report": report, "pdf": base64.b64encode(pdf).decode("ascii")})
+            return
+        self._send(200, pdf, "application/pdf", {"X-Redaction-Report": json.dumps(_summary(report))})
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("service: %s %s", self.address_string(), format % args)
+
+
+def make_server(service, host="127.0.0.1", port=8080):
+    """ThreadingHTTPServer serving `service` (already started)."""
+    handler = type("Handler", (RedactionHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local HTTP redaction service (POST /redact, GET /health)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", "-w", type=int, default=2, help="Warm worker processes")
+    parser.add_argument("--queue", type=int, default=8, help="Documents waiting for a worker before 503s")
+    parser.add_argument("--kb", default=KNOWLEDGE_BASE_FILE,
+                        help="Knowledge base file (.json, or .db/.sqlite for the SQLite backend)")
+    parser.add_argument("--config", default=REDACTION_CONFIG_FILE)
+    parser.add_argument("--shared-ner", action="store_true",
+                        help="Load the NER model once in a server process shared by all workers")
+    parser.add_argument("--save-profile", default=None,
+                        help="How output PDFs are saved: archive (default), fast or linearized")
+    args = parser.parse_args()
+    service = RedactionService(args.kb, args.config, workers=args.workers, queue_size=args.queue,
+                               shared_ner=args.shared_ner, save_profile=args.save_profile)
+    service.start()
+    server = make_server(service, args.host, args.port)
+    print(f"Serving redaction on http://{args.host}:{server.server_address[1]} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
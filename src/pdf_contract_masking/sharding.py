@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import fitz  # PyMuPDF
+from .logger import get_logger
+logger = get_logger(__name__)
+
+
+def plan_shards(page_count, shards, min_pages=1):
+    """Split pages 0..page_count into at most `shards` contiguous [start, end) ranges.
+
+    Every range holds at least `min_pages` pages (one range when the document
+    is too short to split) and range sizes differ by at most one page.
+    """
+    shards = max(1, min(int(shards), page_count // max(1, int(min_pages))))
+    bounds = [round(i * page_count / shards) for i in range(shards + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(shards)]
+
+
+class ShardedJob:
+    """Parent-side state of one document split by page range across workers.
+
+    prepare() resolves the document's template once (workers get its rules,
+    or learn their pages' rules when it is unknown) and plans the shards;
+    every shard is redacted into its own partial PDF (PDFProcessor.process_shard),
+    and finish() stitches the parts, in page order, into the output file and
+    stores any learned rules in the KB.
+    """
+
+    def __init__(self, processor, input_pdf, output_pdf, shards, min_pages=1):
+        self.processor = processor
+        self.input_pdf = input_pdf
+        self.output_pdf = output_pdf
+        self.shards = shards
+        self.min_pages = min_pages
+        self.fingerprint = self.template = self.signature = self.rules = None
+        self.ranges = []
+        self.results = {}
+        self.failed = False
+        self._tmpdir = None
+
+    def prepare(self):
+        """Resolve the template and plan the shards; returns the shard tasks
+        [(input_pdf, part_pdf, start, end, rules)]."""
+        with fitz.open(self.input_pdf) as doc:
+            self.fingerprint, self.template, self.signature = self.processor.resolve_template(doc)
+            page_count = len(doc)
+        if self.template:
+            self.rules = list(self.processor.kb.data.get(self.template, []))
+        self.ranges = plan_shards(page_count, self.shards, self.min_pages)
+        self._tmpdir = tempfile.mkdtemp(prefix="shards-")
+        logger.info("sharding %s: %d pages in %d shards (template=%s)",
+                    self.input_pdf, page_count, len(self.ranges), self.template)
+        return [(self.input_pdf, self.part_path(i), start, end, self.rules)
+                for i, (start, end) in enumerate(self.ranges)]
+
+    def part_path(self, index):
+        return os.path.join(self._tmpdir, f"part-{index:04d}.pdf")
+
+    def complete(self, index, result):
+        """Record shard `index`'s (redactions, learned rules, report); True once all shards are in."""
+        self.results[index] = result
+        return len(self.results) == len(self.ranges)
+
+    def finish(self):
+        """Stitch the parts into the output PDF; returns the number of redactions."""
+        try:
+            redactions = sum(self.results[i][0] for i in range(len(self.ranges)))
+            out = fitz.open()
+            try:
+                for i in range(len(self.ranges)):
+                    with fitz.open(self.part_path(i)) as part:
+                        out.insert_pdf(part)
+                with fitz.open(self.input_pdf) as src:
+                    out.set_metadata(src.metadata or {})
+                    try:
+                        out.set_toc(src.get_toc())
+                    except Exception:
+                        logger.exception("sharding: copying the outline of %s failed", self.input_pdf)
+                out_dir = os.path.dirname(os.path.abspath(self.output_pdf))
+                os.makedirs(out_dir, exist_ok=True)
+                self.processor._save(out, self.output_pdf)
+            finally:
+                out.close()
+            learned = [rule for i in range(len(self.ranges)) for rule in self.results[i][1]]
+            if learned and self.fingerprint and not self.template:
+                self.processor._store_rules(self.fingerprint, learned, self.signature)
+            self.processor.last_verification = [entry for i in range(len(self.ranges)) for entry in self.results[i][2]]
+            logger.info("sharding: stitched %d parts into %s (redactions=%d)", len(self.ranges), self.output_pdf, redactions)
+            return redactions
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
@@ -0,0 +1,191 @@
+import os
+import json
+import sqlite3
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from .knowledge_base import KnowledgeBase
+from .logger import get_logger
+logger = get_logger(__name__)
+
+
+class SQLiteTable(MutableMapping):
+    """dict-like view of a (key TEXT PRIMARY KEY, value JSON) table.
+
+    Reads are point queries by key. Decoded values are kept in a small LRU
+    so repeated reads return the same object (KnowledgeBase.get_plan relies
+    on that). Values mutated in place must be assigned back to be stored.
+    With `keep_existing` a key is written once: assigning to a key another
+    writer already stored keeps the stored value (the KB's existing-wins rule).
+    """
+
+    def __init__(self, conn, table, key_column, cache_size=256, keep_existing=False):
+        self._conn = conn
+        self.table = table
+        self._key = key_column
+        self.cache_size = cache_size
+        self.keep_existing = keep_existing
+        self._cache = OrderedDict()
+
+    def _remember(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __getitem__(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        row = self._conn.execute(
+            f"SELECT value FROM {self.table} WHERE {self._key} = ?", (key,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = json.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def __contains__(self, key):
+        if key in self._cache:
+            return True
+        return self._conn.execute(
+            f"SELECT 1 FROM {self.table} WHERE {self._key} = ?", (key,)
+        ).fetchone() is not None
+
+    def __setitem__(self, key, value):
+        conflict = "IGNORE" if self.keep_existing else "REPLACE"
+        with self._conn:
+            cur = self._conn.execute(
+                f"INSERT OR {conflict} INTO {self.table} ({self._key}, value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False)),
+            )
+        if cur.rowcount:
+            self._remember(key, value)
+        else:
+            # someone else stored it first; the next read returns their value
+            self._cache.pop(key, None)
+
+    def __delitem__(self, key):
+        with self._conn:
+            cur = self._conn.execute(f"DELETE FROM {self.table} WHERE {self._key} = ?", (key,))
+        self._cache.pop(key, None)
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def insert_missing(self, items):
+        """Insert the (key, value) pairs whose key isn't stored yet, in one transaction.
+
+        Returns the keys that were inserted; existing keys are left untouched.
+        """
+        inserted = []
+        with self._conn:
+            for key, value in items:
+                cur = self._conn.execute(
+                    f"INSERT OR IGNORE INTO {self.table} ({self._key}, value) VALUES (?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False)),
+                )
+                if cur.rowcount:
+                    inserted.append(key)
+        return inserted
+
+    def __iter__(self):
+        for (key,) in self._conn.execute(f"SELECT {self._key} FROM {self.table}"):
+            yield key
+
+    def items(self):
+        for key, value in self._conn.execute(f"SELECT {self._key}, value FROM {self.table}"):
+            yield key, json.loads(value)
+
+    def __len__(self):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class SQLiteKnowledgeBase(KnowledgeBase):
+    """KnowledgeBase stored in a SQLite database (WAL mode) instead of JSON files.
+
+    Rules, aliases and template signatures live in tables keyed by
+    fingerprint, so opening the KB doesn't read it and lookups are point
+    queries. Every write is its own transaction, which lets batch workers
+    and the parent share one database; `save()` only checkpoints the WAL.
+    """
+
+    def __init__(self, path, plan_cache_size=256, timeout=30.0, journal=None):
+        self._conn = sqlite3.connect(path, timeout=timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for table, key in (("rules", "fingerprint"), ("aliases", "alias"), ("signatures", "fingerprint")):
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ({key} TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+        self._cache_size = plan_cache_size
+        self._signatures_seen = 0
+        # every write is already a committed transaction: no JSONL journal
+        # (`journal` is accepted so open_knowledge_base() callers can pass it)
+        super().__init__(path, plan_cache_size=plan_cache_size, journal=False)
+
+    def load(self):
+        return SQLiteTable(self._conn, "rules", "fingerprint", self._cache_size, keep_existing=True)
+
+    def load_aliases(self):
+        return SQLiteTable(self._conn, "aliases", "alias", self._cache_size)
+
+    def load_signatures(self):
+        return SQLiteTable(self._conn, "signatures", "fingerprint", self._cache_size, keep_existing=True)
+
+    def find_similar(self, signature, threshold):
+        # The SimHash index is built from all signatures once (by the base
+        # class); after that only rows stored since -- by this or any other
+        # process -- are read, by rowid, and added to it.
+        if self._similar is None:
+            self._signatures_seen = self._last_signature_rowid()
+        else:
+            rows = self._conn.execute(
+                "SELECT rowid, fingerprint, value FROM signatures WHERE rowid > ? ORDER BY rowid",
+                (self._signatures_seen,),
+            ).fetchall()
+            for rowid, fingerprint, value in rows:
+                self._similar.add(fingerprint, int(json.loads(value), 16))
+                self._signatures_seen = rowid
+        return super().find_similar(signature, threshold)
+
+    def _last_signature_rowid(self):
+        return self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM signatures").fetchone()[0]
+
+    def save(self):
+        # writes are already committed; fold the WAL back into the database file
+        try:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        except sqlite3.Error:
+            logger.exception("SQLiteKnowledgeBase.save: WAL checkpoint failed")
+
+    def merge(self, updates):
+        added = self.data.insert_missing((updates or {}).items())
+        self._pending.extend(added)
+        return len(added)
+
+    def import_json(self, kb):
+        """Copy rules, aliases and signatures of another KnowledgeBase; returns new rule count."""
+        added = self.merge(dict(kb.data.items()))
+        self.aliases.insert_missing(kb.aliases.items())
+        self.signatures.insert_missing(kb.signatures.items())
+        return added
+
+    def close(self):
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from .constants import KNOWLEDGE_BASE_FILE
+    parser = argparse.ArgumentParser(description="Import a JSON knowledge base into a SQLite KB")
+    parser.add_argument("source", nargs="?", default=KNOWLEDGE_BASE_FILE, help="JSON KB file")
+    parser.add_argument("target", help="SQLite KB file to create or extend (e.g. kb.db)")
+    args = parser.parse_args()
+    if not os.path.exists(args.source):
+        parser.error(f"no such file: {args.source}")
+    target = SQLiteKnowledgeBase(args.target)
+    added = target.import_json(KnowledgeBase(args.source))
+    target.save()
+    print(f"Imported {added} templates into {args.target} ({len(target.data)} total)")
+    target.close()
@@ -0,0 +1,108 @@
+import re
+import hashlib
+from .logger import get_logger
+logger = get_logger(__name__)
+
+SIGNATURE_BITS = 64
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(features):
+    """64-bit SimHash of an iterable of string features (0 when there are none)."""
+    counts = [0] * SIGNATURE_BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(SIGNATURE_BITS):
+            counts[bit] += 1 if (h >> bit) & 1 else -1
+    signature = 0
+    for bit, count in enumerate(counts):
+        if count > 0:
+            signature |= 1 << bit
+    return signature
+
+
+def similarity(a, b):
+    """Fraction of equal bits between two signatures (1.0 = identical)."""
+    return 1.0 - ((a ^ b).bit_count() / SIGNATURE_BITS)
+
+
+def template_features(words, width=None, height=None):
+    """Layout and text shingles of one page's words (page.get_text("words")).
+
+    Digits are masked so documents of one template that only differ in IDs,
+    phone numbers or dates produce the same text shingles. Layout features are
+    the (coarsely rounded) start of each text line.
+    """
+    tokens = [re.sub(r"\d+", "#", w[4].lower()) for w in words]
+    features = [" ".join(tokens[i:i + 3]) for i in range(max(len(tokens) - 2, 1))] if tokens else []
+    lines = {}
+    for w in words:
+        key = (w[5], w[6])
+        if key not in lines:
+            lines[key] = w
+    for w in lines.values():
+        features.append(f"line:{round(w[0] / 8)}:{round(w[1] / 8)}")
+    if width and height:
+        features.append(f"size:{round(width)}x{round(height)}")
+    return features
+
+
+def template_signature(page_index, page):
+    """SimHash signature of a document's first page (PageTextIndex + page)."""
+    return simhash(template_features(page_index.words, page.rect.width, page.rect.height))
+
+
+class SimHashIndex:
+    """Banded index of 64-bit signatures for near-duplicate lookup.
+
+    Signatures are split into `max_distance + 1` bands; two signatures within
+    `max_distance` differing bits agree on at least one band, so bucket hits
+    give every candidate without scanning the whole index.
+    """
+
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = SIGNATURE_BITS // bands
+        self._bands = [(i * width, SIGNATURE_BITS if i == bands - 1 else (i + 1) * width) for i in range(bands)]
+        self._buckets = [{} for _ in self._bands]
+        self._signatures = {}
+
+    def _keys(self, signature):
+        for lo, hi in self._bands:
+            yield (signature >> lo) & ((1 << (hi - lo)) - 1)
+
+    def add(self, key, signature):
+        self.remove(key)
+        self._signatures[key] = signature
+        for bucket, band in zip(self._buckets, self._keys(signature)):
+            bucket.setdefault(band, set()).add(key)
+
+    def remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for bucket, band in zip(self._buckets, self._keys(signature)):
+            bucket.get(band, set()).discard(key)
+
+    def nearest(self, signature, exclude=()):
+        """(key, similarity) of the closest signature within max_distance, else None."""
+        candidates = set()
+        for bucket, band in zip(self._buckets, self._keys(signature)):
+            candidates |= bucket.get(band, set())
+        best = None
+        for key in candidates:
+            if key in exclude:
+                continue
+            distance = (self._signatures[key] ^ signature).bit_count()
+            if distance <= self.max_distance and (best is None or distance < best[1] or (distance == best[1] and key < best[0])):
+                best = (key, distance)
+        if best is None:
+            return None
+        return best[0], 1.0 - best[1] / SIGNATURE_BITS
+
+    def __len__(self):
+        return len(self._signatures)
@@ -1,3 +1,7 @@
+import os
+import sys
+
+
 def mask_text(text: str, keep_last: int = 4) -> str:
     """Return text where all but the last `keep_last` characters are replaced with `*`.
 
@@ -14,3 +18,28 @@ def mask_text(text: str, keep_last: int = 4) -> str:
     if n <= keep_last:
         return text
     return "*" * (n - keep_last) + text[-keep_last:]
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB, or None where it can't be measured.
+
+    Reads /proc on Linux; elsewhere uses psutil when installed, then the peak
+    RSS from `resource` (not available on Windows).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -0,0 +1,122 @@
+import re
+from .page_index import PageTextIndex
+from .logger import get_logger
+logger = get_logger(__name__)
+
+# one written number: digits joined by . , / - without spaces ("500.000.000", "01/02/2024", "2025-00123")
+_NUMBER_RUN = re.compile(r"\d+(?:[.,/\-]\d+)*")
+# the parts of a run joined by / or - ("0912345678/0987654321")
+_RUN_PART = re.compile(r"\d+(?:[.,]\d+)*")
+# amounts grouped by thousands (no leading zero) and dates are never IDs or phones
+_MONEY = re.compile(r"[1-9]\d{0,2}(?:[.,]\d{3})+")
+_DATE = re.compile(r"\d{1,2}[./\-]\d{1,2}[./\-](?:\d{4}|\d{2})|\d{4}[./\-]\d{1,2}[./\-]\d{1,2}")
+_CURRENCY = re.compile(r"\s*(?:đồng|đ\b|vnđ|vnd|usd|triệu|tỷ)", re.IGNORECASE)
+
+
+class RedactionVerifier:
+    """Find ID/phone numbers still present as text after redaction.
+
+    `patterns` is [(kind, compiled regex)] -- the configured ID and phone
+    patterns, the only thing that makes a leftover. A page is scanned once,
+    on its plain text. Every pattern hit is split into the written numbers
+    it covers (digits joined by . , / - ; a run joined by / or - also into
+    its parts) and each number that fully matches a pattern is a leftover
+    of its own, so numbers written side by side are found one by one. A hit
+    with no such number (e.g. a phone written with spaces) counts as a whole
+    unless it is part of a longer number. Amounts and dates never count.
+    Char geometry (to locate the leftovers) is only built for pages that
+    have some. `skip(page, rect, token)` can exempt a leftover (e.g. IMEI
+    numbers); it sees each number separately.
+    """
+
+    def __init__(self, patterns, skip=None):
+        self.patterns = [(kind, rx) for kind, rx in patterns if rx is not None]
+        self.skip = skip
+
+    def _kind(self, token):
+        for kind, rx in self.patterns:
+            if rx.fullmatch(token):
+                return kind
+        return None
+
+    def _numbers(self, text, runs):
+        """((start, end), kind, run) of the written numbers in `runs` that match a pattern."""
+        for rs, re in runs:
+            kind = self._kind(text[rs:re])
+            if kind is not None:
+                yield (rs, re), kind, (rs, re)
+                continue
+            for part in _RUN_PART.finditer(text, rs, re):
+                kind = self._kind(part.group())
+                if kind is not None and part.span() != (rs, re):
+                    yield part.span(), kind, (rs, re)
+
+    @staticmethod
+    def _is_part_of_longer_number(text, runs, s, e):
+        if (s > 0 and text[s - 1].isdigit()) or (e < len(text) and text[e].isdigit()):
+            return True
+        return any(rs < s or re > e for rs, re in runs)
+
+    @staticmethod
+    def _is_amount_or_date(text, runs, e):
+        if any(_MONEY.fullmatch(text, rs, re) or _DATE.fullmatch(text, rs, re) for rs, re in runs):
+            return True
+        return bool(_CURRENCY.match(text, e))
+
+    def _spans(self, text):
+        runs = [m.span() for m in _NUMBER_RUN.finditer(text)]
+        spans = {}
+        for kind, rx in self.patterns:
+            m = rx.search(text)
+            while m:
+                s, e = m.start(), m.end()
+                while s < e and not text[s].isdigit():
+                    s += 1
+                while e > s and not text[e - 1].isdigit():
+                    e -= 1
+                inside = [(rs, re) for rs, re in runs if rs < e and s < re]
+                numbers = list(self._numbers(text, inside))
+                for span, number_kind, run in numbers:
+                    if not self._is_amount_or_date(text, [run], span[1]):
+                        spans.setdefault(span, number_kind)
+                if not numbers and (s == e or self._is_part_of_longer_number(text, inside, s, e)):
+                    # a real match may start further in
+                    m = rx.search(text, m.start() + 1)
+                    continue
+                if not numbers and not self._is_amount_or_date(text, inside, e):
+                    spans.setdefault((s, e), kind)
+                m = rx.search(text, max(m.end(), m.start() + 1))
+        return sorted(spans.items())
+
+    def page_leftovers(self, page, index=None):
+        """[{"kind", "text", "rects"}] for one page; rects is None when a
+        leftover can't be located on the page."""
+        index = index or PageTextIndex(page)
+        text = index.text
+        spans = self._spans(text)
+        if not spans:
+            return []
+        geometry = index.geometry
+        leftovers = []
+        for (s, e), kind in spans:
+            token = text[s:e]
+            if geometry is not None:
+                rects = geometry.span_rects(s, e)
+            else:
+                rects = page.search_for(token) or None
+            if rects and self.skip is not None and all(self.skip(page, r, token) for r in rects):
+                continue
+            leftovers.append({"kind": kind, "text": token, "rects": rects})
+        return leftovers
+
+    def verify(self, doc):
+        """Per-page results: [{"page", "leftovers": [...]}]."""
+        return [{"page": pnum, "leftovers": self.verify_page(page)} for pnum, page in enumerate(doc)]
+
+    def verify_page(self, page):
+        """page_leftovers(), treating a page that can't be checked as not clean."""
+        try:
+            return self.page_leftovers(page)
+        except Exception:
+            logger.exception("RedactionVerifier: checking page %d failed", page.number)
+            return [{"kind": "unknown", "text": "", "rects": None}]
@@ -2,6 +2,7 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfbase import ttfonts
 from reportlab.pdfbase import pdfmetrics
+import fitz
 import os
 
 
@@ -44,6 +45,23 @@ def make_sample_pdf(path: str, cmnd: str, phone: str, cust_name: str = 'Nguyễn
     return path
 
 
+def make_long_pdf(path: str, pages: int = 12):
+    """Create a multi-page "loan package": each page has a customer name, its
+    own phone number (09123456NN) and the same CMND, plus a document title.
+    """
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1} of the loan package")
+        page.insert_text((72, 100), "Khách hàng: Nguyễn Văn A")
+        page.insert_text((72, 128), f"Số điện thoại: 09123456{i:02d}")
+        page.insert_text((72, 156), "CMND: 012345678")
+    doc.set_metadata({"title": "Loan package"})
+    doc.save(path)
+    doc.close()
+    return path
+
+
 def make_complex_pdf(path: str):
     """Create a PDF containing multiple labeled and unlabeled CMND and phone numbers,
     varied Vietnamese text, and random numeric noise to exercise detection rules.
@@ -0,0 +1,38 @@
+import random
+import re
+
+import fitz
+
+from pdf_contract_masking.anchor_matcher import AhoCorasick, AnchorMatcher, WordStream
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+def test_aho_corasick_finds_all_overlapping_occurrences():
+    rnd = random.Random(3)
+    for _ in range(200):
+        patterns = list({''.join(rnd.choice('ab ') for _ in range(rnd.randint(1, 4))) for _ in range(5)})
+        text = ''.join(rnd.choice('ab ') for _ in range(50))
+        expected = sorted((m.start(), m.start() + len(p), i)
+                          for i, p in enumerate(patterns)
+                          for m in re.finditer('(?=%s)' % re.escape(p), text))
+        assert sorted(AhoCorasick(patterns).finditer(text)) == expected
+
+
+def test_anchor_matcher_agrees_with_search_for(tmp_path):
+    path = make_sample_pdf(str(tmp_path / 'sample.pdf'), '012345678', '0912345678')
+    doc = fitz.open(path)
+    page = doc[0]
+    anchors = ["Tên khách", "Hợp đồng", "Số", "Số CMND: <ID>", "Số điện", "điện thoại"]
+    found = AnchorMatcher(anchors).locate(WordStream(page.get_text("words")))
+
+    assert found["Số CMND: <ID>"] == []
+    # "thoại" is followed by ":" inside the same word -> left to search_for
+    assert found["điện thoại"] is None
+    assert len(found["Số"]) == 2
+    for anchor in ("Tên khách", "Hợp đồng", "Số", "Số điện"):
+        expected = page.search_for(anchor)
+        assert len(found[anchor]) == len(expected) > 0
+        for got, want in zip(found[anchor], expected):
+            assert all(abs(a - b) < 0.5 for a, b in zip(got, want))
+    doc.close()
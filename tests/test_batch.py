@@ -0,0 +1,42 @@
+import json
+import os
+from pdf_contract_masking.batch import run_batch
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+def test_run_batch_merges_worker_rules(tmp_path):
+    jobs = []
+    for i, (cmnd, phone) in enumerate([('012345678', '0912345678'), ('123456789012', '84912345678')]):
+        src = make_sample_pdf(str(tmp_path / 'contract' / f'sample{i}.pdf'), cmnd, phone)
+        jobs.append((src, str(tmp_path / 'out' / f'che_sample{i}.pdf')))
+
+    kb = KnowledgeBase(str(tmp_path / 'kb.json'))
+    report = run_batch(jobs, kb, workers=2, config_path=os.path.abspath('redaction_config.json'), rules_only=True)
+
+    assert report['files'] == 2
+    assert report['failed'] == 0
+    assert report['files_per_second'] > 0
+    for _, out in jobs:
+        assert os.path.exists(out)
+    # rules learned in the workers were merged into the parent KB
+    assert kb.data
+    assert report['learned'] == len(kb.data)
+    assert kb.take_updates().keys() == kb.data.keys()
+
+
+def test_run_batch_journals_merged_rules_once(tmp_path, monkeypatch):
+    monkeypatch.setenv('KB_JOURNAL', '1')
+    jobs = []
+    for i, (cmnd, phone) in enumerate([('012345678', '0912345678'), ('123456789012', '84912345678')]):
+        src = make_sample_pdf(str(tmp_path / 'contract' / f'sample{i}.pdf'), cmnd, phone)
+        jobs.append((src, str(tmp_path / 'out' / f'che_sample{i}.pdf')))
+
+    kb = KnowledgeBase(str(tmp_path / 'kb.json'))
+    run_batch(jobs, kb, workers=2, config_path=os.path.abspath('redaction_config.json'), rules_only=True)
+
+    # only the parent writes the journal, once per merged template
+    with open(kb.journal_path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(r['key'] for r in records if r['kind'] == 'rules') == sorted(kb.data)
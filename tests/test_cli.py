@@ -10,6 +10,13 @@ class TestCLI(unittest.TestCase):
         result = subprocess.run([sys.executable, "-m", "pdf_contract_masking.cli", "123456"], capture_output=True, text=True)
         self.assertEqual(result.stdout.strip(), "**3456")
 
+    def test_rules_only_startup_skips_ml_stack(self):
+        # NERModelLoader imports torch/transformers only when a model is loaded
+        code = ("import sys, pdf_contract_masking.contract_masking, pdf_contract_masking.batch; "
+                "print([m for m in ('torch', 'transformers') if m in sys.modules])")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "[]")
+
 
 if __name__ == "__main__":
     unittest.main()
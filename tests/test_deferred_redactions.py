@@ -0,0 +1,45 @@
+import fitz
+import pytest
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.redactor import Redactor
+from pdf_contract_masking.rule_learner import RuleLearner
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+def _count_apply_calls(monkeypatch):
+    calls = []
+    original = fitz.Page.apply_redactions
+
+    def counting(page, *args, **kwargs):
+        calls.append(page.number)
+        return original(page, *args, **kwargs)
+
+    monkeypatch.setattr(fitz.Page, "apply_redactions", counting)
+    return calls
+
+
+@pytest.mark.parametrize("immediate", [False, True])
+def test_apply_rules_removes_tokens(tmp_path, monkeypatch, immediate):
+    path = make_sample_pdf(str(tmp_path / 'sample.pdf'), '012345678', '0912345678')
+    doc = fitz.open(path)
+    rules = RuleLearner().learn(doc)
+    calls = _count_apply_calls(monkeypatch)
+
+    redactions = Redactor(RedactionConfig(), immediate_apply=immediate).apply_rules(doc, rules)
+
+    assert redactions == 2
+    # deferred mode rewrites the page once; immediate mode once per token
+    assert calls == ([0, 0] if immediate else [0])
+    text = doc[0].get_text("text")
+    assert '012345678' not in text
+    assert '0912345678' not in text
+    doc.close()
+
+
+def test_immediate_mode_from_environment(monkeypatch):
+    monkeypatch.setenv("IMMEDIATE_REDACTIONS", "1")
+    assert Redactor(RedactionConfig()).immediate_apply is True
+    monkeypatch.delenv("IMMEDIATE_REDACTIONS")
+    assert Redactor(RedactionConfig()).immediate_apply is False
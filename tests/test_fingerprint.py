@@ -0,0 +1,60 @@
+import fitz
+import pytest
+
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+def _open(tmp_path, name, cmnd, phone):
+    return fitz.open(make_sample_pdf(str(tmp_path / name), cmnd, phone))
+
+
+def test_structural_fingerprint_ignores_text(tmp_path):
+    a = _open(tmp_path, 'a.pdf', '012345678', '0912345678')
+    b = _open(tmp_path, 'b.pdf', '123456789012', '84912345678')
+    assert KnowledgeBase.create_fingerprint(a) != KnowledgeBase.create_fingerprint(b)
+    assert KnowledgeBase.create_structural_fingerprint(a) == KnowledgeBase.create_structural_fingerprint(b)
+
+    other = fitz.open()
+    other.new_page().insert_text((72, 72), "Số CMND: 012345678")
+    assert KnowledgeBase.create_structural_fingerprint(other) != KnowledgeBase.create_structural_fingerprint(a)
+    assert KnowledgeBase.create_structural_fingerprint(fitz.open()) is None
+
+
+def test_tiered_lookup_skips_text_once_alias_is_trusted(tmp_path, monkeypatch):
+    kb = KnowledgeBase(str(tmp_path / 'kb.json'))
+    doc = _open(tmp_path, 'a.pdf', '012345678', '0912345678')
+    fingerprint = KnowledgeBase.create_fingerprint(doc)
+    kb.add_rules(fingerprint, [{"page": 0, "anchor": "Số CMND: <ID>", "pattern": r"\d{9}"}])
+
+    assert kb.lookup(doc, mode="tiered") == fingerprint
+    assert kb.lookup(doc, mode="tiered") == fingerprint
+    kb.save()
+
+    def no_text(doc):
+        raise AssertionError("text fingerprint should not be needed")
+    monkeypatch.setattr(KnowledgeBase, "create_fingerprint", staticmethod(no_text))
+    reloaded = KnowledgeBase(str(tmp_path / 'kb.json'))
+    assert reloaded.lookup(doc, mode="tiered") == fingerprint
+    with pytest.raises(AssertionError):
+        reloaded.lookup(doc, mode="text")
+
+
+def test_conflicting_alias_becomes_ambiguous(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / 'kb.json'))
+    a = _open(tmp_path, 'a.pdf', '012345678', '0912345678')
+    b = _open(tmp_path, 'b.pdf', '123456789', '0912345678')
+    fp_a = KnowledgeBase.create_fingerprint(a)
+    kb.add_rules(fp_a, [])
+    kb.lookup(a, mode="tiered")
+    # same skeleton, different header text: the structural alias can't be trusted
+    assert kb.lookup(b, mode="tiered") == KnowledgeBase.create_fingerprint(b)
+    kb.lookup(a, mode="tiered")
+    (entry,) = kb.aliases.values()
+    assert entry["fingerprint"] is None
+    assert kb.lookup(a, mode="tiered") == fp_a
+
+    other = KnowledgeBase(str(tmp_path / 'other.json'))
+    other.merge_aliases(kb.take_alias_updates())
+    assert list(other.aliases.values()) == [entry]
@@ -21,14 +21,15 @@ def test_integration_redaction_sample1(tmp_path, capsys):
     doc = fitz.open(out)
     full_text = "".join([p.get_text('text') for p in doc])
 
-    # look for phone-like numbers per config (digits only): any 9+ digit sequence starting with 84 or 0
-    phone_matches = re.findall(r"(?:84|0)\d{7,}", re.sub(r"\D", "", full_text))
+    # the CMND and phone number written into contract/sample1.pdf
+    numbers = ["012345678", "0912345678"]
 
     # Assert that we did perform at least one redaction (sanity)
     assert redactions >= 0
 
-    # If phone-like digits remain in plain text, flag; tests should not be flaky but PyMuPDF builds may differ
-    assert len(phone_matches) == 0, f"Found phone-like digits left in output text: {phone_matches}"
+    # None of them may remain in plain text (masked fragments like "0912...78" are fine)
+    leaked = [n for n in numbers if n in re.sub(r"\D", "", full_text)]
+    assert not leaked, f"Found phone/ID digits left in output text: {leaked}"
 
     # Ensure the processor printed per-redaction console lines (instrumentation)
     captured = capsys.readouterr()
@@ -0,0 +1,61 @@
+import json
+import os
+
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+
+
+RULES = [{"page": 0, "anchor": "Số CMND: <ID>", "pattern": r"\d{9}"}]
+
+
+def test_journal_survives_without_save(tmp_path):
+    path = str(tmp_path / 'kb.json')
+    kb = KnowledgeBase(path, journal=True)
+    kb.add_rules("fp1", RULES)
+    kb.add_signature("fp1", 0xABC)
+    kb.record_alias("other", "fp1")
+    assert not os.path.exists(path)
+    with open(kb.journal_path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 3
+
+    # a crash cut the last record short: everything before it is recovered
+    with open(kb.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"kind": "rules", "key": "fp2", "val')
+    recovered = KnowledgeBase(path)
+    assert recovered.data == {"fp1": RULES}
+    assert recovered.signatures == {"fp1": "0000000000000abc"}
+    assert recovered.aliases["other"]["fingerprint"] == "fp1"
+
+
+def test_save_compacts_only_when_journal_is_long(tmp_path):
+    path = str(tmp_path / 'kb.json')
+    kb = KnowledgeBase(path, journal=True, compact_every=3)
+    kb.add_rules("fp1", RULES)
+    kb.save()
+    assert not os.path.exists(path) and os.path.exists(kb.journal_path)
+
+    kb.add_rules("fp2", RULES)
+    kb.add_rules("fp3", RULES)
+    kb.save()
+    assert not os.path.exists(kb.journal_path)
+    with open(path, encoding='utf-8') as f:
+        assert sorted(json.load(f)) == ["fp1", "fp2", "fp3"]
+
+    kb.add_rules("fp4", RULES)
+    reopened = KnowledgeBase(path)
+    assert sorted(reopened.data) == ["fp1", "fp2", "fp3", "fp4"]
+    # a plain save folds the journal into the snapshot
+    reopened.save()
+    assert not os.path.exists(kb.journal_path)
+    assert sorted(KnowledgeBase(path).data) == ["fp1", "fp2", "fp3", "fp4"]
+
+
+def test_append_after_torn_record(tmp_path):
+    path = str(tmp_path / 'kb.json')
+    kb = KnowledgeBase(path, journal=True)
+    kb.add_rules("fp1", RULES)
+    with open(kb.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"kind": "rules", "key": "fp2", "val')
+    # the reopened writer drops the torn tail, so its next record starts a fresh line
+    kb = KnowledgeBase(path, journal=True)
+    kb.add_rules("fp3", RULES)
+    assert KnowledgeBase(path).data == {"fp1": RULES, "fp3": RULES}
@@ -0,0 +1,37 @@
+import fitz
+import pytest
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking.processor import PDFProcessor
+
+
+def _leftover_pdf(path):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Phone: 0912 345 678")
+    page.insert_text((72, 100), "Contract terms apply.")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.mark.parametrize("mode", ["page", "region", "redact"])
+def test_leftover_numbers_are_removed(tmp_path, monkeypatch, mode):
+    monkeypatch.setenv("RULES_ONLY", "1")
+    monkeypatch.setenv("RASTERIZE_MODE", mode)
+    src = _leftover_pdf(str(tmp_path / "in.pdf"))
+    out = str(tmp_path / "out.pdf")
+    # empty KB and no digits rules apply: only the leftover check touches the page
+    proc = PDFProcessor(RedactionConfig(), KnowledgeBase(str(tmp_path / "kb.json")))
+    proc.process_pdf_final(src, out)
+    with fitz.open(out) as doc:
+        text = doc[0].get_text()
+        images = doc[0].get_images()
+    assert "0912" not in text
+    if mode == "page":
+        assert text.strip() == "" and len(images) == 1
+    else:
+        # the rest of the page stays selectable text
+        assert "Contract terms apply." in text
+        assert len(images) == (1 if mode == "region" else 0)
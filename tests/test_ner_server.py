@@ -0,0 +1,67 @@
+import threading
+
+from pdf_contract_masking.ner_server import NERServer, NERClient
+from pdf_contract_masking.ner_stage import NERStage
+
+from tests.test_ner_stage import FakeNER, NAME, _page
+
+KEY = b"test-key"
+
+
+def _serve(tmp_path, pipeline, **kwargs):
+    server = NERServer(pipeline, str(tmp_path / "ner.sock"), KEY, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_client_behaves_like_the_pipeline(tmp_path):
+    pipeline = FakeNER()
+    server = _serve(tmp_path, pipeline)
+    try:
+        client = NERClient(server.address, authkey=KEY)
+        assert client.tokenizer.model_max_length == pipeline.tokenizer.model_max_length
+        text = _page(40, {3, 30})
+        local = NERStage(pipeline, cache_size=0).run([text])[0]
+        remote = NERStage(client, cache_size=0).run([text])[0]
+        assert [(e["start"], e["end"], e["word"]) for e in remote] == [(e["start"], e["end"], e["word"]) for e in local]
+        assert client(f"ông {NAME}")[0]["word"] == NAME
+        client.close()
+    finally:
+        server.close()
+
+
+def test_requests_from_many_clients_are_micro_batched(tmp_path):
+    pipeline = FakeNER()
+    server = _serve(tmp_path, pipeline, max_wait=0.2, max_batch=64)
+    try:
+        clients = [NERClient(server.address, authkey=KEY) for _ in range(4)]
+        results = [None] * len(clients)
+
+        def work(i):
+            results[i] = clients[i]([f"w{i} {NAME}", f"x{i}"])
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(len(clients))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i, res in enumerate(results):
+            assert [len(r) for r in res] == [1, 0]
+            assert res[0][0]["start"] == len(f"w{i} ")
+        assert server.stats["requests"] == 4
+        assert server.stats["batches"] < 4
+    finally:
+        server.close()
+
+
+def test_client_reports_the_pipeline_backend(tmp_path):
+    pipeline = FakeNER()
+    pipeline.backend_name = "onnx-int8"
+    server = _serve(tmp_path, pipeline)
+    try:
+        client = NERClient(server.address, authkey=KEY)
+        # so workers' caches keep int8 and fp32 results apart
+        assert client.backend_name == "onnx-int8"
+        client.close()
+    finally:
+        server.close()
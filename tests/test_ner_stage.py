@@ -0,0 +1,167 @@
+import re
+
+from pdf_contract_masking.ner_stage import NERStage, person_names, normalize_chunk
+
+NAME = "Nguyễn Văn A"
+
+
+class WordTokenizer:
+    model_max_length = 12
+
+    def tokenize(self, text):
+        return text.split()
+
+
+class FakeNER:
+    """Pipeline-like callable tagging every NAME occurrence as PER."""
+
+    def __init__(self, offsets=True):
+        self.tokenizer = WordTokenizer()
+        self.calls = []
+        self.offsets = offsets
+
+    def _tag(self, text):
+        assert len(text.split()) <= self.tokenizer.model_max_length - 2
+        ents = []
+        for m in re.finditer(NAME, text):
+            ent = {"entity_group": "PER", "word": m.group(0), "score": 0.9}
+            if self.offsets:
+                ent.update(start=m.start(), end=m.end())
+            else:
+                ent.update(start=None, end=None)
+            ents.append(ent)
+        return ents
+
+    def __call__(self, texts, batch_size=1):
+        self.calls.append((len(texts), batch_size))
+        return [self._tag(t) for t in texts]
+
+
+def _page(n_filler, names_at):
+    words = []
+    for i in range(n_filler):
+        if i in names_at:
+            words.append(NAME)
+        words.append(f"w{i}")
+    return " ".join(words)
+
+
+def test_long_text_is_chunked_and_entities_restitched():
+    text = _page(60, {3, 25, 41, 59})
+    stage = NERStage(FakeNER(), overlap=4, batch_size=4)
+    assert len(stage.chunk(text)) > 5
+    (entities,) = stage.run([text])
+    expected = [m.start() for m in re.finditer(NAME, text)]
+    # every name found exactly once, even where chunks overlap
+    assert [e["start"] for e in entities] == expected
+    for e in entities:
+        assert text[e["start"]:e["end"]] == NAME
+    assert person_names(entities) == [NAME] * 4
+
+
+def test_chunks_of_all_texts_share_batches():
+    pipeline = FakeNER(offsets=False)
+    stage = NERStage(pipeline, batch_size=16)
+    texts = [_page(30, {5}), "", _page(10, {2}), _page(30, {5})]
+    results = stage.run(texts)
+    assert len(pipeline.calls) == 1 and pipeline.calls[0][1] == 16
+    assert [len(r) for r in results] == [1, 0, 1, 1]
+    assert results[0] == results[3]
+
+
+def test_prefetched_results_are_reused():
+    pipeline = FakeNER()
+    stage = NERStage(pipeline, cache_size=0)
+    texts = [_page(20, {1}), _page(20, {7})]
+    assert stage.prefetch(texts) == 2
+    assert len(pipeline.calls) == 1
+    assert stage(texts[1])[0]["start"] == texts[1].index(NAME)
+    assert len(pipeline.calls) == 1
+    stage.discard_prefetched()
+    stage(texts[0])
+    assert len(pipeline.calls) == 2
+
+
+def test_normalized_chunks_map_back_to_raw_offsets():
+    raw = "  Khách hàng:\n   Nguyễn   Văn A \t"
+    norm, offsets = normalize_chunk(raw)
+    assert norm == "Khách hàng: Nguyễn Văn A"
+    start = norm.index("Nguyễn")
+    assert raw[offsets[start]:offsets[len(norm) - 1] + 1] == "Nguyễn   Văn A"
+
+
+def test_cache_serves_repeated_and_reformatted_pages(tmp_path):
+    cache_path = str(tmp_path / "ner.db")
+    boilerplate = _page(8, {2})
+    pipeline = FakeNER()
+    stage = NERStage(pipeline, cache_path=cache_path)
+    first = stage.run([boilerplate])[0]
+    assert len(pipeline.calls) == 1
+    # same words with other line breaks: same cache entry, offsets in the new text
+    reflowed = boilerplate.replace(" w2 ", "\n\n w2 ")
+    assert stage(reflowed) == first
+    assert len(pipeline.calls) == 1
+    # a new process (fresh stage, empty LRU) reads the SQLite file
+    other = FakeNER()
+    again = NERStage(other, cache_path=cache_path).run([boilerplate])[0]
+    assert other.calls == []
+    assert [(e["start"], e["end"], e["word"]) for e in again] == [(e["start"], e["end"], e["word"]) for e in first]
+
+
+def test_backends_of_one_model_do_not_share_cache_entries(tmp_path):
+    cache_path = str(tmp_path / "ner.db")
+    text = _page(8, {2})
+    fp32, int8 = FakeNER(), FakeNER()
+    fp32.backend_name, int8.backend_name = "onnx", "onnx-int8"
+    NERStage(fp32, cache_path=cache_path).run([text])
+    NERStage(int8, cache_path=cache_path).run([text])
+    assert len(fp32.calls) == len(int8.calls) == 1
+
+
+def test_disk_cache_is_off_in_the_shipped_config():
+    from pdf_contract_masking.config import RedactionConfig
+    # it would keep customer names in plain text
+    assert RedactionConfig().get_ner_settings()["cache_path"] is None
+
+def test_learner_runs_ner_only_near_customer_keywords(tmp_path):
+    import fitz
+    from tests.pdf_helpers import make_sample_pdf
+    from pdf_contract_masking.rule_learner import RuleLearner
+
+    path = make_sample_pdf(str(tmp_path / "kw.pdf"), "123456789", "0912345678")
+    doc = fitz.open(path)
+    page = doc.new_page()
+    page.insert_text((72, 72), "General terms and conditions apply to this agreement.")
+    pipeline = FakeNER()
+    seen = []
+    tag = pipeline._tag
+    pipeline._tag = lambda text: seen.append(text) or tag(text)
+    learner = RuleLearner()
+    names = learner._person_names_by_page(doc, NERStage(pipeline))
+    assert names == [[NAME], []]
+    # only the keyword page reached the model, and not as the whole page
+    sent = "\n".join(seen)
+    assert "khách hàng" in sent and "General terms" not in sent
+    assert "Số điện thoại" not in sent
+    doc.close()
+
+
+def test_learn_and_apply_share_one_ner_pass(tmp_path, monkeypatch):
+    from tests.pdf_helpers import make_sample_pdf
+    from pdf_contract_masking.config import RedactionConfig
+    from pdf_contract_masking.knowledge_base import KnowledgeBase
+    from pdf_contract_masking.processor import PDFProcessor
+
+    monkeypatch.setenv("REQUIRE_NEAR_PERSON", "1")
+    monkeypatch.delenv("RULES_ONLY", raising=False)
+    src = make_sample_pdf(str(tmp_path / "in.pdf"), "123456789", "0912345678")
+    pipeline = FakeNER()
+    pipeline.tokenizer.model_max_length = 512
+    seen = []
+    tag = pipeline._tag
+    pipeline._tag = lambda text: seen.append(text) or tag(text)
+    kb = KnowledgeBase(str(tmp_path / "kb.json"))
+    proc = PDFProcessor(RedactionConfig(), kb, nlp_pipeline=NERStage(pipeline, cache_size=0))
+    assert proc.process_pdf_final(src, str(tmp_path / "out.pdf")) > 0
+    # first-seen template: one NER pass over the page serves learning and redaction
+    assert len(seen) == 1 and NAME in seen[0]
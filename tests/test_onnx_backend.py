@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from pdf_contract_masking.onnx_backend import build_onnx_pipeline
+
+
+def _tiny_model(tmp_path):
+    """Randomly initialised 1-layer BERT tagger with a character-level vocab."""
+    chars = list("abcdefghijklmnopqrstuvwxyz0123456789")
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + chars + ["##" + c for c in chars]
+    vocab_file = tmp_path / "vocab.txt"
+    vocab_file.write_text("\n".join(vocab), encoding="utf-8")
+    tokenizer = transformers.BertTokenizerFast(vocab_file=str(vocab_file), model_max_length=64)
+    config = transformers.BertConfig(
+        vocab_size=len(vocab), hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+        intermediate_size=32, max_position_embeddings=64,
+        id2label={0: "O", 1: "B-PER", 2: "I-PER"}, label2id={"O": 0, "B-PER": 1, "I-PER": 2},
+    )
+    torch.manual_seed(0)
+    return transformers.BertForTokenClassification(config).eval(), tokenizer
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_onnx_pipeline_matches_torch_output_shape(tmp_path, quantize):
+    model, tokenizer = _tiny_model(tmp_path)
+    reference = transformers.pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+    nlp = build_onnx_pipeline("tiny", model, tokenizer, quantize=quantize, onnx_dir=str(tmp_path / "onnx"))
+    assert nlp.backend_name == ("onnx-int8" if quantize else "onnx")
+    texts = ["nguyen van a ky hop dong", "khach hang tran thi b so 0912345678"]
+    got, want = nlp(texts, batch_size=2), reference(texts, batch_size=2)
+    assert len(got) == len(want)
+    for ents in got:
+        for ent in ents:
+            assert {"entity_group", "word", "start", "end", "score"} <= set(ent)
+    if not quantize:
+        key = lambda results: [[(e["entity_group"], e["start"], e["end"]) for e in r] for r in results]
+        assert key(got) == key(want)
+
+
+def test_onnx_pipeline_drops_the_torch_model(tmp_path):
+    import gc
+    import weakref
+    model, tokenizer = _tiny_model(tmp_path)
+    ref = weakref.ref(model)
+    nlp = build_onnx_pipeline("tiny", model, tokenizer, onnx_dir=str(tmp_path / "onnx"))
+    del model
+    gc.collect()
+    assert ref() is None
+    assert nlp(["nguyen van a"]) is not None
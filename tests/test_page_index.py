@@ -0,0 +1,174 @@
+import random
+
+import fitz
+import pytest
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.page_index import BoxGrid, PageTextIndex, PageIndexCache, TextGeometry
+from pdf_contract_masking.redactor import Redactor
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+class CountingPage:
+    def __init__(self, number=0):
+        self.number = number
+        self.calls = []
+
+    def get_text(self, option="text"):
+        self.calls.append(option)
+        if option == "rawdict":
+            raise AssertionError("unsupported option")
+        return f"{option}-{len(self.calls)}"
+
+
+def test_views_are_extracted_once_until_released():
+    page = CountingPage()
+    index = PageTextIndex(page)
+    assert index.text == index.text
+    assert index.words == index.words
+    assert page.calls == ["text", "words"]
+
+    index.release()
+    assert index.text == "text-3"
+    assert page.calls == ["text", "words", "text"]
+
+
+def test_extraction_errors_are_cached_and_reraised():
+    page = CountingPage()
+    index = PageTextIndex(page)
+    for _ in range(3):
+        with pytest.raises(AssertionError):
+            index.chars
+    assert page.calls == ["rawdict"]
+
+
+def test_cache_shares_index_per_page_and_releases():
+    cache = PageIndexCache()
+    p0, p1 = CountingPage(0), CountingPage(1)
+    assert cache.get(p0) is cache.get(p0)
+    cache.get(p1).text
+    assert len(cache) == 2
+
+    cache.release(1)
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_box_grid_matches_brute_force_intersects():
+    rnd = random.Random(7)
+    boxes = []
+    for i in range(500):
+        x0, y0 = rnd.uniform(0, 600), rnd.uniform(0, 800)
+        boxes.append((x0, y0, x0 + rnd.uniform(0, 40), y0 + rnd.uniform(0, 14), str(i)))
+    grid = BoxGrid(boxes, cell_size=20)
+    for _ in range(200):
+        x0, y0 = rnd.uniform(-20, 600), rnd.uniform(-20, 800)
+        area = fitz.Rect(x0, y0, x0 + rnd.uniform(0, 120), y0 + rnd.uniform(0, 30))
+        expected = [i for i, b in enumerate(boxes) if fitz.Rect(b[:4]).intersects(area)]
+        assert grid.query(area) == expected
+
+
+def test_digit_chars_in_area():
+    class CharsPage(CountingPage):
+        def get_text(self, option="text"):
+            self.calls.append(option)
+            if option == "text":
+                return "SĐT: 0912\n"
+            chars = [{"c": ch, "bbox": (10 + 6 * i, 10, 16 + 6 * i, 20)} for i, ch in enumerate("SĐT: 0912")]
+            return {"blocks": [{"type": 0, "lines": [{"spans": [{"chars": chars}]}]}]}
+
+    page = CharsPage()
+    index = PageTextIndex(page)
+    found = index.digit_chars_in(fitz.Rect(30, 12, 100, 18))
+    assert [ch for _, ch in found] == ["0", "9", "1", "2"]
+    assert found[0][0] == fitz.Rect(40, 10, 46, 20)
+    index.digit_chars_in(fitz.Rect(0, 0, 50, 50))
+    assert sorted(page.calls) == ["rawdict", "text"]
+
+
+def test_geometry_matches_search_for(tmp_path):
+    path = make_sample_pdf(str(tmp_path / 'sample.pdf'), '012345678', '0912345678')
+    doc = fitz.open(path)
+    page = doc[0]
+    geometry = PageTextIndex(page).geometry
+    assert geometry is not None and geometry.text == page.get_text("text")
+    # MuPDF's own hits for a trailing newline vary from run to run, so that
+    # token is checked against the number it ends with.
+    for token in ("012345678", "0912345678", "Số", "khách hàng", "0912345678\n"):
+        got, want = geometry.find_rects(token), page.search_for(token.rstrip("\n"))
+        assert len(got) == len(want) > 0
+        for a, b in zip(got, want):
+            assert all(abs(x - y) < 0.5 for x, y in zip(a, b))
+    doc.close()
+
+
+def test_geometry_finds_numbers_split_across_lines():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 100), "SĐT: 0912-345")
+    page.insert_text((72, 120), "678 (di động)")
+    geometry = PageTextIndex(page).geometry
+    assert page.search_for("0912345678") == []
+    rects = geometry.find_digit_rects("0912345678")
+    assert len(rects) == 2
+    assert rects[0].y1 < rects[1].y1
+    assert rects[0] == page.search_for("0912-345")[0]
+    doc.close()
+
+
+def test_digit_chars_come_from_rawdict(tmp_path):
+    doc = fitz.open(make_sample_pdf(str(tmp_path / 'sample.pdf'), '012345678', '0912345678'))
+    page = doc[0]
+    index = PageTextIndex(page)
+    (area,) = page.search_for("0912345678")
+    chars = index.digit_chars_in(area)
+    assert "".join(ch for _, ch in chars) == "0912345678"
+    assert all(a.x1 <= b.x0 + 0.01 for (a, _), (b, _) in zip(chars, chars[1:]))
+    assert all(r.intersects(area) for r, _ in chars)
+    doc.close()
+
+
+def test_redactor_locates_matches_from_their_offsets(tmp_path, monkeypatch):
+    doc = fitz.open(make_sample_pdf(str(tmp_path / 'sample.pdf'), '012345678', '0912345678'))
+    page = doc[0]
+    redactor = Redactor(RedactionConfig())
+
+    def no_page_search(self, needle):
+        raise AssertionError("a match was searched for over the whole page")
+
+    monkeypatch.setattr(TextGeometry, "find_rects", no_page_search)
+    overlays = []
+    assert redactor._page_wide_redact(0, page, redactor._phone_re, overlays) == 2
+    doc.close()
+
+
+def test_text_in_matches_clipped_text(tmp_path):
+    doc = fitz.open(make_sample_pdf(str(tmp_path / 'sample.pdf'), '012345678', '0912345678'))
+    page = doc[0]
+    index = PageTextIndex(page)
+    (label,) = page.search_for("Số điện thoại:")
+    clip = fitz.Rect(label.x0 - 2, label.y0, label.x1 + 200, label.y1)
+    assert index.text_in(clip).split() == page.get_text(clip=clip).split()
+    doc.close()
+
+
+def test_learning_and_redaction_reuse_the_page_extraction(tmp_path, monkeypatch):
+    from pdf_contract_masking.page_index import PageIndexCache as Cache
+    from pdf_contract_masking.rule_learner import RuleLearner
+    doc = fitz.open(make_sample_pdf(str(tmp_path / 'sample.pdf'), '012345678', '0912345678'))
+    clipped = []
+    original = fitz.Page.get_text
+
+    def counting(page, *args, **kwargs):
+        if kwargs.get("clip") is not None:
+            clipped.append(kwargs["clip"])
+        return original(page, *args, **kwargs)
+
+    monkeypatch.setattr(fitz.Page, "get_text", counting)
+    cache = Cache()
+    rules = RuleLearner().learn(doc, page_cache=cache)
+    assert Redactor(RedactionConfig()).apply_rules(doc, rules, page_cache=cache) == 2
+    assert clipped == []
+    doc.close()
@@ -0,0 +1,71 @@
+import io
+import os
+import threading
+
+import fitz
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking.processor import PDFProcessor
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+def _processor(tmp_path, monkeypatch):
+    monkeypatch.setenv("RULES_ONLY", "1")
+    return PDFProcessor(RedactionConfig(), KnowledgeBase(str(tmp_path / "kb.json")))
+
+
+def test_process_bytes_round_trip(tmp_path, monkeypatch):
+    src = make_sample_pdf(str(tmp_path / "in.pdf"), "012345678", "0912345678")
+    with open(src, "rb") as f:
+        data = f.read()
+    proc = _processor(tmp_path, monkeypatch)
+    out, report = proc.process_bytes(memoryview(data))
+
+    assert report["redactions"] > 0 and report["pages"] == 1
+    assert report["input_bytes"] == len(data) and report["output_bytes"] == len(out)
+    with fitz.open(stream=out, filetype="pdf") as doc:
+        text = doc[0].get_text()
+    assert "0912345678" not in text and "012345678" not in text
+    # the same bytes again now hit the template learned on the first pass
+    assert proc.process_bytes(data)[1]["template"] == report["fingerprint"]
+
+
+def test_process_stream_writes_to_file_object(tmp_path, monkeypatch):
+    src = make_sample_pdf(str(tmp_path / "in.pdf"), "012345678", "0912345678")
+    sink = io.BytesIO()
+    with open(src, "rb") as f:
+        report = _processor(tmp_path, monkeypatch).process_stream(f, sink)
+    assert report["output_bytes"] == len(sink.getvalue()) > 0
+    with fitz.open(stream=sink.getvalue(), filetype="pdf") as doc:
+        assert "0912345678" not in doc[0].get_text()
+
+
+def test_process_bytes_reports_only_its_own_verification(tmp_path, monkeypatch):
+    src = make_sample_pdf(str(tmp_path / "in.pdf"), "012345678", "0912345678")
+    with open(src, "rb") as f:
+        data = f.read()
+    proc = _processor(tmp_path, monkeypatch)
+    proc.last_verification = [{"page": 7, "action": "rasterized"}]
+
+    def broken(doc):
+        raise RuntimeError("verifier failed")
+
+    monkeypatch.setattr(proc, "_verify_and_scrub", broken)
+    report = proc.process_bytes(data)[1]
+    assert report["verification"] == [] and proc.last_verification == []
+
+
+def test_process_stream_writes_to_a_pipe(tmp_path, monkeypatch):
+    src = make_sample_pdf(str(tmp_path / "in.pdf"), "012345678", "0912345678")
+    read_fd, write_fd = os.pipe()
+    received = []
+    reader = threading.Thread(target=lambda: received.append(os.fdopen(read_fd, "rb").read()))
+    reader.start()
+    with open(src, "rb") as f, os.fdopen(write_fd, "wb") as sink:
+        report = _processor(tmp_path, monkeypatch).process_stream(f, sink)
+    reader.join(timeout=30)
+    assert report["output_bytes"] == len(received[0]) > 0
+    with fitz.open(stream=received[0], filetype="pdf") as doc:
+        assert "0912345678" not in doc[0].get_text()
@@ -0,0 +1,41 @@
+from pdf_contract_masking.constants import ID_REGEX, PHONE_REGEX
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking.rule_plan import RulePlan
+
+
+RULES = [
+    {"page": 0, "anchor": "Số CMND: <ID>", "pattern": ID_REGEX.pattern},
+    {"page": 1, "anchor": "Số điện thoại", "pattern": PHONE_REGEX.pattern},
+    {"page": 0, "anchor": "Tên khách hàng", "pattern": PHONE_REGEX.pattern},
+]
+
+
+def test_rule_plan_precomputes_rule_setup():
+    plan = RulePlan(RULES)
+    assert len(plan) == 3
+    assert list(plan.by_page) == [0, 1]
+    assert [r.anchor for r in plan.by_page[0]] == ["Số CMND: <ID>", "Tên khách hàng"]
+
+    sanitized, phone, plain = plan.rules
+    assert sanitized.sanitized and sanitized.label_text == "Số CMND:"
+    assert sanitized.pattern.search("CMND 012345678")
+    assert phone.phone_anchor and not phone.sanitized
+    assert not plain.phone_anchor
+
+
+def test_kb_plan_cache_is_lru_and_tracks_rule_changes(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / 'kb.json'), plan_cache_size=2)
+    for fp in ("a", "b", "c"):
+        kb.add_rules(fp, list(RULES))
+    assert kb.get_plan("missing") is None
+
+    plan_a = kb.get_plan("a")
+    assert kb.get_plan("a") is plan_a
+    kb.get_plan("b")
+    kb.get_plan("c")  # evicts "a"
+    assert kb.get_plan("a") is not plan_a
+
+    plan_b = kb.get_plan("b")
+    kb.add_rules("b", RULES[:1])
+    assert kb.get_plan("b") is not plan_b
+    assert len(kb.get_plan("b")) == 1
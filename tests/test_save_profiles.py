@@ -0,0 +1,31 @@
+import json
+
+import fitz
+import pytest
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking.processor import PDFProcessor
+from tests.pdf_helpers import make_sample_pdf
+
+
+def test_save_profiles_from_config(tmp_path):
+    path = tmp_path / "cfg.json"
+    path.write_text(json.dumps({"save": {"profile": "fast", "profiles": {"tiny": {"garbage": 4, "deflate": True}}}}))
+    cfg = RedactionConfig(str(path))
+    assert cfg.get_save_options() == ("fast", {"garbage": 1, "deflate": True})
+    assert cfg.get_save_options("tiny") == ("tiny", {"garbage": 4, "deflate": True})
+    assert cfg.get_save_options("nope")[0] == "archive"
+
+
+@pytest.mark.parametrize("profile", ["archive", "fast", "linearized"])
+def test_processor_saves_with_profile(tmp_path, monkeypatch, profile):
+    monkeypatch.setenv("RULES_ONLY", "1")
+    src = str(tmp_path / "in.pdf")
+    out = str(tmp_path / "out.pdf")
+    make_sample_pdf(src, cmnd="012345678", phone="0912345678")
+    proc = PDFProcessor(RedactionConfig(), KnowledgeBase(str(tmp_path / "kb.json")), save_profile=profile)
+    assert proc.save_profile == profile
+    proc.process_pdf_final(src, out)
+    with fitz.open(out) as doc:
+        assert "0912345678" not in doc[0].get_text()
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import fitz
+import pytest
+
+from pdf_contract_masking import service as service_module
+from pdf_contract_masking.service import RedactionService, make_server
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+@pytest.fixture
+def server(tmp_path):
+    service = RedactionService(str(tmp_path / "kb.json"), os.path.abspath("redaction_config.json"),
+                               workers=1, queue_size=0, rules_only=True)
+    service.start()
+    httpd = make_server(service, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield service, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+
+def _post(url, data):
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/pdf"})
+    return urllib.request.urlopen(request, timeout=60)
+
+
+def test_redact_and_health(server, tmp_path):
+    service, base = server
+    src = make_sample_pdf(str(tmp_path / "in.pdf"), "012345678", "0912345678")
+    with open(src, "rb") as f:
+        data = f.read()
+    with _post(base + "/redact", data) as response:
+        report = json.loads(response.headers["X-Redaction-Report"])
+        pdf = response.read()
+    assert report["redactions"] > 0
+    with fitz.open(stream=pdf, filetype="pdf") as doc:
+        assert "0912345678" not in doc[0].get_text()
+    # the learned template was merged into the service's KB
+    assert report["fingerprint"] in service.kb.data
+
+    with _post(base + "/redact?format=json", data) as response:
+        body = json.loads(response.read())
+    assert body["report"]["template"] == report["fingerprint"] and body["pdf"]
+
+    with urllib.request.urlopen(base + "/health", timeout=10) as response:
+        health = json.loads(response.read())
+    assert health["status"] == "ok" and health["processed"] == 2 and health["in_flight"] == 0
+
+
+def test_full_service_answers_503(server, tmp_path):
+    service, base = server
+    src = make_sample_pdf(str(tmp_path / "in.pdf"), "012345678", "0912345678")
+    with open(src, "rb") as f:
+        data = f.read()
+    # occupy the only slot (one worker, no queue)
+    assert service._slots.acquire(blocking=False)
+    try:
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            _post(base + "/redact", data)
+        assert excinfo.value.code == 503 and excinfo.value.headers["Retry-After"]
+    finally:
+        service._slots.release()
+    assert service.health()["rejected"] == 1
+
+
+def test_learned_rules_are_saved_in_batches(tmp_path):
+    kb_path = str(tmp_path / "kb.json")
+    service = RedactionService(kb_path, os.path.abspath("redaction_config.json"), workers=1, queue_size=0,
+                               rules_only=True, save_interval=0)
+    service.start()
+    try:
+        src = make_sample_pdf(str(tmp_path / "in.pdf"), "012345678", "0912345678")
+        with open(src, "rb") as f:
+            report = service.redact(f.read())[1]
+        # merged at once, written to disk only by save_kb()/close()
+        assert report["fingerprint"] in service.kb.data
+        assert not os.path.exists(kb_path)
+        service.save_kb()
+        with open(kb_path, encoding="utf-8") as f:
+            assert report["fingerprint"] in json.load(f)
+    finally:
+        service.close()
+
+
+def test_pool_restarts_once_per_generation(server):
+    service, _ = server
+    first = service._pool
+    service._restart_pool(0)
+    second = service._pool
+    # a second request that saw the same broken pool leaves the new one alone
+    service._restart_pool(0)
+    assert second is not first and service._pool is second and service._generation == 1
+
+
+def test_health_without_rss(server, monkeypatch):
+    _, base = server
+    monkeypatch.setattr(service_module, "current_rss_mb", lambda: None)
+    with urllib.request.urlopen(base + "/health", timeout=10) as response:
+        health = json.loads(response.read())
+    assert health["status"] == "ok" and "rss_mb" not in health
@@ -0,0 +1,77 @@
+import os
+import tempfile
+from concurrent.futures import Future
+
+import fitz
+
+from pdf_contract_masking.batch import _finish_shard, run_batch
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking import processor as processor_module
+from pdf_contract_masking.processor import PDFProcessor
+from pdf_contract_masking.sharding import ShardedJob, plan_shards
+
+from tests.pdf_helpers import make_long_pdf, make_sample_pdf
+
+
+def test_plan_shards():
+    assert plan_shards(10, 3) == [(0, 3), (3, 7), (7, 10)]
+    assert plan_shards(10, 8, min_pages=4) == [(0, 5), (5, 10)]
+    assert plan_shards(3, 4, min_pages=4) == [(0, 3)]
+
+
+def test_run_batch_shards_large_documents(tmp_path, monkeypatch):
+    monkeypatch.setenv("RULES_ONLY", "1")
+    big = make_long_pdf(str(tmp_path / "big.pdf"))
+    small = make_sample_pdf(str(tmp_path / "small.pdf"), "012345678", "0912345678")
+    jobs = [(big, str(tmp_path / "out" / "big.pdf")), (small, str(tmp_path / "out" / "small.pdf"))]
+
+    kb = KnowledgeBase(str(tmp_path / "kb.json"))
+    report = run_batch(jobs, kb, workers=2, config_path=os.path.abspath("redaction_config.json"),
+                       rules_only=True, shard_pages=3)
+    assert report["files"] == 2 and report["failed"] == 0 and report["sharded"] == 1
+    # the shards' learned rules end up in the KB under the document's fingerprint
+    assert report["learned"] == len(kb.data) == 2
+
+    reference = str(tmp_path / "reference.pdf")
+    proc = PDFProcessor(RedactionConfig(), KnowledgeBase(str(tmp_path / "kb_ref.json")))
+    assert proc.process_pdf_final(big, reference) > 0
+    with fitz.open(jobs[0][1]) as sharded, fitz.open(reference) as whole:
+        assert len(sharded) == 12
+        assert sharded.metadata["title"] == "Loan package"
+        assert [p.get_text() for p in sharded] == [p.get_text() for p in whole]
+
+
+class _Progress:
+    def update(self, n):
+        pass
+
+
+def test_failed_shard_cleans_up_after_its_siblings(tmp_path):
+    job = ShardedJob(None, "in.pdf", str(tmp_path / "out.pdf"), 2)
+    job.ranges = [(0, 3), (3, 6)]
+    job._tmpdir = tempfile.mkdtemp(dir=str(tmp_path))
+    failed, done = Future(), Future()
+    failed.set_exception(RuntimeError("worker died"))
+    done.set_result(((1, [], []), 0.5))
+    report = {"failed": 0, "redactions": 0, "busy_seconds": 0.0}
+
+    _finish_shard(failed, job, 0, report, _Progress())
+    tmpdir = job._tmpdir
+    assert os.path.isdir(tmpdir)  # the other shard still writes its part there
+    _finish_shard(done, job, 1, report, _Progress())
+    assert report["failed"] == 1 and not os.path.exists(tmpdir)
+
+
+def test_process_shard_where_rss_cant_be_measured(tmp_path, monkeypatch):
+    # e.g. Windows without psutil: shards must not depend on /proc
+    monkeypatch.setenv("RULES_ONLY", "1")
+    monkeypatch.setenv("MEMORY_LIMIT_MB", "1")
+    monkeypatch.setattr(processor_module, "current_rss_mb", lambda: None)
+    src = make_long_pdf(str(tmp_path / "big.pdf"), pages=4)
+    part = str(tmp_path / "part.pdf")
+    proc = PDFProcessor(RedactionConfig(), KnowledgeBase(str(tmp_path / "kb.json")))
+    redactions, learned, report = proc.process_shard(src, part, 1, 3)
+    assert redactions > 0 and learned and [entry["page"] for entry in report] == [1, 2]
+    with fitz.open(part) as doc:
+        assert len(doc) == 2 and "0912345601" not in doc[0].get_text()
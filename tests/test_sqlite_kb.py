@@ -0,0 +1,77 @@
+import os
+
+from pdf_contract_masking.batch import run_batch
+from pdf_contract_masking.knowledge_base import KnowledgeBase, open_knowledge_base
+from pdf_contract_masking.sqlite_kb import SQLiteKnowledgeBase
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+RULES = [{"page": 0, "anchor": "Số CMND: <ID>", "pattern": r"\d{9}"}]
+
+
+def test_sqlite_kb_keeps_data_api_and_persists(tmp_path):
+    path = str(tmp_path / 'kb.db')
+    kb = open_knowledge_base(path)
+    assert isinstance(kb, SQLiteKnowledgeBase)
+    assert kb._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert not kb.data and "fp1" not in kb.data
+
+    kb.add_rules("fp1", RULES)
+    assert "fp1" in kb.data and len(kb.data) == 1
+    assert kb.get_plan("fp1") is kb.get_plan("fp1")
+    assert kb.take_updates() == {"fp1": RULES}
+    kb.record_alias("struct:x", "fp1")
+    kb.record_alias("struct:x", "fp1")
+    kb.save()
+
+    other = SQLiteKnowledgeBase(path)
+    assert other.data["fp1"] == RULES
+    assert other.aliases["struct:x"] == {"fingerprint": "fp1", "hits": 2}
+    # a second writer: existing fingerprints win, new ones are visible to the first
+    assert other.merge({"fp1": [], "fp2": RULES}) == 1
+    assert other.take_updates() == {"fp2": RULES}
+    assert kb.data["fp1"] == RULES and "fp2" in kb.data
+    assert sorted(kb.data) == ["fp1", "fp2"]
+
+
+def test_import_json_kb(tmp_path):
+    source = KnowledgeBase(str(tmp_path / 'kb.json'))
+    source.add_rules("fp1", RULES)
+    source.add_signature("fp1", 0xABC)
+    source.save()
+
+    target = SQLiteKnowledgeBase(str(tmp_path / 'kb.db'))
+    assert target.import_json(KnowledgeBase(source.path)) == 1
+    assert target.data["fp1"] == RULES
+    assert target.find_similar(0xABC, 0.9) == ("fp1", 1.0)
+
+
+def test_batch_workers_share_sqlite_kb(tmp_path):
+    jobs = []
+    for i, (cmnd, phone) in enumerate([('012345678', '0912345678'), ('123456789012', '84912345678')]):
+        src = make_sample_pdf(str(tmp_path / 'contract' / f'sample{i}.pdf'), cmnd, phone)
+        jobs.append((src, str(tmp_path / 'out' / f'che_sample{i}.pdf')))
+
+    kb = open_knowledge_base(str(tmp_path / 'kb.db'))
+    report = run_batch(jobs, kb, workers=2, config_path=os.path.abspath('redaction_config.json'), rules_only=True)
+    assert report['failed'] == 0
+    assert len(kb.data) == report['learned'] == 2
+
+
+def test_sqlite_kb_existing_rules_win_and_index_sees_other_writers(tmp_path):
+    path = str(tmp_path / 'kb.db')
+    kb = SQLiteKnowledgeBase(path)
+    worker = SQLiteKnowledgeBase(path)
+    kb.add_rules("fp1", RULES)
+    kb.add_signature("fp1", 0xABC)
+    assert kb.find_similar(0xABC, 0.9) == ("fp1", 1.0)
+
+    # a worker that learned the same template later doesn't overwrite it
+    worker.add_rules("fp1", [])
+    assert worker.data["fp1"] == RULES and SQLiteKnowledgeBase(path).data["fp1"] == RULES
+
+    # signatures stored by another process reach the already-built index
+    worker.add_rules("fp2", RULES)
+    worker.add_signature("fp2", 0xF0F0F0F0F0F0F0F0)
+    assert kb.find_similar(0xF0F0F0F0F0F0F0F0, 0.9) == ("fp2", 1.0)
@@ -0,0 +1,67 @@
+import builtins
+import os
+import sys
+
+import fitz
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking import processor as processor_module
+from pdf_contract_masking.processor import PDFProcessor
+from pdf_contract_masking.utils import current_rss_mb
+
+from tests.pdf_helpers import make_long_pdf
+
+
+def _run(tmp_path, monkeypatch, streaming, name):
+    monkeypatch.setenv("RULES_ONLY", "1")
+    monkeypatch.setenv("STREAMING", streaming)
+    src = make_long_pdf(str(tmp_path / "in.pdf"))
+    out = str(tmp_path / name)
+    proc = PDFProcessor(RedactionConfig(), KnowledgeBase(str(tmp_path / f"kb_{name}.json")))
+    redactions = proc.process_pdf_final(src, out)
+    return proc, redactions, out
+
+
+def test_streaming_matches_whole_document(tmp_path, monkeypatch):
+    _, whole, whole_out = _run(tmp_path, monkeypatch, "0", "whole.pdf")
+    proc, streamed, streamed_out = _run(tmp_path, monkeypatch, "1", "streamed.pdf")
+    assert streamed == whole > 0
+    assert len(proc.last_verification) == 12
+    with fitz.open(whole_out) as a, fitz.open(streamed_out) as b:
+        assert [p.get_text() for p in a] == [p.get_text() for p in b]
+        assert "0912345600" not in b[0].get_text()
+
+
+def test_memory_ceiling_aborts_without_output(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_LIMIT_MB", "1")
+    _, redactions, out = _run(tmp_path, monkeypatch, "1", "out.pdf")
+    assert redactions == 0
+    assert not os.path.exists(out)
+
+
+def _without_rss(monkeypatch):
+    """No /proc, psutil or resource, as on Windows."""
+    real_open = builtins.open
+
+    def open_without_proc(path, *args, **kwargs):
+        if str(path).startswith("/proc/"):
+            raise FileNotFoundError(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", open_without_proc)
+    monkeypatch.setitem(sys.modules, "psutil", None)
+    monkeypatch.setitem(sys.modules, "resource", None)
+
+
+def test_rss_is_none_where_it_cant_be_measured(monkeypatch):
+    _without_rss(monkeypatch)
+    assert current_rss_mb() is None
+
+
+def test_streaming_without_rss_writes_output(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_LIMIT_MB", "1")
+    monkeypatch.setattr(processor_module, "current_rss_mb", lambda: None)
+    proc, redactions, out = _run(tmp_path, monkeypatch, "1", "out.pdf")
+    assert redactions > 0 and os.path.exists(out)
+    assert len(proc.last_verification) == 12
@@ -0,0 +1,92 @@
+import json
+import os
+import random
+
+import fitz
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.knowledge_base import KnowledgeBase
+from pdf_contract_masking.processor import PDFProcessor
+from pdf_contract_masking.template_index import SimHashIndex, simhash, similarity
+
+from tests.pdf_helpers import make_sample_pdf
+
+
+def test_simhash_index_matches_brute_force():
+    rnd = random.Random(11)
+    index = SimHashIndex(max_distance=6)
+    signatures = {}
+    for i in range(300):
+        signatures[f"t{i}"] = rnd.getrandbits(64)
+        index.add(f"t{i}", signatures[f"t{i}"])
+    for _ in range(200):
+        base = rnd.choice(list(signatures.values()))
+        probe = base ^ sum(1 << b for b in rnd.sample(range(64), rnd.randint(0, 9)))
+        expected = min(((k, (s ^ probe).bit_count()) for k, s in signatures.items()), key=lambda kv: (kv[1], kv[0]))
+        found = index.nearest(probe)
+        if expected[1] > 6:
+            assert found is None
+        else:
+            assert found == (expected[0], 1.0 - expected[1] / 64)
+
+
+def test_simhash_tracks_feature_overlap():
+    a = [f"w{i}" for i in range(50)]
+    assert simhash(a) == simhash(list(reversed(a)))
+    assert similarity(simhash(a), simhash(a[:-1] + ["other"])) > similarity(simhash(a), simhash([f"x{i}" for i in range(50)]))
+
+
+def test_near_duplicate_document_reuses_template_rules(tmp_path, monkeypatch):
+    with open('redaction_config.json', encoding='utf-8') as f:
+        cfg = json.load(f)
+    cfg['templates'] = {'fingerprint': 'text', 'near_duplicate_threshold': 0.9}
+    cfg_path = tmp_path / 'config.json'
+    cfg_path.write_text(json.dumps(cfg), encoding='utf-8')
+
+    kb = KnowledgeBase(str(tmp_path / 'kb.json'))
+    proc = PDFProcessor(RedactionConfig(str(cfg_path)), kb)
+    first = make_sample_pdf(str(tmp_path / 'in' / 'a.pdf'), '012345678', '0912345678')
+    second = make_sample_pdf(str(tmp_path / 'in' / 'b.pdf'), '123456789', '0987654321')
+    assert proc.process_pdf_final(first, str(tmp_path / 'out' / 'a.pdf')) > 0
+    (template,) = kb.data
+    assert template in kb.signatures
+
+    def no_learning(*args, **kwargs):
+        raise AssertionError("near-duplicate should not be learned")
+    monkeypatch.setattr(proc.learner, "learn", no_learning)
+    assert proc.process_pdf_final(second, str(tmp_path / 'out' / 'b.pdf')) > 0
+    assert list(kb.data) == [template]
+
+    fingerprint = KnowledgeBase.create_fingerprint(fitz.open(second))
+    assert kb.aliases[fingerprint]["fingerprint"] == template
+    kb.save()
+    reloaded = KnowledgeBase(str(tmp_path / 'kb.json'))
+    assert reloaded.lookup(fitz.open(second)) == template
+    assert os.path.exists(reloaded.signature_path)
+
+
+def test_prefetch_skips_near_duplicates(tmp_path, monkeypatch):
+    monkeypatch.delenv("RULES_ONLY", raising=False)
+    with open('redaction_config.json', encoding='utf-8') as f:
+        cfg = json.load(f)
+    cfg['templates'] = {'fingerprint': 'text', 'near_duplicate_threshold': 0.9}
+    cfg['ner'] = {'cache_path': None, 'cache_size': 0}
+    cfg_path = tmp_path / 'config.json'
+    cfg_path.write_text(json.dumps(cfg), encoding='utf-8')
+
+    calls = []
+
+    def pipeline(texts, **kwargs):
+        calls.append(list(texts))
+        return [[] for _ in texts]
+
+    kb = KnowledgeBase(str(tmp_path / 'kb.json'))
+    proc = PDFProcessor(RedactionConfig(str(cfg_path)), kb, nlp_pipeline=pipeline)
+    first = make_sample_pdf(str(tmp_path / 'in' / 'a.pdf'), '012345678', '0912345678')
+    second = make_sample_pdf(str(tmp_path / 'in' / 'b.pdf'), '123456789', '0987654321')
+    assert proc.prefetch_ner([first]) == 1
+    proc.process_pdf_final(first, str(tmp_path / 'out' / 'a.pdf'))
+    proc.nlp.discard_prefetched()
+    # b.pdf only matches a.pdf's template as a near-duplicate: no NER pass, no alias recorded yet
+    assert proc.prefetch_ner([second]) == 0
+    assert not kb.aliases
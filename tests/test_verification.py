@@ -0,0 +1,64 @@
+import fitz
+
+from pdf_contract_masking.config import RedactionConfig
+from pdf_contract_masking.redactor import Redactor
+from pdf_contract_masking.verification import RedactionVerifier
+
+
+def _verifier():
+    redactor = Redactor(RedactionConfig())
+    return RedactionVerifier([("id", redactor._id_re), ("phone", redactor._phone_re)])
+
+
+def _doc(*pages):
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for i, line in enumerate(lines):
+            page.insert_text((72, 72 + 20 * i), line)
+    return doc
+
+
+def test_only_real_numbers_count_as_leftovers():
+    doc = _doc(
+        # unrelated numbers whose digits only form an ID when concatenated
+        ["Ngay 15/10/2024, hop dong so 12", "Trang 3 / 45"],
+        ["CMND: 012345678", "SDT: 0912 345 678", "Ma: 1230912345678"],
+    )
+    results = _verifier().verify(doc)
+    assert results[0] == {"page": 0, "leftovers": []}
+    found = {(x["kind"], x["text"]) for x in results[1]["leftovers"]}
+    assert found == {("id", "012345678"), ("phone", "0912 345 678")}
+    for item in results[1]["leftovers"]:
+        assert item["rects"] and all(r.intersects(doc[1].rect) for r in item["rects"])
+    doc.close()
+
+
+def test_number_after_a_longer_one_is_still_found():
+    doc = _doc(["Ref 123456789012 - 84912345678 | end"])
+    texts = {x["text"] for x in _verifier().page_leftovers(doc[0])}
+    assert texts == {"123456789012", "84912345678"}
+    doc.close()
+
+
+def test_amounts_dates_and_codes_are_not_leftovers():
+    doc = _doc([
+        "Gia tri: 500.000.000 dong, tong 1.200.000.000.000",
+        "Ngay ky: 01.02.2024, so HD 2025-00123",
+        "Phi: 120000000 VND",
+        "SDT: 0912.345.678",
+    ])
+    texts = {x["text"] for x in _verifier().page_leftovers(doc[0])}
+    assert texts == {"0912.345.678"}
+    doc.close()
+
+
+def test_numbers_written_together_are_found_one_by_one():
+    redactor = Redactor(RedactionConfig())
+    # with the IMEI exemption the processor uses: it must judge each number, not the joined span
+    verifier = RedactionVerifier([("id", redactor._id_re), ("phone", redactor._phone_re)],
+                                 skip=redactor._is_imei_context)
+    doc = _doc(["0912345678 0987654321"], ["0912345678/0987654321"], ["123456789/012345678"])
+    found = [sorted(x["text"] for x in page["leftovers"]) for page in verifier.verify(doc)]
+    assert found == [["0912345678", "0987654321"], ["0912345678", "0987654321"], ["012345678", "123456789"]]
+    doc.close()